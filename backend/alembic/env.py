@@ -72,8 +72,12 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    get_app().config["DATABASE_STATEMENT_TIMEOUT"] = 0
+    get_app()
     with db.engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # The app's DATABASE_STATEMENT_TIMEOUT is meant for requests, not schema
+            # changes that may have to rewrite whole tables.
+            connection.exec_driver_sql("SET statement_timeout = 0")
         context.configure(
             connection=connection, target_metadata=target_metadata, render_as_batch=True
         )
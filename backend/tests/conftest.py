@@ -0,0 +1,72 @@
+from pathlib import Path
+from typing import Callable, Iterator
+from uuid import uuid4
+
+import pytest
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from flask import Flask
+from sqlalchemy.orm import Session
+from uma import KycStatus
+
+from vasp.db import db
+from vasp.models.Currency import Currency
+from vasp.models.Uma import Uma
+from vasp.models.User import User
+from vasp.models.Wallet import Color, Wallet
+
+BACKEND_DIR: Path = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Flask]:
+    """
+    A bare app with the database set up from the migrations, so the schema is the one
+    production runs on rather than one created from the models.
+    """
+    app = Flask(__name__)
+    database_path = tmp_path_factory.mktemp("db") / "vasp.sqlite"
+    app.config["DATABASE_URI"] = f"sqlite+pysqlite:///{database_path}"
+    db.init_app(app)
+
+    alembic_config = AlembicConfig(str(BACKEND_DIR / "alembic.ini"))
+    alembic_config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    with app.app_context():
+        command.upgrade(alembic_config, "head")
+        yield app
+
+
+MakeWallet = Callable[..., str]
+
+
+@pytest.fixture
+def make_wallet(app: Flask) -> MakeWallet:
+    """Creates a user with one wallet and UMA, and returns the UMA address."""
+
+    def make_wallet(balance: int = 0, currency_code: str = "USD") -> str:
+        username = f"user{uuid4().hex[:12]}"
+        with Session(db.engine) as db_session:
+            user = User()
+            db_session.add(user)
+            db_session.flush()
+            wallet = Wallet(
+                user_id=user.id,
+                amount_in_lowest_denom=balance,
+                color=Color.ONE,
+                kyc_status=KycStatus.VERIFIED,
+            )
+            db_session.add(wallet)
+            db_session.flush()
+            db_session.add(Currency(wallet_id=wallet.id, code=currency_code))
+            db_session.add(
+                Uma(
+                    user_id=user.id,
+                    wallet_id=wallet.id,
+                    username=username,
+                    default=True,
+                )
+            )
+            db_session.commit()
+        return f"${username}@localhost"
+
+    return make_wallet
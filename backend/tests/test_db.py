@@ -0,0 +1,39 @@
+from flask import Flask
+from sqlalchemy import func, select
+
+from vasp.db import db
+from vasp.models.User import User
+
+
+def count_users() -> int:
+    with db.session_scope() as db_session:
+        return db_session.scalar(select(func.count()).select_from(User))
+
+
+def test_blocks_in_a_request_share_a_session(app: Flask) -> None:
+    with app.test_request_context():
+        with db.session_scope() as outer:
+            outer.scalar(select(func.count()).select_from(User))
+            with db.session_scope() as inner:
+                assert inner is outer
+        with db.session_scope() as later:
+            assert later is outer
+
+
+def test_block_inside_uncommitted_writes_gets_its_own_session(app: Flask) -> None:
+    users_before = count_users()
+    with app.test_request_context():
+        with db.session_scope() as outer:
+            outer.add(User())
+            with db.session_scope() as inner:
+                assert inner is not outer
+                inner.add(User())
+                inner.commit()
+            # Neither the inner commit nor the inner block's exit touched these.
+            assert outer.new
+        # Uncommitted when the block exited, so rolled back.
+        with db.session_scope() as later:
+            assert later is outer
+            assert not later.new
+
+    assert count_users() == users_before + 1
@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from vasp.uma_vasp.demo.group_commit_credit_writer import GroupCommitCreditWriter
+
+from tests.conftest import MakeWallet
+
+
+def test_dead_writer_is_restarted(app: Flask, make_wallet: MakeWallet) -> None:
+    sender = make_wallet()
+    receiver = make_wallet()
+    writer = GroupCommitCreditWriter()
+    # As in a forked worker, which inherits the thread object but not the thread.
+    writer._writer = threading.Thread(target=lambda: None)
+    writer._writer.start()
+    writer._writer.join()
+
+    assert writer.credit("hash-1", 10, "USD", sender, receiver) == 10
+
+
+def test_credit_times_out_without_a_writer(
+    app: Flask, make_wallet: MakeWallet, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sender = make_wallet()
+    receiver = make_wallet()
+    writer = GroupCommitCreditWriter(wait_timeout_secs=0.05)
+    monkeypatch.setattr(writer, "_ensure_writer_started", lambda: None)
+
+    with pytest.raises(TimeoutError):
+        writer.credit("hash-1", 10, "USD", sender, receiver)
+    assert writer.get_stats()["queued"] == 0
@@ -0,0 +1,215 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from uuid import uuid4
+
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from vasp.db import db
+from vasp.models.Transaction import Transaction
+from vasp.models.Uma import Uma
+from vasp.models.Wallet import Wallet
+from vasp.uma_vasp.demo.internal_ledger_service import (
+    InternalLedgerService,
+    get_wallet_or_throw,
+)
+
+from tests.conftest import MakeWallet
+
+THREADS = 16
+
+
+def get_balances(uma: str) -> tuple[int, int]:
+    """Returns the wallet's balance and held amount, read straight from the table."""
+    username = uma.split("@")[0][1:]
+    with Session(db.engine) as db_session:
+        wallet = db_session.scalars(
+            select(Wallet)
+            .join(Uma, Uma.wallet_id == Wallet.id)
+            .where(Uma.username == username)
+        ).one()
+        return wallet.amount_in_lowest_denom, wallet.held_amount_in_lowest_denom
+
+
+def count_transactions(uma: str) -> int:
+    with Session(db.engine) as db_session:
+        return db_session.scalar(
+            select(func.count())
+            .select_from(Transaction)
+            .where(Transaction.sender_uma == uma)
+        )
+
+
+def test_concurrent_debits_never_overdraw(make_wallet: MakeWallet) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+
+    def debit(_: int) -> bool:
+        try:
+            ledger.subtract_wallet_balance(uuid4().hex, 10, "USD", sender, receiver)
+            return True
+        except ValueError:
+            return False
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        succeeded = sum(executor.map(debit, range(25)))
+
+    assert succeeded == 10
+    assert get_balances(sender) == (0, 0)
+    assert count_transactions(sender) == 10
+
+
+def test_concurrent_holds_and_captures_settle_exactly(
+    make_wallet: MakeWallet,
+) -> None:
+    sender = make_wallet(balance=1_000)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+    captured: List[int] = []
+    captured_lock = threading.Lock()
+
+    def send(seed: int) -> None:
+        rng = random.Random(seed)
+        for _ in range(20):
+            amount = rng.randint(1, 20)
+            try:
+                hold_id = ledger.place_hold(sender, amount, "USD", expires_in_secs=60)
+            except ValueError:
+                continue
+            if rng.random() < 0.5:
+                ledger.capture_hold(hold_id, uuid4().hex, sender, receiver)
+                with captured_lock:
+                    captured.append(amount)
+            else:
+                ledger.release_hold(hold_id)
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(send, range(THREADS)))
+
+    assert get_balances(sender) == (1_000 - sum(captured), 0)
+    assert count_transactions(sender) == len(captured)
+
+
+def test_racing_captures_debit_a_hold_once(make_wallet: MakeWallet) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+    hold_id = ledger.place_hold(sender, 30, "USD", expires_in_secs=60)
+    transaction_hash = uuid4().hex
+
+    def capture(_: int) -> Optional[int]:
+        return ledger.capture_hold(hold_id, transaction_hash, sender, receiver)
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(capture, range(THREADS)))
+
+    assert get_balances(sender) == (70, 0)
+    assert count_transactions(sender) == 1
+
+
+def test_capture_racing_release_debits_once(make_wallet: MakeWallet) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+
+    for _ in range(10):
+        balance_before, _ = get_balances(sender)
+        hold_id = ledger.place_hold(sender, 5, "USD", expires_in_secs=60)
+        barrier = threading.Barrier(2)
+
+        def capture() -> None:
+            barrier.wait()
+            ledger.capture_hold(hold_id, uuid4().hex, sender, receiver)
+
+        def release() -> None:
+            barrier.wait()
+            ledger.release_hold(hold_id)
+
+        threads = [threading.Thread(target=capture), threading.Thread(target=release)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # A capture that loses to the release still debits, since the payment has
+        # gone out.
+        assert get_balances(sender) == (balance_before - 5, 0)
+
+
+def test_hold_for_a_sent_payment_outlives_its_expiry(make_wallet: MakeWallet) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+    hold_id = ledger.place_hold(sender, 30, "USD", expires_in_secs=0)
+    payment_id = uuid4().hex
+    ledger.attach_hold_to_payment(
+        hold_id, payment_id, sender, receiver, utxo_callback="https://vasp2/utxos"
+    )
+
+    # Reading the available balance releases expired holds, but not this one.
+    assert ledger.get_available_balance(sender) == (70, "USD")
+
+    hold = ledger.get_payment_hold(payment_id)
+    assert hold is not None
+    assert (hold.hold_id, hold.utxo_callback) == (hold_id, "https://vasp2/utxos")
+    ledger.capture_hold(hold.hold_id, uuid4().hex, hold.sender_uma, hold.receiver_uma)
+    ledger.capture_hold(hold.hold_id, uuid4().hex, hold.sender_uma, hold.receiver_uma)
+    assert get_balances(sender) == (70, 0)
+    assert count_transactions(sender) == 1
+
+
+def test_expired_hold_without_a_payment_is_released(make_wallet: MakeWallet) -> None:
+    sender = make_wallet(balance=100)
+    ledger = InternalLedgerService()
+    ledger.place_hold(sender, 30, "USD", expires_in_secs=0)
+
+    assert ledger.get_available_balance(sender) == (100, "USD")
+    assert get_balances(sender) == (100, 0)
+
+
+def test_concurrent_transfers_of_one_payment_move_funds_once(
+    make_wallet: MakeWallet,
+) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet(currency_code="SAT")
+    ledger = InternalLedgerService()
+    transaction_hash = uuid4().hex
+
+    def transfer(_: int) -> Optional[int]:
+        return ledger.transfer_between_wallets(
+            transaction_hash, sender, receiver, 10, "USD", 1_000, "SAT"
+        )
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = list(executor.map(transfer, range(THREADS)))
+
+    assert sorted(results, key=lambda result: result is None) == [90] + [None] * (
+        THREADS - 1
+    )
+    assert get_balances(sender) == (90, 0)
+    assert get_balances(receiver) == (1_000, 0)
+
+
+def test_balances_read_in_a_request_see_ledger_writes(
+    app: Flask, make_wallet: MakeWallet
+) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+
+    with app.test_request_context():
+        # Held as a handler would, so the session keeps it in its identity map.
+        with db.session_scope() as db_session:
+            wallet = get_wallet_or_throw(db_session, sender)
+        assert ledger.get_wallet_balance(sender) == (100, "USD")
+        hold_id = ledger.place_hold(sender, 30, "USD", expires_in_secs=60)
+        assert ledger.get_available_balance(sender) == (70, "USD")
+        ledger.capture_hold(hold_id, uuid4().hex, sender, receiver)
+        assert ledger.get_wallet_balance(sender) == (70, "USD")
+        ledger.subtract_wallet_balance(uuid4().hex, 10, "USD", sender, receiver)
+        assert ledger.get_available_balance(sender) == (60, "USD")
+        assert wallet.amount_in_lowest_denom == 60
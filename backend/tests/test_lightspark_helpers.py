@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+from typing import Any
+
+from lightspark import BitcoinNetwork
+
+from vasp.uma_vasp.lightspark_helpers import LightsparkNodeCache
+
+
+class FakeLightsparkClient:
+    def __init__(self) -> None:
+        self.node_fetches = 0
+        self.signing_key_loads = 0
+
+    def get_entity(self, node_id: str, _entity_class: Any) -> SimpleNamespace:
+        self.node_fetches += 1
+        return SimpleNamespace(
+            public_key="02abc",
+            uma_prescreening_utxos=[],
+            typename="LightsparkNodeWithOSK",
+            bitcoin_network=BitcoinNetwork.REGTEST,
+        )
+
+    def recover_node_signing_key(self, node_id: str, password: str) -> None:
+        self.signing_key_loads += 1
+
+
+def make_cache() -> tuple[LightsparkNodeCache, FakeLightsparkClient]:
+    client = FakeLightsparkClient()
+    config = SimpleNamespace(node_id="node", osk_node_signing_key_password="pw")
+    return LightsparkNodeCache(client, config), client  # pyre-ignore [6]
+
+
+def test_node_state_and_signing_key_are_loaded_once() -> None:
+    node_cache, client = make_cache()
+    for _ in range(3):
+        node_cache.load_signing_key()
+        node_cache.get_node_state()
+    assert (client.node_fetches, client.signing_key_loads) == (1, 1)
+
+
+def test_invalidate_reloads_node_state_and_signing_key() -> None:
+    node_cache, client = make_cache()
+    node_cache.load_signing_key()
+    node_cache.invalidate()
+    node_cache.load_signing_key()
+    node_cache.get_node_state()
+    assert (client.node_fetches, client.signing_key_loads) == (2, 2)
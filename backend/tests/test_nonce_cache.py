@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, text
+from uma import InvalidNonceException
+
+from vasp.db import db
+from vasp.uma_vasp.demo.nonce_cache import BucketedNonceCache
+
+
+def test_nonce_check_uses_the_request_session(app: Flask) -> None:
+    nonce_cache = BucketedNonceCache()
+    nonce = uuid4().hex
+    with app.test_request_context():
+        with db.session_scope() as db_session:
+            db_session.execute(text("SELECT 1"))
+        commits = []
+        event.listen(db_session, "after_commit", commits.append)
+        nonce_cache.check_and_save_nonce(nonce, datetime.now(timezone.utc))
+        # Pruning the expired buckets, then saving the nonce.
+        assert len(commits) == 2
+
+        with pytest.raises(InvalidNonceException):
+            nonce_cache.check_and_save_nonce(nonce, datetime.now(timezone.utc))
+        # The failed insert is rolled back, leaving the session usable.
+        with db.session_scope() as db_session:
+            assert db_session.execute(text("SELECT 1")).scalar() == 1
@@ -0,0 +1,80 @@
+import threading
+from typing import Any, Dict
+
+from flask import Flask
+from flask_caching import Cache
+from lightspark import TransactionStatus
+
+from vasp.uma_vasp.demo.sending_vasp_request_cache import SendingVaspRequestCache
+from vasp.uma_vasp.interfaces.sending_vasp_request_cache import (
+    PayoutBatch,
+    PayoutBatchItem,
+    PayoutBatchItemStatus,
+    SendingVaspPaymentStatus,
+)
+from vasp.uma_vasp.payout_batch import PayoutBatchRunner
+
+
+class PendingSendingVasp:
+    """Sends every payment without it finishing, like a slow Lightning route."""
+
+    def __init__(self, request_cache: SendingVaspRequestCache) -> None:
+        self.request_cache = request_cache
+
+    def send_payment(
+        self, callback_uuid: str, user_id: str, wait_for_completion: bool = True
+    ) -> Dict[str, Any]:
+        assert not wait_for_completion
+        payment_status = SendingVaspPaymentStatus(
+            payment_id=f"payment-{callback_uuid}",
+            sending_user_id=user_id,
+            status=TransactionStatus.PENDING.value,
+        )
+        self.request_cache.save_payment_status(payment_status)
+        return payment_status.to_json()
+
+
+def test_pending_payments_are_followed_until_they_finish(app: Flask) -> None:
+    request_cache = SendingVaspRequestCache(
+        Cache(app, config={"CACHE_TYPE": "SimpleCache"})
+    )
+    runner = PayoutBatchRunner(
+        PendingSendingVasp(request_cache), request_cache  # pyre-ignore [6]
+    )
+    batch = PayoutBatch(
+        batch_id="batch",
+        sending_user_id="1",
+        sender_uma="$alice@localhost",
+        items=[
+            PayoutBatchItem(
+                receiver_uma=f"$bob{i}@vasp2", amount=1, currency_code="SAT"
+            )
+            for i in range(2)
+        ],
+    )
+    for index in range(2):
+        runner._send_item(app, batch, index, str(index))
+    assert [item.status for item in batch.items] == [PayoutBatchItemStatus.SENDING] * 2
+    assert [item.payment_id for item in batch.items] == ["payment-0", "payment-1"]
+
+    def finish_payments() -> None:
+        request_cache.save_payment_status(
+            SendingVaspPaymentStatus("payment-0", "1", TransactionStatus.SUCCESS.value)
+        )
+        request_cache.save_payment_status(
+            SendingVaspPaymentStatus(
+                "payment-1",
+                "1",
+                TransactionStatus.FAILED.value,
+                failure_reason="No route.",
+            )
+        )
+
+    threading.Timer(0.5, finish_payments).start()
+    runner._wait_for_sent_items(batch)
+
+    assert [item.status for item in batch.items] == [
+        PayoutBatchItemStatus.SUCCEEDED,
+        PayoutBatchItemStatus.FAILED,
+    ]
+    assert batch.items[1].failure_reason == "No route."
@@ -0,0 +1,61 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import List, Optional
+
+from flask import Flask
+from flask_caching import Cache
+from uma import PubkeyResponse
+
+from vasp.uma_vasp.demo.public_key_cache import FETCH_LEASE_SECS, SharedPublicKeyCache
+
+DOMAIN = "vasp2.example"
+
+
+def make_cache(app: Flask) -> SharedPublicKeyCache:
+    return SharedPublicKeyCache(Cache(app, config={"CACHE_TYPE": "SimpleCache"}))
+
+
+def make_public_key(expires_in: timedelta) -> PubkeyResponse:
+    return PubkeyResponse(
+        signing_cert_chain=None,
+        encryption_cert_chain=None,
+        signing_pubkey=b"\x02" * 33,
+        encryption_pubkey=b"\x02" * 33,
+        expiration_timestamp=datetime.now(timezone.utc) + expires_in,
+    )
+
+
+def wait_behind_fetch(
+    cache: SharedPublicKeyCache, add: PubkeyResponse
+) -> tuple[Optional[PubkeyResponse], float]:
+    """
+    Starts a fetch, has another thread wait on it, then lands add. Returns what the
+    waiter got and how long it waited.
+    """
+    assert cache.fetch_public_key_for_vasp(DOMAIN) is None
+    results: List[Optional[PubkeyResponse]] = []
+    started = monotonic()
+    waiter = threading.Thread(
+        target=lambda: results.append(cache.fetch_public_key_for_vasp(DOMAIN))
+    )
+    waiter.start()
+    cache.add_public_key_for_vasp(DOMAIN, add)
+    waiter.join()
+    return results[0], monotonic() - started
+
+
+def test_waiter_gets_the_fetched_key(app: Flask) -> None:
+    public_key = make_public_key(timedelta(hours=1))
+    result, waited_secs = wait_behind_fetch(make_cache(app), public_key)
+    assert result is not None
+    assert result.signing_pubkey == public_key.signing_pubkey
+    assert waited_secs < FETCH_LEASE_SECS
+
+
+def test_expired_key_releases_waiters(app: Flask) -> None:
+    cache = make_cache(app)
+    result, waited_secs = wait_behind_fetch(cache, make_public_key(-timedelta(1)))
+    assert result is None
+    assert waited_secs < FETCH_LEASE_SECS
+    assert not cache.cache.get(f"pubkey_fetch_lease_{DOMAIN}")
@@ -0,0 +1,248 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from uuid import uuid4
+
+import pytest
+from flask import Flask
+from sqlalchemy import Select, insert, or_, select
+from sqlalchemy.orm import Session
+from uma import KycStatus
+
+from vasp.db import db
+from vasp.models.BalanceHold import BalanceHold, BalanceHoldStatus
+from vasp.models.Currency import Currency
+from vasp.models.PayReqResponse import PayReqResponse
+from vasp.models.Transaction import Transaction, TransactionDirection
+from vasp.models.Uma import Uma
+from vasp.models.User import User
+from vasp.models.Wallet import Color, Wallet
+from vasp.transaction_history import TransactionPage
+
+UMA = "$user7@localhost"
+FIRST_PAGE = TransactionPage(
+    limit=20, after_id=None, from_time=None, until_time=None, transaction_type=None
+)
+LATER_PAGE = TransactionPage(
+    limit=20,
+    after_id=str(uuid4()),
+    from_time=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    until_time=datetime(2024, 2, 1, tzinfo=timezone.utc),
+    transaction_type=None,
+)
+
+USERS = 500
+TRANSACTIONS = 20_000
+PAYREQ_RESPONSES = 5_000
+BALANCE_HOLDS = 5_000
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seed(app: Flask) -> None:
+    """
+    Thousands of rows per table with ANALYZE statistics, so that plans are chosen at a
+    realistic cardinality rather than on tables SQLite would rightly just scan.
+    """
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    user_ids = [str(uuid4()) for _ in range(USERS)]
+    wallet_ids = [str(uuid4()) for _ in range(USERS)]
+    uma_ids = [str(uuid4()) for _ in range(USERS)]
+    umas = [f"$user{index}@localhost" for index in range(USERS)]
+
+    def some_time() -> datetime:
+        return now - timedelta(seconds=rng.randrange(90 * 24 * 60 * 60))
+
+    def transaction() -> Dict[str, Any]:
+        owner = rng.randrange(USERS)
+        other = umas[rng.randrange(USERS)]
+        is_debit = rng.random() < 0.5
+        return {
+            "id": str(uuid4()),
+            "user_id": user_ids[owner],
+            "uma_id": uma_ids[owner],
+            "transaction_hash": uuid4().hex,
+            "amount_in_lowest_denom": rng.randrange(1, 10_000),
+            "currency_code": "USD",
+            "direction": (
+                TransactionDirection.DEBIT if is_debit else TransactionDirection.CREDIT
+            ),
+            "sender_uma": umas[owner] if is_debit else other,
+            "receiver_uma": other if is_debit else umas[owner],
+            "created_at": some_time(),
+        }
+
+    def balance_hold() -> Dict[str, Any]:
+        status = rng.choice(list(BalanceHoldStatus))
+        return {
+            "id": str(uuid4()),
+            "wallet_id": wallet_ids[rng.randrange(USERS)],
+            "amount_in_lowest_denom": rng.randrange(1, 10_000),
+            "currency_code": "USD",
+            "status": status,
+            "expires_at": some_time(),
+            # Most holds are for payments that were sent.
+            "payment_id": uuid4().hex if rng.random() < 0.8 else None,
+        }
+
+    with Session(db.engine) as db_session:
+        db_session.execute(insert(User), [{"id": user_id} for user_id in user_ids])
+        db_session.execute(
+            insert(Wallet),
+            [
+                {
+                    "id": wallet_id,
+                    "user_id": user_id,
+                    "amount_in_lowest_denom": 0,
+                    "color": Color.ONE,
+                    "kyc_status": KycStatus.VERIFIED,
+                }
+                for user_id, wallet_id in zip(user_ids, wallet_ids)
+            ],
+        )
+        db_session.execute(
+            insert(Currency),
+            [{"wallet_id": wallet_id, "code": "USD"} for wallet_id in wallet_ids],
+        )
+        db_session.execute(
+            insert(Uma),
+            [
+                {
+                    "id": uma_id,
+                    "user_id": user_id,
+                    "wallet_id": wallet_id,
+                    "username": uma.split("@")[0][1:],
+                    "default": True,
+                }
+                for user_id, wallet_id, uma_id, uma in zip(
+                    user_ids, wallet_ids, uma_ids, umas
+                )
+            ],
+        )
+        db_session.execute(
+            insert(Transaction), [transaction() for _ in range(TRANSACTIONS)]
+        )
+        db_session.execute(
+            insert(PayReqResponse),
+            [
+                {
+                    "user_id": user_ids[owner],
+                    "uma_id": uma_ids[owner],
+                    "payment_hash": uuid4().hex,
+                    "amount_in_lowest_denom": 1_000,
+                    "currency_code": "USD",
+                    "exchange_fees_msats": 0,
+                    "multiplier": 1.0,
+                    "expires_at": some_time(),
+                    "sender_uma": umas[rng.randrange(USERS)],
+                }
+                for owner in (rng.randrange(USERS) for _ in range(PAYREQ_RESPONSES))
+            ],
+        )
+        db_session.execute(
+            insert(BalanceHold), [balance_hold() for _ in range(BALANCE_HOLDS)]
+        )
+        db_session.commit()
+        db_session.connection().exec_driver_sql("ANALYZE")
+
+
+def explain(statement: Select[Any]) -> List[str]:
+    compiled = statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    with db.engine.connect() as connection:
+        return [
+            row[-1]
+            for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+        ]
+
+
+def user_history(page: TransactionPage, direction: Any = None) -> Select[Any]:
+    # As in user.py's /transactions.
+    statement = (
+        select(Transaction)
+        .join(Uma)
+        .where(Transaction.user_id == str(uuid4()))
+        .where(Uma.username == "user7")
+    )
+    if direction:
+        statement = statement.where(Transaction.direction == direction)
+    return page.apply(statement)
+
+
+def assert_uses_index(plan: List[str], index: str) -> None:
+    assert any(f"USING INDEX {index} " in step for step in plan), plan
+
+
+def assert_no_sort(plan: List[str]) -> None:
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("page", [FIRST_PAGE, LATER_PAGE])
+@pytest.mark.parametrize("direction", [None, TransactionDirection.DEBIT])
+def test_user_history_reads_owner_index_in_order(
+    page: TransactionPage, direction: Any
+) -> None:
+    plan = explain(user_history(page, direction))
+    assert_uses_index(plan, "ix_transaction_user_id_created_at_id")
+    assert_no_sort(plan)
+
+
+@pytest.mark.parametrize("page", [FIRST_PAGE, LATER_PAGE])
+@pytest.mark.parametrize(
+    "condition, index",
+    [
+        (Transaction.receiver_uma == UMA, "ix_transaction_receiver_uma_created_at_id"),
+        (Transaction.sender_uma == UMA, "ix_transaction_sender_uma_created_at_id"),
+    ],
+)
+def test_nwc_history_one_direction_reads_uma_index_in_order(
+    page: TransactionPage, condition: Any, index: str
+) -> None:
+    # As in uma_nwc_bridge.py's transaction list.
+    plan = explain(page.apply(select(Transaction).where(condition)))
+    assert_uses_index(plan, index)
+    assert_no_sort(plan)
+
+
+def test_nwc_history_both_directions_reads_both_uma_indexes() -> None:
+    # The two index ranges are merged, so this one is sorted, but only over the
+    # UMA's own rows.
+    plan = explain(
+        FIRST_PAGE.apply(
+            select(Transaction).where(
+                or_(Transaction.sender_uma == UMA, Transaction.receiver_uma == UMA)
+            )
+        )
+    )
+    assert_uses_index(plan, "ix_transaction_sender_uma_created_at_id")
+    assert_uses_index(plan, "ix_transaction_receiver_uma_created_at_id")
+    assert not any(step.startswith("SCAN") for step in plan), plan
+
+
+@pytest.mark.parametrize(
+    "statement, index",
+    [
+        (select(Currency).where(Currency.wallet_id == 1), "ix_currency_wallet_id"),
+        (select(Uma).where(Uma.user_id == str(uuid4())), "ix_uma_user_id"),
+        (select(Wallet).where(Wallet.user_id == str(uuid4())), "ix_wallet_user_id"),
+        (
+            # As in receiving_vasp.py's payment webhook.
+            select(PayReqResponse, Uma)
+            .outerjoin(Uma, Uma.id == PayReqResponse.uma_id)
+            .where(PayReqResponse.payment_hash == uuid4().hex),
+            "ix_payreq_response_payment_hash",
+        ),
+        (
+            # As in internal_ledger_service.py's release_expired_holds.
+            select(BalanceHold.id, BalanceHold.payment_id).where(
+                BalanceHold.wallet_id == 1,
+                BalanceHold.status == BalanceHoldStatus.ACTIVE,
+                BalanceHold.expires_at < datetime.now(timezone.utc),
+            ),
+            "ix_balance_hold_wallet_id_status",
+        ),
+    ],
+)
+def test_lookups_use_their_index(statement: Select[Any], index: str) -> None:
+    assert_uses_index(explain(statement), index)
@@ -0,0 +1,84 @@
+import sys
+import threading
+from time import monotonic, sleep
+from typing import Callable
+
+import pytest
+
+from vasp.db import RdsAuthTokenManager
+
+
+class FakeRdsClient:
+    """Stands in for the boto3 rds client, handing out numbered tokens."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.failing = False
+        self._lock = threading.Lock()
+
+    def generate_db_auth_token(self, host: str, port: int, user: str) -> str:
+        with self._lock:
+            self.calls += 1
+            if self.failing:
+                raise ConnectionError("rds is unreachable")
+            return f"{user}@{host}:{port}#{self.calls}"
+
+
+def make_manager(rds: FakeRdsClient, **kwargs: float) -> RdsAuthTokenManager:
+    return RdsAuthTokenManager(
+        rds, host="db", port=5432, user="vasp", **kwargs  # pyre-ignore [6]
+    )
+
+
+def wait_for(condition: Callable[[], bool], timeout_secs: float = 5) -> None:
+    deadline = monotonic() + timeout_secs
+    while not condition():
+        assert monotonic() < deadline, "timed out"
+        sleep(0.01)
+
+
+def test_current_token_is_reused() -> None:
+    rds = FakeRdsClient()
+    manager = make_manager(rds)
+    token = manager.refresh()
+
+    assert [manager.get_token() for _ in range(100)] == [token] * 100
+    assert rds.calls == 1
+
+
+def test_refresher_replaces_token_in_the_background() -> None:
+    rds = FakeRdsClient()
+    manager = make_manager(rds, refresh_interval_secs=0.05)
+    first_token = manager.refresh()
+    manager.get_token()
+
+    wait_for(lambda: rds.calls >= 3)
+    assert manager.get_token() != first_token
+
+
+def test_failed_refresh_is_retried_and_last_token_served() -> None:
+    rds = FakeRdsClient()
+    manager = make_manager(rds, refresh_interval_secs=0.01, retry_interval_secs=0.01)
+    token = manager.refresh()
+    rds.failing = True
+    manager.get_token()
+
+    wait_for(lambda: rds.calls >= 4)
+    assert manager.get_token() == token
+
+    rds.failing = False
+    wait_for(lambda: manager.get_token() != token)
+
+
+def test_expired_token_is_generated_on_the_connect_path(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rds = FakeRdsClient()
+    manager = make_manager(rds)
+    token = manager.refresh()
+    # vasp re-exports the db object under the module's name.
+    monkeypatch.setattr(sys.modules["vasp.db"], "RDS_AUTH_TOKEN_LIFETIME_SECS", 0)
+
+    new_token = manager.get_token()
+    assert new_token != token
+    assert rds.calls == 2
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from typing import Any, List
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from vasp.uma_vasp.demo.internal_ledger_service import InternalLedgerService
+from vasp.uma_vasp.sent_payment_helpers import capture_sent_payment
+
+from tests.conftest import MakeWallet
+
+
+class RecordingOutbox:
+    def __init__(self) -> None:
+        self.enqueued: List[str] = []
+
+    def enqueue(
+        self, db_session: Session, payment_id: str, callback: str, utxos: Any
+    ) -> None:
+        self.enqueued.append(payment_id)
+
+
+class RecordingComplianceService:
+    def __init__(self) -> None:
+        self.monitored: List[str] = []
+
+    def register_transaction_monitoring(self, payment_id: str, **_: Any) -> None:
+        self.monitored.append(payment_id)
+
+
+def test_send_and_webhook_settle_a_payment_once(make_wallet: MakeWallet) -> None:
+    sender = make_wallet(balance=100)
+    receiver = make_wallet()
+    ledger = InternalLedgerService()
+    outbox = RecordingOutbox()
+    compliance_service = RecordingComplianceService()
+    amount = SimpleNamespace(preferred_currency_value_rounded=1_000)
+    payment = SimpleNamespace(
+        id=uuid4().hex,
+        uma_post_transaction_data=[
+            SimpleNamespace(
+                utxo="utxo:0", amount=SimpleNamespace(convert_to=lambda _: amount)
+            )
+        ],
+    )
+    hold_id = ledger.place_hold(sender, 30, "USD", expires_in_secs=60)
+    ledger.attach_hold_to_payment(
+        hold_id,
+        payment.id,
+        sender,
+        receiver,
+        utxo_callback="https://vasp2/utxos",
+        receiving_node_pubkey="02ab",
+    )
+
+    transaction_hash = uuid4().hex
+    for _ in range(2):
+        hold = ledger.get_payment_hold(payment.id)
+        assert hold is not None
+        balance = capture_sent_payment(
+            payment,  # pyre-ignore [6]
+            transaction_hash,
+            hold,
+            ledger,
+            compliance_service,  # pyre-ignore [6]
+            outbox,  # pyre-ignore [6]
+        )
+        assert balance == 70
+
+    assert outbox.enqueued == [payment.id]
+    assert compliance_service.monitored == [payment.id]
@@ -1,7 +1,7 @@
+import hmac
 import os
 import json
 import logging
-from datetime import datetime, timedelta, timezone
 from flask_login import LoginManager
 from typing import Optional
 
@@ -17,22 +17,27 @@ from flask import (
 )
 from flask_caching import Cache
 from flask_cors import CORS
-from uma import (
-    INonceCache,
-    InMemoryNonceCache,
-    InMemoryPublicKeyCache,
-    UmaException,
-)
+from uma import ErrorCode, UmaException
 
 from vasp.uma_vasp.user import User
 from vasp.uma_vasp.config import Config, get_http_host, require_env
 from vasp.uma_vasp.demo.demo_compliance_service import DemoComplianceService
 from vasp.uma_vasp.demo.demo_user_service import DemoUserService
 from vasp.uma_vasp.demo.demo_currency_service import DemoCurrencyService
+from vasp.uma_vasp.demo.group_commit_credit_writer import GroupCommitCreditWriter
 from vasp.uma_vasp.demo.internal_ledger_service import InternalLedgerService
+from vasp.uma_vasp.demo.nonce_cache import BucketedNonceCache
+from vasp.uma_vasp.demo.payment_completion_waiter import PaymentCompletionWaiter
+from vasp.uma_vasp.demo.public_key_cache import SharedPublicKeyCache
 from vasp.uma_vasp.demo.sending_vasp_request_cache import SendingVaspRequestCache
 from vasp.uma_vasp.demo.webauthn_challenge_cache import WebauthnChallengeCache
 from vasp.uma_vasp.demo.demo_request_storage import RequestStorage
+from vasp.uma_vasp.demo.uma_version_cache import UmaVersionCache
+from vasp.uma_vasp.currency_list_cache import CurrencyListCache
+from vasp.uma_vasp.exchange_rates import ExchangeRateProvider
+from vasp.uma_vasp.http_client import OutboundHttpClient
+from vasp.uma_vasp.lightspark_helpers import LightsparkNodeCache
+from vasp.uma_vasp.utxo_callback_outbox import UtxoCallbackOutbox
 from vasp.uma_vasp.receiving_vasp import (
     register_routes as register_receiving_vasp_routes,
 )
@@ -43,7 +48,9 @@ from vasp.uma_vasp.sending_vasp import (
     register_routes as register_sending_vasp_routes,
 )
 from vasp.db import db, setup_rds_iam_auth
+from vasp.transaction_history import NEXT_CURSOR_HEADER
 from vasp.uma_vasp.interfaces.request_storage import IRequestStorage
+from vasp.uma_vasp.uma_exception import abort_with_error
 from werkzeug.wrappers.response import Response as WerkzeugResponse
 from lightspark import LightsparkSyncClient as LightsparkClient
 from vasp.utils import get_frontend_allowed_origins, is_dev
@@ -105,6 +112,7 @@ def create_app() -> Flask:
             r"/api/*": {
                 "origins": get_frontend_allowed_origins(app.config["FRONTEND_DOMAIN"]),
                 "allow_headers": ["Access-Control-Allow-Origin", "Content-Type"],
+                "expose_headers": [NEXT_CURSOR_HEADER],
                 "supports_credentials": True,
             },
             r"/.well-known/*": {
@@ -138,13 +146,18 @@ def create_app() -> Flask:
 
     compliance_service = DemoComplianceService(lightspark_client, config)
     user_service = DemoUserService()
-    ledger_service = InternalLedgerService()
-    currency_service = DemoCurrencyService()
-    pubkey_cache = InMemoryPublicKeyCache()
-    nonce_cache: INonceCache = InMemoryNonceCache(
-        datetime.now(timezone.utc) - timedelta(weeks=2)
-    )
+    credit_writer = GroupCommitCreditWriter.from_app_config(app)
+    ledger_service = InternalLedgerService(credit_writer=credit_writer)
+    rate_provider = ExchangeRateProvider.from_app_config(app)
+    currency_service = DemoCurrencyService(rate_provider, cache)
+    currency_list_cache = CurrencyListCache(currency_service)
+    pubkey_cache = SharedPublicKeyCache(cache)
+    nonce_cache = BucketedNonceCache()
     uma_request_storage: IRequestStorage = RequestStorage()
+    payment_waiter = PaymentCompletionWaiter()
+    node_cache = LightsparkNodeCache(lightspark_client, config)
+    http_client = OutboundHttpClient.from_app_config(app)
+    utxo_callback_outbox = UtxoCallbackOutbox.from_app_config(app, http_client, config)
 
     from . import auth, user, currencies, uma
 
@@ -154,7 +167,11 @@ def create_app() -> Flask:
         )
     )
     app.register_blueprint(
-        uma.construct_blueprint(pubkey_cache=pubkey_cache, nonce_cache=nonce_cache)
+        uma.construct_blueprint(
+            pubkey_cache=pubkey_cache,
+            nonce_cache=nonce_cache,
+            currency_service=currency_service,
+        )
     )
 
     from vasp.uma_vasp import well_known
@@ -165,6 +182,7 @@ def create_app() -> Flask:
             config=config,
             ledger_service=ledger_service,
             currency_service=currency_service,
+            currency_list_cache=currency_list_cache,
         )
     )
     app.register_blueprint(
@@ -179,11 +197,17 @@ def create_app() -> Flask:
             request_cache=SendingVaspRequestCache(cache),
             nonce_cache=nonce_cache,
             uma_request_storage=uma_request_storage,
+            payment_waiter=payment_waiter,
+            node_cache=node_cache,
+            http_client=http_client,
+            uma_version_cache=UmaVersionCache(cache),
+            utxo_callback_outbox=utxo_callback_outbox,
         )
     )
     app.register_blueprint(
         currencies.construct_blueprint(
             currency_service=currency_service,
+            currency_list_cache=currency_list_cache,
         )
     )
 
@@ -201,6 +225,10 @@ def create_app() -> Flask:
         compliance_service=compliance_service,
         pubkey_cache=pubkey_cache,
         nonce_cache=nonce_cache,
+        payment_waiter=payment_waiter,
+        node_cache=node_cache,
+        http_client=http_client,
+        utxo_callback_outbox=utxo_callback_outbox,
     )
     register_sending_vasp_routes(
         app,
@@ -214,8 +242,20 @@ def create_app() -> Flask:
         request_cache=SendingVaspRequestCache(cache),
         nonce_cache=nonce_cache,
         uma_request_storage=uma_request_storage,
+        payment_waiter=payment_waiter,
+        node_cache=node_cache,
+        http_client=http_client,
+        uma_version_cache=UmaVersionCache(cache),
+        utxo_callback_outbox=utxo_callback_outbox,
     )
 
+    @app.before_request
+    def start_background_workers() -> None:
+        # Started lazily rather than in create_app so that CLI entry points such as
+        # alembic don't spin up workers. This also resumes callbacks left pending by a
+        # previous process.
+        utxo_callback_outbox.start(app)
+
     @app.route("/-/alive")
     def alive() -> str:
         return "ok"
@@ -224,6 +264,27 @@ def create_app() -> Flask:
     def ready() -> str:
         return "ok"
 
+    @app.route("/-/metrics")
+    def metrics() -> Response:
+        # These name the counterparties this VASP talks to, so they're only served
+        # to callers holding the configured token.
+        metrics_token = app.config.get("METRICS_TOKEN")
+        if not metrics_token or not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {metrics_token}"
+        ):
+            abort_with_error(ErrorCode.FORBIDDEN, "Unauthorized")
+        return jsonify(
+            {
+                "outboundHttp": http_client.get_domain_stats(),
+                "pubkeyCache": pubkey_cache.get_stats(),
+                "nonceCache": nonce_cache.get_stats(),
+                "databasePool": db.get_pool_stats(),
+                "ledgerCredits": credit_writer.get_stats(),
+                "exchangeRates": rate_provider.get_stats(),
+                "utxoCallbackOutbox": utxo_callback_outbox.get_stats(),
+            }
+        )
+
     def redirect_to_nwc() -> WerkzeugResponse:
         """
         Redirect to the NWC app page.
@@ -2,7 +2,6 @@ from datetime import datetime, timedelta
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse, unquote
 import jwt
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 import logging
 import base64
 
@@ -100,7 +99,7 @@ def construct_blueprint(
             session["uma"] = current_user.get_default_uma_address()
             username = get_username_from_uma(session["uma"])
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = db_session.scalars(
                 select(Wallet)
                 .join(Uma)
@@ -188,7 +187,7 @@ def construct_blueprint(
         [id, auth_method] = gen_resolve_id()
 
         # Check db for user
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             user: Optional[UserModel] = None
             # for each auth method, check if the user exists
             if auth_method == AuthMethod.Google:
@@ -244,7 +243,7 @@ def construct_blueprint(
         )
 
         # Python implementation of base64 encoding will have slightly different symbols, make it a urlsafe base64 encoding
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             credential = WebAuthnCredential(
                 user_id=current_user.id,
                 credential_id=base64.urlsafe_b64encode(
@@ -304,7 +303,7 @@ def construct_blueprint(
         # Thus we need to add padding to the credential ID provided by the browser which does not
         credential_id = credential["id"]
         credential_id_with_padding = credential_id + "=" * (-len(credential_id) % 4)
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             credential_model = db_session.scalars(
                 select(WebAuthnCredential).where(
                     WebAuthnCredential.credential_id == credential_id_with_padding
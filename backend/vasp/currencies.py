@@ -1,30 +1,71 @@
 import logging
 
-from flask import Blueprint, Response, jsonify
+from flask import Blueprint, Response, jsonify, request
+from uma import ErrorCode
 
-from vasp.uma_vasp.interfaces.currency_service import (
-    ICurrencyService,
-)
+from vasp.uma_vasp.currency_list_cache import CurrencyListCache
 from vasp.uma_vasp.currencies import CURRENCIES
+from vasp.uma_vasp.interfaces.currency_service import ICurrencyService
+from vasp.uma_vasp.uma_exception import abort_with_error
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+MAX_AMOUNTS_PER_CONVERSION = 1000
+
 
 def construct_blueprint(
     currency_service: ICurrencyService,
+    currency_list_cache: CurrencyListCache,
 ) -> Blueprint:
     bp = Blueprint("currencies", __name__, url_prefix="/api/currencies")
 
     @bp.get("/")
     def get_all() -> Response:
-        response = []
-        for currency in CURRENCIES:
-            try:
-                response.append(currency_service.get_uma_currency(currency))
-            except ValueError:
-                logger.warning(
-                    "Skipping currency %s: no exchange rate available", currency
+        # Same for every caller and only changes with the rates, so clients
+        # revalidate with If-None-Match and usually get a 304.
+        return currency_list_cache.get(CURRENCIES).to_response(
+            request, cache_control="public, no-cache"
+        )
+
+    @bp.post("/convert")
+    def convert() -> Response:
+        """
+        Converts many amounts to one currency at the same rates, e.g. a page of
+        transaction history into the user's display currency. Amounts are in the
+        smallest unit of their currency, in and out.
+        """
+        request_json = request.get_json(silent=True)
+        if not isinstance(request_json, dict):
+            abort_with_error(ErrorCode.INVALID_INPUT, "Request must be a JSON object.")
+        to_currency_code = request_json.get("toCurrencyCode")
+        amounts = request_json.get("amounts")
+        if not isinstance(to_currency_code, str) or not isinstance(amounts, list):
+            abort_with_error(
+                ErrorCode.INVALID_INPUT, "toCurrencyCode and amounts are required."
+            )
+        if len(amounts) > MAX_AMOUNTS_PER_CONVERSION:
+            abort_with_error(
+                ErrorCode.INVALID_INPUT,
+                f"At most {MAX_AMOUNTS_PER_CONVERSION} amounts can be converted at once.",
+            )
+
+        pairs = []
+        for item in amounts:
+            if (
+                not isinstance(item, dict)
+                or type(item.get("amount")) is not int
+                or not isinstance(item.get("currencyCode"), str)
+            ):
+                abort_with_error(
+                    ErrorCode.INVALID_INPUT,
+                    "Each amount must have an integer amount and a currencyCode.",
                 )
-        return jsonify(response)
+            pairs.append((item["amount"], item["currencyCode"]))
+
+        try:
+            converted = currency_service.convert_amounts(pairs, to_currency_code)
+        except ValueError as e:
+            abort_with_error(ErrorCode.INVALID_CURRENCY, str(e))
+        return jsonify({"toCurrencyCode": to_currency_code, "amounts": converted})
 
     return bp
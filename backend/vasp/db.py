@@ -1,43 +1,394 @@
 import logging
-from time import monotonic
-from typing import Any
+import threading
+from contextlib import contextmanager
+from time import monotonic, sleep
+from typing import Any, Dict, Iterator, Optional
 
-from flask import Flask
-from sqlalchemy import create_engine, event
-from sqlalchemy.engine import Engine
+from flask import Flask, g, has_request_context
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import ConnectionPoolEntry, Pool, QueuePool
 from botocore.client import BaseClient
 
 log: logging.Logger = logging.getLogger(__name__)
 
 
+class PoolMetrics:
+    """Counters for the engine's connection pool, fed by pool events."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._timed_checkouts = 0
+        self._checkout_timeouts = 0
+        self._total_checkout_secs = 0.0
+        self._max_checkout_secs = 0.0
+        self._connects = 0
+        self._invalidations = 0
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+    def record_checkin(self) -> None:
+        with self._lock:
+            self._in_use -= 1
+
+    def record_checkout_wait(self, wait_secs: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self._checkout_timeouts += 1
+                return
+            self._timed_checkouts += 1
+            self._total_checkout_secs += wait_secs
+            self._max_checkout_secs = max(self._max_checkout_secs, wait_secs)
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self._connects += 1
+
+    def record_invalidation(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+
+    def to_dict(self, pool: Pool) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {
+                "inUse": self._in_use,
+                "peakInUse": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "connects": self._connects,
+                "invalidations": self._invalidations,
+            }
+            # Only a QueuePool has a fixed size and makes callers wait.
+            if isinstance(pool, QueuePool):
+                stats.update(
+                    {
+                        "size": pool.size(),
+                        "idle": pool.checkedin(),
+                        "overflow": max(pool.overflow(), 0),
+                        "checkoutTimeouts": self._checkout_timeouts,
+                        "avgCheckoutMs": (
+                            round(
+                                self._total_checkout_secs
+                                * 1000
+                                / self._timed_checkouts,
+                                2,
+                            )
+                            if self._timed_checkouts
+                            else 0
+                        ),
+                        "maxCheckoutMs": round(self._max_checkout_secs * 1000, 2),
+                    }
+                )
+            return stats
+
+
+class _TimedQueuePool(QueuePool):
+    # Pool events only fire once a connection has been handed out, so the wait for
+    # one is timed here.
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self) -> Any:
+        start = monotonic()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics:
+                self.metrics.record_checkout_wait(monotonic() - start, timed_out)
+
+    def recreate(self) -> QueuePool:
+        # Called when the engine is disposed, e.g. after a database restart.
+        pool = super().recreate()
+        pool.metrics = self.metrics  # pyre-ignore [16]
+        return pool
+
+
 class SQLAlchemyDB:
     _engine = None
+    _pool_metrics: Optional[PoolMetrics] = None
 
     def init_app(self, app: Flask) -> None:
-        self._engine = create_engine(app.config["DATABASE_URI"])
+        url = make_url(app.config["DATABASE_URI"])
+        connect_args: Dict[str, Any] = {}
+        statement_timeout_secs = app.config.get("DATABASE_STATEMENT_TIMEOUT", 0)
+        if statement_timeout_secs and url.get_backend_name() == "postgresql":
+            connect_args["options"] = (
+                f"-c statement_timeout={int(statement_timeout_secs * 1000)}"
+            )
+
+        pool_args: Dict[str, Any] = {}
+        # Dialects that don't pool by default, such as in-memory SQLite, keep their
+        # own pool class, and only get the metrics that pool events can provide.
+        if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+            pool_args = {
+                "poolclass": _TimedQueuePool,
+                "pool_size": app.config.get("DATABASE_POOL_SIZE", 5),
+                "max_overflow": app.config.get("DATABASE_POOL_MAX_OVERFLOW", 10),
+                # How long to wait for a connection once the pool and overflow are
+                # used up.
+                "pool_timeout": app.config.get("DATABASE_POOL_TIMEOUT", 30),
+            }
+
+        self._engine = create_engine(
+            url,
+            pool_recycle=app.config.get("DATABASE_POOL_RECYCLE", 30 * 60),
+            pool_pre_ping=app.config.get("DATABASE_POOL_PRE_PING", True),
+            connect_args=connect_args,
+            **pool_args,
+        )
+        self._pool_metrics = PoolMetrics()
+        if isinstance(self._engine.pool, _TimedQueuePool):
+            self._engine.pool.metrics = self._pool_metrics
+        _listen_for_pool_events(self._engine, self._pool_metrics)
+        app.teardown_appcontext(self._close_request_session)
 
     @property
     def engine(self) -> Engine:
         assert self._engine
         return self._engine
 
+    @contextmanager
+    def session_scope(self) -> Iterator[Session]:
+        """
+        Yields a session that is shared across a request, so that the user loader,
+        handlers and services reuse its loaded objects rather than each getting
+        detached copies.
+
+        Each block still gets its own transaction. When the outermost block exits, its
+        transaction ends and the connection goes back to the pool, so none is held
+        through outbound calls between blocks. Writes a block doesn't commit are rolled
+        back when it exits, as closing a session of its own would have, and a block
+        that starts while an enclosing block has uncommitted writes gets a session of
+        its own, so it can't commit or discard them. Objects loaded by earlier blocks
+        keep their values, and Core UPDATEs don't change them, so reads that must see
+        the latest row, like wallet balances, load with populate_existing.
+
+        Outside a request, e.g. on background threads, this yields a new session that
+        is closed when the block exits.
+        """
+        if not has_request_context():
+            with Session(self.engine) as db_session:
+                yield db_session
+            return
+
+        db_session = g.get("db_session")
+        if db_session is None:
+            # Commits don't expire loaded objects, which would otherwise reload, and
+            # so hold a connection, wherever they were next used, e.g. current_user.
+            db_session = g.db_session = Session(self.engine, expire_on_commit=False)
+            _track_uncommitted_writes(db_session)
+        elif _has_uncommitted_writes(db_session):
+            with Session(self.engine) as own_session:
+                yield own_session
+            return
+
+        is_outermost = not g.get("db_session_depth")
+        g.db_session_depth = g.get("db_session_depth", 0) + 1
+        try:
+            yield db_session
+        except BaseException:
+            db_session.rollback()
+            raise
+        else:
+            if _has_uncommitted_writes(db_session):
+                db_session.rollback()
+            elif is_outermost and db_session.in_transaction():
+                # Ends the read-only transaction.
+                db_session.commit()
+        finally:
+            g.db_session_depth -= 1
+
+    def _close_request_session(self, _error: Optional[BaseException]) -> None:
+        db_session = g.pop("db_session", None)
+        if db_session is not None:
+            db_session.close()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        assert self._engine and self._pool_metrics
+        return self._pool_metrics.to_dict(self._engine.pool)
+
 
 db = SQLAlchemyDB()
 
 
-def setup_rds_iam_auth(engine: Engine) -> None:
+def _track_uncommitted_writes(db_session: Session) -> None:
+    # Flushes and INSERT/UPDATE/DELETE statements leave writes in the transaction that
+    # session.new, dirty and deleted no longer show.
+    @event.listens_for(db_session, "after_flush")
+    def on_flush(session: Session, _flush_context: Any) -> None:
+        session.info["has_uncommitted_writes"] = True
+
+    @event.listens_for(db_session, "do_orm_execute")
+    def on_execute(orm_execute_state: ORMExecuteState) -> None:
+        if not orm_execute_state.is_select:
+            orm_execute_state.session.info["has_uncommitted_writes"] = True
+
+    @event.listens_for(db_session, "after_commit")
+    @event.listens_for(db_session, "after_rollback")
+    def on_transaction_end(session: Session) -> None:
+        session.info.pop("has_uncommitted_writes", None)
+
+
+def _has_uncommitted_writes(db_session: Session) -> bool:
+    return bool(
+        db_session.new
+        or db_session.dirty
+        or db_session.deleted
+        or db_session.info.get("has_uncommitted_writes")
+    )
+
+
+def _listen_for_pool_events(engine: Engine, metrics: PoolMetrics) -> None:
+    # Listeners on the engine carry over to the pool it creates on dispose.
+    @event.listens_for(engine, "connect")
+    def on_connect(_dbapi_connection: Any, _record: ConnectionPoolEntry) -> None:
+        metrics.record_connect()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(
+        _dbapi_connection: Any, _record: ConnectionPoolEntry, _proxy: Any
+    ) -> None:
+        metrics.record_checkout()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(_dbapi_connection: Any, _record: ConnectionPoolEntry) -> None:
+        metrics.record_checkin()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(
+        _dbapi_connection: Any,
+        _record: ConnectionPoolEntry,
+        error: Optional[BaseException],
+    ) -> None:
+        metrics.record_invalidation()
+        log.warning(f"Database connection invalidated: {error}")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(
+        _dbapi_connection: Any, _record: ConnectionPoolEntry, _error: Any
+    ) -> None:
+        metrics.record_invalidation()
+
+
+# RDS auth tokens are valid for 15 minutes. They're replaced well before that, so a
+# failed refresh can be retried a few times before connections are affected.
+RDS_AUTH_TOKEN_LIFETIME_SECS = 15 * 60
+RDS_AUTH_TOKEN_REFRESH_INTERVAL_SECS = 10 * 60
+RDS_AUTH_TOKEN_RETRY_INTERVAL_SECS = 30
+
+
+class RdsAuthTokenManager:
+    """
+    Keeps a current RDS IAM auth token for one database user.
+
+    Tokens are generated on a background thread ahead of expiry, so opening a
+    connection only reads the latest one. If the refresher has fallen so far behind
+    that the token has expired, the caller generates one itself rather than failing.
+    The rds client only needs generate_db_auth_token, so any stand-in with that
+    method works in its place.
+    """
+
+    def __init__(
+        self,
+        rds: BaseClient,
+        host: str,
+        port: int,
+        user: str,
+        refresh_interval_secs: float = RDS_AUTH_TOKEN_REFRESH_INTERVAL_SECS,
+        retry_interval_secs: float = RDS_AUTH_TOKEN_RETRY_INTERVAL_SECS,
+    ) -> None:
+        self.rds = rds
+        self.host = host
+        self.port = port
+        self.user = user
+        self.refresh_interval_secs = refresh_interval_secs
+        self.retry_interval_secs = retry_interval_secs
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._generated_at = 0.0
+        self._start_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+
+    def get_token(self) -> str:
+        self._ensure_refresher_started()
+        with self._lock:
+            token = self._token
+            if (
+                token
+                and monotonic() - self._generated_at < RDS_AUTH_TOKEN_LIFETIME_SECS
+            ):
+                return token
+        log.warning("No current RDS auth token, generating one on the connect path")
+        return self.refresh()
+
+    def refresh(self) -> str:
+        log.info("Generating RDS auth token")
+        generated_at = monotonic()
+        token = self.rds.generate_db_auth_token(self.host, self.port, self.user)
+        with self._lock:
+            if generated_at > self._generated_at:
+                self._token = token
+                self._generated_at = generated_at
+        return token
+
+    def _ensure_refresher_started(self) -> None:
+        # Started on first use rather than up front, so that it runs in each worker
+        # process rather than only the one that created the app.
+        if self._refresher and self._refresher.is_alive():
+            return
+        with self._start_lock:
+            if self._refresher and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(
+                target=self._run, name="rds-auth-token-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                next_refresh_secs = (
+                    self._generated_at + self.refresh_interval_secs - monotonic()
+                )
+            if next_refresh_secs > 0:
+                sleep(next_refresh_secs)
+                continue
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("Error refreshing RDS auth token")
+                sleep(self.retry_interval_secs)
+
+
+def setup_rds_iam_auth(engine: Engine) -> RdsAuthTokenManager:
     from botocore.session import get_session
 
-    rds: BaseClient = get_session().create_client("rds")
-    token_cache: list[float | str] = []
+    url = engine.url
+    token_manager = RdsAuthTokenManager(
+        get_session().create_client("rds"),
+        host=url.host or "localhost",
+        port=url.port or 5432,
+        user=url.username or "",
+    )
+    # Have a token ready before the first connection. If this fails, the first
+    # connection tries again.
+    try:
+        token_manager.refresh()
+    except Exception:
+        log.exception("Error generating RDS auth token")
 
     @event.listens_for(engine, "do_connect", named=True)
     def provide_token(cparams: dict[str, Any], **_kwargs: Any) -> None:
-        if not token_cache or monotonic() - token_cache[0] > 600:  # pyre-ignore[58]
-            log.info("Generating RDS auth token")
-            token = rds.generate_db_auth_token(
-                cparams["host"], cparams["port"], cparams["user"]
-            )
-            token_cache.clear()
-            token_cache.extend((monotonic(), token))
-        cparams["password"] = token_cache[1]
+        cparams["password"] = token_manager.get_token()
+
+    return token_manager
@@ -0,0 +1,58 @@
+from datetime import datetime
+import enum
+from typing import Optional
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+from vasp.models.Base import Base
+from vasp.utils import generate_uuid
+
+"""Funds set aside from a wallet for an outgoing payment that hasn't settled yet."""
+
+
+class BalanceHoldStatus(enum.Enum):
+    ACTIVE = "ACTIVE"
+    CAPTURED = "CAPTURED"
+    RELEASED = "RELEASED"
+
+
+class BalanceHold(Base):
+    __tablename__ = "balance_hold"
+    __table_args__ = (Index("ix_balance_hold_wallet_id_status", "wallet_id", "status"),)
+
+    id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
+    wallet_id: Mapped[str] = mapped_column(ForeignKey("wallet.id"))
+
+    # Amount in the lowest denomination of the wallet's currency.
+    amount_in_lowest_denom: Mapped[int] = mapped_column(Integer)
+    currency_code: Mapped[str] = mapped_column(String)
+
+    status: Mapped[BalanceHoldStatus] = mapped_column(
+        Enum(BalanceHoldStatus), default=BalanceHoldStatus.ACTIVE
+    )
+    # Active holds past this are released the next time the wallet places a hold or
+    # its available balance is read, in case the payment was never sent. Holds for a
+    # payment that was sent wait for its outcome instead.
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    # The outgoing payment the hold is for, once it has been sent. Its PAYMENT_FINISHED
+    # webhook captures or releases the hold, however long the payment takes.
+    payment_id: Mapped[Optional[str]] = mapped_column(
+        String, nullable=True, unique=True, index=True
+    )
+    sender_uma: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    receiver_uma: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # For the post-transaction callback and compliance monitoring, which are done
+    # when the hold is captured, whichever of the send and the webhook gets there.
+    utxo_callback: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    receiving_node_pubkey: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    resolved_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    def __repr__(self) -> str:
+        return f"BalanceHold(id={self.id!r}, wallet_id={self.wallet_id!r}, amount_in_lowest_denom={self.amount_in_lowest_denom!r}, status={self.status!r})"
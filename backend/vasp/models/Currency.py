@@ -15,7 +15,7 @@ class Currency(Base):
     __tablename__ = "currency"
 
     id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
-    wallet_id: Mapped[int] = mapped_column(ForeignKey("wallet.id"))
+    wallet_id: Mapped[int] = mapped_column(ForeignKey("wallet.id"), index=True)
     code: Mapped[str] = mapped_column(String)
 
     wallet: Mapped["Wallet"] = relationship(back_populates="currency")
@@ -25,7 +25,7 @@ class PayReqResponse(Base):
     uma_id: Mapped[int] = mapped_column(ForeignKey("uma.id"))
 
     # Payment/transaction hash used to identify received payments
-    payment_hash: Mapped[str] = mapped_column(String)
+    payment_hash: Mapped[str] = mapped_column(String, index=True)
 
     # Amount in the lowest denomination of the currency, e.g. 1234 for $12.34
     amount_in_lowest_denom: Mapped[int] = mapped_column(Integer)
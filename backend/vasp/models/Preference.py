@@ -1,6 +1,6 @@
 import enum
 from sqlalchemy.orm import Mapped, relationship, mapped_column
-from sqlalchemy import String, ForeignKey, Enum
+from sqlalchemy import String, ForeignKey, Enum, Index
 from vasp.models.Base import Base
 from typing import TYPE_CHECKING
 from vasp.utils import generate_uuid
@@ -20,6 +20,11 @@ class PreferenceType(enum.Enum):
 
 class Preference(Base):
     __tablename__ = "user_preferences"
+    __table_args__ = (
+        Index(
+            "ix_user_preferences_user_id_preference_type", "user_id", "preference_type"
+        ),
+    )
 
     id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
 
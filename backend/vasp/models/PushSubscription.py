@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy.orm import Mapped, relationship, mapped_column
-from sqlalchemy import DateTime, ForeignKey, String, func
+from sqlalchemy import DateTime, ForeignKey, Index, String, func
 from vasp.models.Base import Base
 from typing import TYPE_CHECKING
 from vasp.utils import generate_uuid
@@ -13,6 +13,9 @@ if TYPE_CHECKING:
 
 class PushSubscription(Base):
     __tablename__ = "push_subscription"
+    __table_args__ = (
+        Index("ix_push_subscription_user_id_last_used", "user_id", "last_used"),
+    )
 
     id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
     user_id: Mapped[str] = mapped_column(ForeignKey("user.id"))
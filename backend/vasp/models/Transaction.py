@@ -1,6 +1,15 @@
 from datetime import datetime
+import enum
 from sqlalchemy.orm import Mapped, relationship, mapped_column
-from sqlalchemy import String, ForeignKey, Integer, DateTime
+from sqlalchemy import (
+    String,
+    ForeignKey,
+    Integer,
+    DateTime,
+    Enum,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.sql import func
 from vasp.models.Base import Base
 from typing import TYPE_CHECKING
@@ -13,8 +22,35 @@ if TYPE_CHECKING:
 """Stores transaction information."""
 
 
+class TransactionDirection(enum.Enum):
+    CREDIT = "CREDIT"
+    DEBIT = "DEBIT"
+
+
 class Transaction(Base):
     __tablename__ = "transaction"
+    # A payment is recorded at most once per side per UMA. Credits rely on this to
+    # ignore redelivered payment webhooks.
+    __table_args__ = (
+        UniqueConstraint(
+            "uma_id",
+            "transaction_hash",
+            "direction",
+            name="uq_transaction_uma_id_transaction_hash_direction",
+        ),
+        # Transaction history, newest first, by owner and by either side's UMA. id
+        # breaks ties between rows created at the same time for keyset pagination.
+        Index("ix_transaction_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index(
+            "ix_transaction_sender_uma_created_at_id", "sender_uma", "created_at", "id"
+        ),
+        Index(
+            "ix_transaction_receiver_uma_created_at_id",
+            "receiver_uma",
+            "created_at",
+            "id",
+        ),
+    )
 
     id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
 
@@ -31,6 +67,10 @@ class Transaction(Base):
     amount_in_lowest_denom: Mapped[int] = mapped_column(Integer)
     currency_code: Mapped[str] = mapped_column(String)
 
+    # Whether the amount was added to or taken from the wallet. Matches the sign of
+    # amount_in_lowest_denom.
+    direction: Mapped[TransactionDirection] = mapped_column(Enum(TransactionDirection))
+
     # UMA address of the sender, not necessarily a registered user.
     sender_uma: Mapped[str] = mapped_column(String)
     # UMA address of the receiver, not necessarily a registered user.
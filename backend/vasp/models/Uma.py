@@ -17,7 +17,7 @@ class Uma(Base):
     __tablename__ = "uma"
 
     id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
-    user_id: Mapped[str] = mapped_column(ForeignKey("user.id"))
+    user_id: Mapped[str] = mapped_column(ForeignKey("user.id"), index=True)
     wallet_id: Mapped[str] = mapped_column(ForeignKey("wallet.id"))
     username: Mapped[str] = mapped_column(String, unique=True)
     default: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -0,0 +1,21 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Integer, String
+from vasp.models.Base import Base
+
+"""Stores nonces seen on signed UMA messages, for replay protection."""
+
+
+class UmaNonce(Base):
+    __tablename__ = "uma_nonce"
+
+    nonce: Mapped[str] = mapped_column(String, primary_key=True)
+
+    # Start of the nonce's timestamp in whole buckets since the epoch. Nonces are
+    # pruned a bucket at a time.
+    bucket: Mapped[int] = mapped_column(Integer, index=True)
+
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"UmaNonce(nonce={self.nonce!r}, bucket={self.bucket!r}, timestamp={self.timestamp!r})"
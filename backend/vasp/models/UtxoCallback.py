@@ -0,0 +1,53 @@
+from datetime import datetime
+import enum
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Enum, Index, Integer, JSON, String
+from sqlalchemy.sql import func
+from vasp.models.Base import Base
+from vasp.utils import generate_uuid
+
+"""Outbox of post-transaction UTXO callbacks waiting to be delivered to counterparty VASPs."""
+
+
+class UtxoCallbackStatus(enum.Enum):
+    PENDING = "PENDING"
+    DELIVERED = "DELIVERED"
+    FAILED = "FAILED"
+
+
+class UtxoCallback(Base):
+    __tablename__ = "utxo_callback"
+    __table_args__ = (
+        Index("ix_utxo_callback_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
+
+    # Lightspark id of the outgoing payment the callback is for.
+    payment_id: Mapped[str] = mapped_column(String)
+
+    # URL the receiving VASP gave us in its payreq response, and its domain.
+    callback_url: Mapped[str] = mapped_column(String)
+    domain: Mapped[str] = mapped_column(String)
+
+    # List of {"utxo": str, "amountMsats": int}. The callback is signed at delivery time
+    # so that retries carry a fresh nonce and timestamp.
+    utxos: Mapped[List[Dict[str, Any]]] = mapped_column(JSON)
+
+    status: Mapped[UtxoCallbackStatus] = mapped_column(
+        Enum(UtxoCallbackStatus), default=UtxoCallbackStatus.PENDING
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    def __repr__(self) -> str:
+        return f"UtxoCallback(id={self.id!r}, payment_id={self.payment_id!r}, domain={self.domain!r}, status={self.status!r}, attempts={self.attempts!r})"
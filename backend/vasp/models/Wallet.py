@@ -67,9 +67,14 @@ class Wallet(Base):
     __tablename__ = "wallet"
 
     id: Mapped[str] = mapped_column(primary_key=True, default=generate_uuid)
-    user_id: Mapped[str] = mapped_column(ForeignKey("user.id"))
+    user_id: Mapped[str] = mapped_column(ForeignKey("user.id"), index=True)
     # Amount in the lowest denomination of the currency, e.g. 1234 for $12.34
     amount_in_lowest_denom: Mapped[int] = mapped_column(Integer)
+    # Sum of the wallet's active balance holds. Only what's left after these is
+    # available to spend.
+    held_amount_in_lowest_denom: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0"
+    )
     color: Mapped[Color] = mapped_column(Enum(Color))
 
     device_token: Mapped[Optional[str]] = mapped_column(String)
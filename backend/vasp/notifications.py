@@ -1,5 +1,4 @@
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 import logging
 
 from flask import Blueprint, request, jsonify
@@ -38,7 +37,7 @@ def construct_blueprint(config: Config) -> Blueprint:
             abort_with_error(ErrorCode.INVALID_INPUT, "Subscription not found.")
 
         subscription_json = data["subscription_json"]
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             existing_subscriptions = db_session.scalars(
                 select(PushSubscription)
                 .where(PushSubscription.user_id == current_user.id)
@@ -62,7 +61,7 @@ def construct_blueprint(config: Config) -> Blueprint:
     @bp.post("/unsubscribe")
     @login_required
     def unsubscribe() -> WerkzeugResponse:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             subscriptions = db_session.scalars(
                 select(PushSubscription).where(
                     PushSubscription.user_id == current_user.id
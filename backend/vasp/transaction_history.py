@@ -0,0 +1,129 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence, Tuple, TypeVar
+
+from flask import Response
+from sqlalchemy import Select, select, tuple_
+from uma import ErrorCode
+from uma_auth.models.transaction_type import TransactionType
+from werkzeug.datastructures import MultiDict
+
+from vasp.models.Transaction import Transaction
+from vasp.uma_vasp.uma_exception import abort_with_error
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_Row = TypeVar("_Row", bound=Tuple)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass(frozen=True)
+class TransactionPage:
+    """
+    A page of transaction history, newest first, read from query args:
+    - limit: page size, up to MAX_PAGE_SIZE.
+    - cursor: the X-Next-Cursor header of the previous page.
+    - from / until: inclusive bounds on created_at, in seconds since the epoch.
+    - type: "incoming" or "outgoing".
+    """
+
+    limit: int
+    after_id: Optional[str]
+    from_time: Optional[datetime]
+    until_time: Optional[datetime]
+    transaction_type: Optional[TransactionType]
+
+    @classmethod
+    def from_request_args(cls, args: "MultiDict[str, str]") -> "TransactionPage":
+        try:
+            limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+            from_time = _parse_timestamp(args.get("from"))
+            until_time = _parse_timestamp(args.get("until"))
+            transaction_type = TransactionType(args["type"]) if "type" in args else None
+        except (ValueError, OverflowError, OSError) as e:
+            abort_with_error(ErrorCode.INVALID_INPUT, f"Invalid query: {e}")
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            abort_with_error(
+                ErrorCode.INVALID_INPUT, f"limit must be from 1 to {MAX_PAGE_SIZE}."
+            )
+
+        cursor = args.get("cursor")
+        after_id = None
+        if cursor:
+            try:
+                after_id = base64.urlsafe_b64decode(cursor.encode()).decode()
+            except (binascii.Error, UnicodeDecodeError):
+                abort_with_error(ErrorCode.INVALID_INPUT, "Invalid cursor.")
+        return cls(
+            limit=limit,
+            after_id=after_id,
+            from_time=from_time,
+            until_time=until_time,
+            transaction_type=transaction_type,
+        )
+
+    def apply(self, statement: Select[_Row]) -> Select[_Row]:
+        """
+        Adds the time bounds, cursor, order and limit to a query over Transaction.
+        One extra row is fetched to tell whether there's another page.
+        """
+        # Both bounds are whole seconds and inclusive, with until covering all of its
+        # second. They're written as > the microsecond before from and <= the last
+        # microsecond of until, not >= from and < until + 1s. That's the same thing,
+        # except in SQLite, which compares timestamps as strings and stores
+        # CURRENT_TIMESTAMP without a fraction, so "T" sorts before "T.000000".
+        if self.from_time:
+            statement = statement.where(
+                Transaction.created_at > self.from_time - _MICROSECOND
+            )
+        if self.until_time:
+            statement = statement.where(
+                Transaction.created_at
+                <= self.until_time + timedelta(seconds=1) - _MICROSECOND
+            )
+        if self.after_id:
+            # Compare against the cursor row's own created_at rather than a copy in
+            # the cursor, so nothing depends on how the database rounds timestamps.
+            # Either way this is a range on the (..., created_at, id) indexes, so
+            # later pages cost the same as the first.
+            statement = statement.where(
+                tuple_(Transaction.created_at, Transaction.id)
+                < tuple_(
+                    select(Transaction.created_at)
+                    .where(Transaction.id == self.after_id)
+                    .scalar_subquery(),
+                    self.after_id,
+                )
+            )
+        return statement.order_by(
+            Transaction.created_at.desc(), Transaction.id.desc()
+        ).limit(self.limit + 1)
+
+    def split(
+        self, transactions: Sequence[Transaction]
+    ) -> Tuple[Sequence[Transaction], Optional[str]]:
+        """Returns the page's transactions and the cursor for the next page, if any."""
+        if len(transactions) <= self.limit:
+            return transactions, None
+        transactions = transactions[: self.limit]
+        return transactions, _encode_cursor(transactions[-1].id)
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> Response:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+def _encode_cursor(transaction_id: str) -> str:
+    return base64.urlsafe_b64encode(transaction_id.encode()).decode()
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(int(value), tz=timezone.utc)
@@ -7,14 +7,12 @@ from uuid import uuid4
 from flask import Blueprint, Response, jsonify, request
 from flask_login import current_user, login_user, login_required
 from sqlalchemy import exc, func, select
-from sqlalchemy.orm import Session
 from uma import (
     ErrorCode,
     KycStatus,
     INonceCache,
     IPublicKeyCache,
     PostTransactionCallback,
-    fetch_public_key_for_vasp,
     verify_post_transaction_callback_signature,
 )
 
@@ -26,6 +24,8 @@ from vasp.models.User import User as UserModel
 from vasp.models.Wallet import Color, WalletUserType
 from vasp.models.Wallet import Wallet as WalletModel
 from vasp.uma_vasp.currencies import CURRENCIES
+from vasp.uma_vasp.interfaces.currency_service import ICurrencyService
+from vasp.uma_vasp.public_key_helpers import fetch_public_key_for_vasp
 from vasp.uma_vasp.uma_exception import abort_with_error
 from vasp.uma_vasp.user import User
 from vasp.user import DEFAULT_PREFERENCES
@@ -41,9 +41,10 @@ def register_uma(
     uma_user_name: str,
     currencies: List[str],
     kyc_status: KycStatus,
+    currency_service: ICurrencyService,
     initial_amount: int = 0,
 ) -> tuple[User, WalletModel]:
-    with Session(db.engine) as db_session:
+    with db.session_scope() as db_session:
         try:
             if db_session.scalars(
                 select(UmaModel).where(UmaModel.username == uma_user_name)
@@ -108,6 +109,9 @@ def register_uma(
                     db_session.add(preference)
 
                 db_session.commit()
+                # Lookups of the name before it was registered may have cached it
+                # with no currencies.
+                currency_service.invalidate_uma_currencies(uma_user_name)
                 return User.from_model(user), new_wallet
 
         except exc.SQLAlchemyError as err:
@@ -116,7 +120,9 @@ def register_uma(
 
 
 def construct_blueprint(
-    pubkey_cache: IPublicKeyCache, nonce_cache: INonceCache
+    pubkey_cache: IPublicKeyCache,
+    nonce_cache: INonceCache,
+    currency_service: ICurrencyService,
 ) -> Blueprint:
     bp = Blueprint("uma", __name__, url_prefix="/api/uma")
 
@@ -130,7 +136,7 @@ def construct_blueprint(
         initial_amount = data.get("initial_amount", 0)
 
         if current_user.is_authenticated:
-            with Session(db.engine) as db_session:
+            with db.session_scope() as db_session:
                 count_uma_current_user = (
                     db_session.scalar(
                         select(func.count(UmaModel.username)).where(
@@ -152,13 +158,16 @@ def construct_blueprint(
             uma_user_name=uma_user_name,
             currencies=currencies,
             kyc_status=kyc_status,
+            currency_service=currency_service,
             initial_amount=initial_amount,
         )
         login_user(user, remember=True)
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet_fresh = db_session.scalars(
-                select(WalletModel).where(WalletModel.id == wallet.id)
+                select(WalletModel)
+                .where(WalletModel.id == wallet.id)
+                .execution_options(populate_existing=True)
             ).first()
 
             return jsonify(
@@ -179,7 +188,7 @@ def construct_blueprint(
 
     @bp.get("/<uma_user_name>")
     def uma(uma_user_name: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             uma_model = db_session.scalars(
                 select(UmaModel).where(UmaModel.username == uma_user_name)
             ).first()
@@ -188,7 +197,7 @@ def construct_blueprint(
     @bp.put("/<uma_user_name>")
     @login_required
     def update_uma(uma_user_name: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             uma_model = db_session.scalars(
                 select(UmaModel).where(UmaModel.username == uma_user_name)
             ).first()
@@ -217,6 +226,8 @@ def construct_blueprint(
 
             uma_model.username = new_username
             db_session.commit()
+            currency_service.invalidate_uma_currencies(uma_user_name)
+            currency_service.invalidate_uma_currencies(new_username)
 
             return jsonify(uma_model.to_dict())
 
@@ -296,7 +307,7 @@ def _generate_random_uma(batch_size: int = 100, max_attempts: int = 100) -> str
 
 
 def _available_umas_in_set(umaSet: set[str]) -> set[str]:
-    with Session(db.engine) as db_session:
+    with db.session_scope() as db_session:
         existing_uma = db_session.scalars(
             select(UmaModel).where(UmaModel.username.in_(umaSet))
         ).all()
@@ -6,19 +6,21 @@ from bolt11 import decode as bolt11_decode
 from flask import Blueprint, Response, current_app, jsonify, request, session
 from vasp.uma_vasp.currencies import CURRENCIES
 from lightspark import LightsparkSyncClient
-from lightspark.objects.CurrencyUnit import CurrencyUnit
 from lightspark.objects.TransactionStatus import TransactionStatus
 from lightspark.utils.currency_amount import amount_as_msats
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 from sqlalchemy.sql import or_
 from vasp.db import db
 from vasp.utils import get_vasp_domain, get_username_from_uma
 from vasp.models.Quote import Quote
 from vasp.models.Transaction import Transaction
+from vasp.transaction_history import TransactionPage, set_next_cursor
 from vasp.uma_vasp.config import Config
 from vasp.uma_vasp.interfaces.compliance_service import IComplianceService
 from vasp.uma_vasp.interfaces.ledger_service import ILedgerService
+from vasp.uma_vasp.interfaces.payment_completion_waiter import (
+    IPaymentCompletionWaiter,
+)
 from vasp.uma_vasp.interfaces.request_storage import IRequestStorage
 from vasp.uma_vasp.interfaces.sending_vasp_request_cache import (
     ISendingVaspRequestCache,
@@ -27,9 +29,16 @@ from vasp.uma_vasp.interfaces.currency_service import (
     ICurrencyService,
     CurrencyOptions,
 )
+from vasp.uma_vasp.interfaces.uma_version_cache import IUmaVersionCache
 from vasp.uma_vasp.interfaces.user_service import IUserService
-from vasp.uma_vasp.lightspark_helpers import get_node
-from vasp.uma_vasp.sending_vasp import SendingVasp, get_sending_vasp
+from vasp.uma_vasp.utxo_callback_outbox import UtxoCallbackOutbox
+from vasp.uma_vasp.http_client import OutboundHttpClient
+from vasp.uma_vasp.lightspark_helpers import LightsparkNodeCache
+from vasp.uma_vasp.sending_vasp import (
+    BALANCE_HOLD_EXPIRY_SECS,
+    SendingVasp,
+    get_sending_vasp,
+)
 from vasp.uma_vasp.uma_exception import abort_with_error
 from vasp.uma_vasp.user import User
 from uma import Currency, ErrorCode
@@ -65,38 +74,14 @@ class UmaNwcBridge:
         lightspark_client: LightsparkSyncClient,
         sending_vasp: SendingVasp,
         config: Config,
+        node_cache: LightsparkNodeCache,
     ) -> None:
         self.ledger_service = ledger_service
         self.currency_service = currency_service
         self.lightspark_client = lightspark_client
         self.sending_vasp = sending_vasp
         self.config = config
-
-    def _load_signing_key(self) -> None:
-        node = get_node(self.lightspark_client, self.config.node_id)
-
-        if "OSK" in node.typename:
-            osk_password = self.config.osk_node_signing_key_password
-            if not osk_password:
-                abort_with_error(
-                    ErrorCode.INTERNAL_ERROR,
-                    "OSK password is required for OSK nodes.",
-                )
-            self.lightspark_client.recover_node_signing_key(
-                self.config.node_id, osk_password
-            )
-            return
-
-        # Assume remote signing.
-        master_seed = self.config.get_remote_signing_node_master_seed()
-        if not master_seed:
-            abort_with_error(
-                ErrorCode.INTERNAL_ERROR,
-                "Remote signing master seed is required for remote signing nodes.",
-            )
-        self.lightspark_client.provide_node_master_seed(
-            self.config.node_id, master_seed, node.bitcoin_network
-        )
+        self.node_cache = node_cache
 
     def transactions(self) -> Response:
         uma = session.get("uma")
@@ -104,19 +89,23 @@ class UmaNwcBridge:
         if uma is None:
             abort_with_error(ErrorCode.USER_NOT_FOUND, "Uma not found in session")
 
-        with Session(db.engine) as db_session:
-            # TODO: Add pagination
-            transactions = db_session.scalars(
-                select(Transaction)
-                .where(
-                    or_(
-                        Transaction.sender_uma == uma,
-                        Transaction.receiver_uma == uma,
-                    )
-                )
-                .order_by(Transaction.created_at.desc())
-                .limit(20)
-            ).all()
+        page = TransactionPage.from_request_args(request.args)
+        if page.transaction_type == TransactionType.INCOMING:
+            condition = Transaction.receiver_uma == uma
+        elif page.transaction_type == TransactionType.OUTGOING:
+            condition = Transaction.sender_uma == uma
+        else:
+            condition = or_(
+                Transaction.sender_uma == uma,
+                Transaction.receiver_uma == uma,
+            )
+
+        with db.session_scope() as db_session:
+            transactions, next_cursor = page.split(
+                db_session.scalars(
+                    page.apply(select(Transaction).where(condition))
+                ).all()
+            )
             if not transactions:
                 return jsonify([])
 
@@ -135,7 +124,7 @@ class UmaNwcBridge:
                 }
                 for transaction in transactions
             ]
-            return jsonify(response)
+            return set_next_cursor(jsonify(response), next_cursor)
 
     def handle_pay_invoice(self) -> dict[str, Any]:
         uma = session.get("uma")
@@ -168,31 +157,48 @@ class UmaNwcBridge:
                 ErrorCode.INVALID_INPUT, "Amount does not match invoice amount."
             )
 
-        self._load_signing_key()
-        payment_result = self.lightspark_client.pay_invoice(
-            self.config.node_id,
-            invoice,
-            timeout_secs=60,
-            maximum_fees_msats=1000,
-            amount_msats=amount,
-        )
+        amount_sats = round((bolt11.amount_msat or amount) / 1000)
+        # Hold the funds before paying, like a UMA send does, so the payment can't
+        # leave the node without the wallet covering it.
+        try:
+            hold_id = self.ledger_service.place_hold(
+                uma, amount_sats, "SAT", expires_in_secs=BALANCE_HOLD_EXPIRY_SECS
+            )
+        except ValueError:
+            abort_with_error(ErrorCode.INTERNAL_ERROR, "Insufficient balance.")
+
+        try:
+            self.node_cache.load_signing_key()
+            payment_result = self.lightspark_client.pay_invoice(
+                self.config.node_id,
+                invoice,
+                timeout_secs=60,
+                maximum_fees_msats=1000,
+                amount_msats=amount,
+            )
+        except Exception:
+            self.node_cache.invalidate()
+            self.ledger_service.release_hold(hold_id)
+            raise
         if not payment_result:
+            self.ledger_service.release_hold(hold_id)
             abort_with_error(ErrorCode.INTERNAL_ERROR, "Payment failed.")
+        # Lets the PAYMENT_FINISHED webhook settle the hold if we stop waiting first.
+        self.ledger_service.attach_hold_to_payment(
+            hold_id, payment_result.id, uma, "NWC"
+        )
+
         payment = self.sending_vasp.wait_for_payment_completion(payment_result)
         transaction_hash = payment.transaction_hash
         if payment.status != TransactionStatus.SUCCESS or not transaction_hash:
+            if payment.status == TransactionStatus.FAILED:
+                self.ledger_service.release_hold(hold_id)
             abort_with_error(
                 ErrorCode.INTERNAL_ERROR,
                 f"Payment failed. {payment.failure_message}",
             )
 
-        amount_sats = payment.amount.convert_to(
-            CurrencyUnit.SATOSHI
-        ).preferred_currency_value_rounded
-
-        self.ledger_service.subtract_wallet_balance(
-            transaction_hash, amount_sats, "SAT", uma, "NWC"
-        )
+        self.ledger_service.capture_hold(hold_id, transaction_hash, uma, "NWC")
         preimage = payment_result.payment_preimage
         if not preimage:
             abort_with_error(ErrorCode.INTERNAL_ERROR, "Payment preimage not found.")
@@ -317,7 +323,7 @@ class UmaNwcBridge:
         if currency_code not in CURRENCIES:
             abort_with_error(ErrorCode.INVALID_CURRENCY, "Invalid currency code")
 
-        balance, wallet_currency_code = self.ledger_service.get_wallet_balance(uma)
+        balance, wallet_currency_code = self.ledger_service.get_available_balance(uma)
         if currency_code != wallet_currency_code:
             currency_multiplier = self.currency_service.get_smallest_unit_multiplier(
                 CurrencyOptions(
@@ -487,7 +493,7 @@ class UmaNwcBridge:
             user_id=session.get("user_id"),
         )
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             quote = Quote(
                 payment_hash=uma_payreq_result.payment_hash,
                 expires_at=datetime.fromtimestamp(
@@ -527,7 +533,7 @@ class UmaNwcBridge:
             ).to_dict()
 
     def handle_execute_quote(self, payment_hash: str) -> dict[str, Any]:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             quote = db_session.scalars(
                 select(Quote).where(Quote.payment_hash == payment_hash)
             ).first()
@@ -542,7 +548,7 @@ class UmaNwcBridge:
 
         payment = self.sending_vasp.handle_send_payment(quote.callback_uuid)
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             quote.settled_at = payment.get("settledAt")
             db_session.commit()
 
@@ -685,6 +691,11 @@ def construct_blueprint(
     request_cache: ISendingVaspRequestCache,
     nonce_cache: INonceCache,
     uma_request_storage: IRequestStorage,
+    payment_waiter: IPaymentCompletionWaiter,
+    node_cache: LightsparkNodeCache,
+    http_client: OutboundHttpClient,
+    uma_version_cache: IUmaVersionCache,
+    utxo_callback_outbox: UtxoCallbackOutbox,
 ) -> Blueprint:
     bp = Blueprint("umanwc", __name__, url_prefix="/api/umanwc")
 
@@ -700,6 +711,11 @@ def construct_blueprint(
             request_cache=request_cache,
             nonce_cache=nonce_cache,
             uma_request_storage=uma_request_storage,
+            payment_waiter=payment_waiter,
+            node_cache=node_cache,
+            http_client=http_client,
+            uma_version_cache=uma_version_cache,
+            utxo_callback_outbox=utxo_callback_outbox,
         )
 
         nwc_bridge = UmaNwcBridge(
@@ -708,6 +724,7 @@ def construct_blueprint(
             lightspark_client=lightspark_client,
             sending_vasp=sending_vasp,
             config=config,
+            node_cache=node_cache,
         )
         return nwc_bridge
 
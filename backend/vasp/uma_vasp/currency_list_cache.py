@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import Request, Response, current_app
+
+from vasp.uma_vasp.interfaces.currency_service import ICurrencyService
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Distinct currency lists kept per rate version. /api/currencies is one entry, and
+# the rest are the combinations of wallet currencies users actually have.
+MAX_CACHED_LISTS = 1024
+
+
+@dataclass(frozen=True)
+class SerializedCurrencyList:
+    body: bytes
+    etag: str
+
+    def to_response(self, request: Request, cache_control: str) -> Response:
+        """
+        Builds the response for this list, or a 304 if the request's If-None-Match
+        already has it.
+        """
+        response = current_app.response_class(
+            self.body, mimetype=current_app.json.mimetype  # pyre-ignore [16]
+        )
+        response.set_etag(self.etag)
+        response.headers["Cache-Control"] = cache_control
+        return response.make_conditional(request)
+
+
+class CurrencyListCache:
+    """
+    JSON-serialized lists of UMA currencies, built once per exchange rate version and
+    then served from memory until the currency service reports new rates.
+
+    The ETag is a hash of the body rather than the rate version, so workers that
+    fetched the same rates hand out the same tag.
+    """
+
+    def __init__(self, currency_service: ICurrencyService) -> None:
+        self.currency_service = currency_service
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._lists: Dict[Tuple[str, ...], SerializedCurrencyList] = {}
+
+    def get(self, currency_codes: Iterable[str]) -> SerializedCurrencyList:
+        key = tuple(currency_codes)
+        try:
+            version = self.currency_service.get_rates_version()
+        except ValueError:
+            # No usable rates right now. Build the list uncached, which skips every
+            # currency that needs a rate.
+            return self._serialize(key)
+
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._lists.clear()
+            serialized = self._lists.get(key)
+        if serialized:
+            return serialized
+
+        serialized = self._serialize(key)
+        with self._lock:
+            if version == self._version and len(self._lists) < MAX_CACHED_LISTS:
+                self._lists[key] = serialized
+        return serialized
+
+    def _serialize(self, currency_codes: Tuple[str, ...]) -> SerializedCurrencyList:
+        currencies = []
+        for currency_code in currency_codes:
+            try:
+                currencies.append(self.currency_service.get_uma_currency(currency_code))
+            except ValueError:
+                log.warning(
+                    "Skipping currency %s: no exchange rate available", currency_code
+                )
+        body = current_app.json.dumps(currencies).encode()  # pyre-ignore [16]
+        return SerializedCurrencyList(
+            body=body, etag=hashlib.sha256(body).hexdigest()[:32]
+        )
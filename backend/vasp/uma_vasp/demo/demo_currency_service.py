@@ -1,54 +1,41 @@
-from typing import Optional
+from typing import Sequence, Tuple
 
+from flask_caching import Cache
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 from vasp.db import db
 from vasp.uma_vasp.interfaces.currency_service import (
     ICurrencyService,
     CurrencyOptions,
 )
 from vasp.uma_vasp.currencies import CURRENCIES
+from vasp.uma_vasp.exchange_rates import ExchangeRateProvider
 from uma import Currency
 from vasp.models.Currency import Currency as CurrencyModel
 from vasp.models.Wallet import Wallet as WalletModel
 from vasp.models.Uma import Uma as UmaModel
-import time
 
 
-import requests
+# Backstop for changes to a UMA's currencies that don't go through
+# invalidate_uma_currencies, like edits made directly in the database.
+UMA_CURRENCY_CODES_TIMEOUT_SECS = 10 * 60
 
 
 class DemoCurrencyService(ICurrencyService):
-    def __init__(self) -> None:
-        self.conversion_rates: Optional[dict[str, str]] = None
-        self.last_request_time: float = 0.0
+    def __init__(self, rate_provider: ExchangeRateProvider, cache: Cache) -> None:
+        self.rate_provider = rate_provider
+        self.cache = cache
 
     def get_conversion_rates(self) -> dict[str, str]:
-        # Check if the cached rates are still valid (e.g., less than a minute old)
-        if self.conversion_rates and (time.time() - self.last_request_time) < 1:
-            return self.conversion_rates
+        # Served from the last snapshot. The provider refreshes it in the background.
+        return self.rate_provider.get_snapshot().rates
 
-        # If not valid, make a new request to the currency conversion API
-        response = requests.get(
-            "https://api.coinbase.com/v2/exchange-rates?currency=BTC"
-        )
-        self.conversion_rates = response.json().get("data").get("rates")
-        self.last_request_time = time.time()
-
-        if (self.conversion_rates is None) or (len(self.conversion_rates) == 0):
-            raise ValueError("No conversion rates found.")
-        return self.conversion_rates
+    def get_rates_version(self) -> str:
+        return repr(self.rate_provider.get_snapshot().fetched_at)
 
-    def _get_supported_currency_codes(self) -> set[str]:
+    def _get_supported_currency_codes(self) -> frozenset[str]:
         """Returns the set of currency codes supported by both our system and the exchange rate API."""
-        conversion_rates = self.get_conversion_rates()
-        # SAT is always supported (handled specially in get_currency_multiplier)
-        supported = {"SAT"}
-        # Add currencies that exist in both our CURRENCIES dict and the API response
-        for code in CURRENCIES:
-            if code in conversion_rates:
-                supported.add(code)
-        return supported
+        # SAT is always supported, and so is anything in CURRENCIES with a rate.
+        return self.rate_provider.get_snapshot().conversions.supported_codes
 
     def get_uma_currency(self, currency_code: str) -> Currency:
         return Currency(
@@ -72,29 +59,47 @@ class DemoCurrencyService(ICurrencyService):
         )
 
     def get_uma_currencies_for_uma(self, username: str) -> list[Currency]:
-        with Session(db.engine) as db_session:
-            wallet = db_session.scalars(
-                select(WalletModel).join(UmaModel).where(UmaModel.username == username)
-            ).first()
-            currencies = db_session.scalars(
-                select(CurrencyModel).where(CurrencyModel.wallet_id == wallet.id)
-            ).all()
-            currencies = db_session.scalars(
-                select(CurrencyModel)
-                .join(WalletModel)
-                .join(UmaModel)
-                .where(UmaModel.username == username)
-            ).all()
-
-            # Filter to only currencies supported by the exchange rate API
-            supported_currencies = self._get_supported_currency_codes()
-            return [
-                self.get_uma_currency(currency.code)
-                for currency in currencies
-                if currency.code in supported_currencies
-            ]
+        # Filter to only currencies supported by the exchange rate API
+        supported_currencies = self._get_supported_currency_codes()
+        return [
+            self.get_uma_currency(currency_code)
+            for currency_code in self._get_currency_codes_for_uma(username)
+            if currency_code in supported_currencies
+        ]
+
+    def invalidate_uma_currencies(self, username: str) -> None:
+        self.cache.delete(f"uma_currency_codes_{username}")
+
+    def _get_currency_codes_for_uma(self, username: str) -> list[str]:
+        currency_codes = self.cache.get(f"uma_currency_codes_{username}")
+        if currency_codes is not None:
+            return currency_codes
+
+        with db.session_scope() as db_session:
+            currency_codes = list(
+                db_session.scalars(
+                    select(CurrencyModel.code)
+                    .join(WalletModel)
+                    .join(UmaModel)
+                    .where(UmaModel.username == username)
+                ).all()
+            )
+        self.cache.set(
+            f"uma_currency_codes_{username}",
+            currency_codes,
+            timeout=UMA_CURRENCY_CODES_TIMEOUT_SECS,
+        )
+        return currency_codes
 
     def get_currency_multiplier(self, currency_options: CurrencyOptions) -> float:
+        conversions = self.rate_provider.get_snapshot().conversions
+        multiplier = conversions.get_currency_multiplier(
+            currency_options.from_currency_code, currency_options.to_currency_code
+        )
+        if multiplier is not None:
+            return multiplier
+
+        # Codes outside CURRENCIES aren't in the precomputed matrix.
         conversion_rates = self.get_conversion_rates()
 
         # Rates convert to BTC
@@ -122,7 +127,21 @@ class DemoCurrencyService(ICurrencyService):
             )
 
     def get_smallest_unit_multiplier(self, currency_options: CurrencyOptions) -> float:
+        conversions = self.rate_provider.get_snapshot().conversions
+        multiplier = conversions.get_smallest_unit_multiplier(
+            currency_options.from_currency_code, currency_options.to_currency_code
+        )
+        if multiplier is not None:
+            return multiplier
+
+        # Not in the matrix, so fall back to computing it, which raises as before.
         base_multiplier = self.get_currency_multiplier(currency_options)
         from_currency = CURRENCIES[currency_options.from_currency_code]
         to_currency = CURRENCIES[currency_options.to_currency_code]
         return base_multiplier / (10 ** (from_currency.decimals - to_currency.decimals))
+
+    def convert_amounts(
+        self, amounts: Sequence[Tuple[int, str]], to_currency_code: str
+    ) -> list[int]:
+        conversions = self.rate_provider.get_snapshot().conversions
+        return conversions.convert_amounts(amounts, to_currency_code)
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, current_app
+from sqlalchemy.orm import Session
+
+from vasp.db import db
+from vasp.uma_vasp.demo.internal_ledger_service import credit_wallet
+
+log: logging.Logger = logging.getLogger(__name__)
+
+
+# Compared by identity, since the same credit may be queued by more than one caller.
+@dataclass(eq=False)
+class _PendingCredit:
+    transaction_hash: str
+    amount: int
+    currency_code: str
+    sender_uma: str
+    receiver_uma: str
+    result: "Future[Optional[int]]" = field(default_factory=Future)
+
+
+class GroupCommitCreditWriter:
+    """
+    Batches wallet credits from concurrent callers, like a burst of incoming payment
+    webhooks, into one commit. A batch is written once max_batch_size credits are
+    waiting or max_delay_secs after the first one arrived, whichever comes first.
+
+    Each caller blocks until its credit is committed and gets its own new balance or
+    error, or None if it was a repeat of one already recorded. A credit that fails,
+    e.g. for an unknown wallet, writes nothing and doesn't affect the rest of its
+    batch. If the batch commit itself fails, its credits are retried one at a time so
+    only the bad one fails. A caller whose credit isn't written within
+    wait_timeout_secs gets a TimeoutError. Credits are idempotent, so it can retry.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 64,
+        max_delay_secs: float = 0.002,
+        wait_timeout_secs: float = 30,
+    ) -> None:
+        self.max_batch_size = max_batch_size
+        self.max_delay_secs = max_delay_secs
+        self.wait_timeout_secs = wait_timeout_secs
+        self._condition = threading.Condition()
+        self._queue: List[_PendingCredit] = []
+        self._writer: Optional[threading.Thread] = None
+        self._stats: Dict[str, int] = {
+            "credits": 0,
+            "failedCredits": 0,
+            "duplicateCredits": 0,
+            "batches": 0,
+            "batchRetries": 0,
+            "largestBatch": 0,
+        }
+
+    @classmethod
+    def from_app_config(cls, app: Flask) -> "GroupCommitCreditWriter":
+        return cls(
+            max_batch_size=app.config.get("LEDGER_GROUP_COMMIT_MAX_BATCH", 64),
+            max_delay_secs=app.config.get("LEDGER_GROUP_COMMIT_MAX_DELAY_MS", 2) / 1000,
+            wait_timeout_secs=app.config.get("LEDGER_GROUP_COMMIT_TIMEOUT_SECS", 30),
+        )
+
+    def credit(
+        self,
+        transaction_hash: str,
+        amount: int,
+        currency_code: str,
+        sender_uma: str,
+        receiver_uma: str,
+    ) -> Optional[int]:
+        pending = _PendingCredit(
+            transaction_hash=transaction_hash,
+            amount=amount,
+            currency_code=currency_code,
+            sender_uma=sender_uma,
+            receiver_uma=receiver_uma,
+        )
+        with self._condition:
+            self._ensure_writer_started()
+            self._queue.append(pending)
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch_size:
+                self._condition.notify()
+        try:
+            return pending.result.result(timeout=self.wait_timeout_secs)
+        except FutureTimeoutError:
+            with self._condition:
+                # Not written yet, so don't write it after the caller has given up.
+                if pending in self._queue:
+                    self._queue.remove(pending)
+            raise TimeoutError(
+                f"Ledger credit {transaction_hash} not written within "
+                f"{self.wait_timeout_secs}s"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {**self._stats, "queued": len(self._queue)}
+
+    def _ensure_writer_started(self) -> None:
+        # Also restarts the writer in a worker forked from a process where it was
+        # running, which inherits only the thread object.
+        if self._writer and self._writer.is_alive():
+            return
+        app = current_app._get_current_object()  # noqa: SLF001 # pyre-ignore [16]
+        self._writer = threading.Thread(
+            target=self._run, args=(app,), name="ledger-group-commit", daemon=True
+        )
+        self._writer.start()
+
+    def _run(self, app: Flask) -> None:
+        with app.app_context():
+            while True:
+                batch = self._next_batch()
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    log.exception("Error writing batch of ledger credits")
+                    for pending in batch:
+                        if not pending.result.done():
+                            pending.result.set_exception(e)
+
+    def _next_batch(self) -> List[_PendingCredit]:
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            deadline = time.monotonic() + self.max_delay_secs
+            while len(self._queue) < self.max_batch_size:
+                remaining_secs = deadline - time.monotonic()
+                if remaining_secs <= 0:
+                    break
+                self._condition.wait(remaining_secs)
+            batch = self._queue[: self.max_batch_size]
+            del self._queue[: self.max_batch_size]
+            return batch
+
+    def _write_batch(self, batch: List[_PendingCredit]) -> None:
+        balances: Dict[int, Optional[int]] = {}
+        failures: Dict[int, Exception] = {}
+        try:
+            with Session(db.engine) as db_session:
+                for index, pending in enumerate(batch):
+                    try:
+                        balances[index] = self._credit(db_session, pending)
+                    except ValueError as e:
+                        failures[index] = e
+                db_session.commit()
+        except Exception:
+            log.exception(
+                f"Error committing {len(batch)} ledger credits, retrying one by one"
+            )
+            self._increment("batchRetries")
+            for pending in batch:
+                self._write_one(pending)
+            return
+
+        for index, pending in enumerate(batch):
+            if index in failures:
+                pending.result.set_exception(failures[index])
+            else:
+                pending.result.set_result(balances[index])
+        with self._condition:
+            self._stats["batches"] += 1
+            duplicates = sum(1 for balance in balances.values() if balance is None)
+            self._stats["credits"] += len(balances) - duplicates
+            self._stats["duplicateCredits"] += duplicates
+            self._stats["failedCredits"] += len(failures)
+            self._stats["largestBatch"] = max(self._stats["largestBatch"], len(batch))
+
+    def _write_one(self, pending: _PendingCredit) -> None:
+        try:
+            with Session(db.engine) as db_session:
+                balance = self._credit(db_session, pending)
+                db_session.commit()
+        except Exception as e:
+            self._increment("failedCredits")
+            pending.result.set_exception(e)
+            return
+        self._increment("credits" if balance is not None else "duplicateCredits")
+        pending.result.set_result(balance)
+
+    @staticmethod
+    def _credit(db_session: Session, pending: _PendingCredit) -> Optional[int]:
+        return credit_wallet(
+            db_session,
+            pending.transaction_hash,
+            pending.amount,
+            pending.currency_code,
+            pending.sender_uma,
+            pending.receiver_uma,
+        )
+
+    def _increment(self, stat: str) -> None:
+        with self._condition:
+            self._stats[stat] += 1
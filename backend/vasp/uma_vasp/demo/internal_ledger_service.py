@@ -1,28 +1,212 @@
 import logging
-from typing import Any, Dict
-from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, NamedTuple, Optional
+from sqlalchemy import ColumnElement, Table, cast, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from vasp.db import db
-from vasp.uma_vasp.interfaces.ledger_service import ILedgerService
+from vasp.uma_vasp.interfaces.ledger_service import ILedgerService, PaymentHold
+from vasp.models.BalanceHold import BalanceHold, BalanceHoldStatus
 from vasp.models.Wallet import Wallet
 from vasp.models.Uma import Uma
-from vasp.models.Transaction import Transaction
+from vasp.models.Transaction import Transaction, TransactionDirection
 from vasp.uma_vasp.user import User
+from vasp.utils import generate_uuid
 
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from vasp.uma_vasp.demo.group_commit_credit_writer import (
+        GroupCommitCreditWriter,
+    )
+
     current_user: User
 
 log: logging.Logger = logging.getLogger(__name__)
 
 
+class BalanceUpdate(NamedTuple):
+    wallet_id: str
+    user_id: int
+    uma_id: int
+    balance: int
+
+
 class InternalLedgerService(ILedgerService):
+    def __init__(
+        self, credit_writer: Optional["GroupCommitCreditWriter"] = None
+    ) -> None:
+        # Concurrent credits go through this, if set, to share commits.
+        self.credit_writer = credit_writer
+
     def get_wallet_balance(self, uma: str) -> tuple[int, str]:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = get_wallet_or_throw(db_session, uma)
             return wallet.amount_in_lowest_denom, wallet.currency.code
 
+    def get_available_balance(self, uma: str) -> tuple[int, str]:
+        with db.session_scope() as db_session:
+            wallet = get_wallet_or_throw(db_session, uma)
+            if release_expired_holds(db_session, wallet.id):
+                db_session.commit()
+                db_session.refresh(wallet)
+            return (
+                wallet.amount_in_lowest_denom - wallet.held_amount_in_lowest_denom,
+                wallet.currency.code,
+            )
+
+    def place_hold(
+        self, uma: str, amount: int, currency_code: str, expires_in_secs: float
+    ) -> str:
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+
+        username = uma.split("@")[0][1:]
+        with db.session_scope() as db_session:
+            updated = _update_wallet(
+                db_session,
+                Uma.__table__.c.username == username,
+                held_delta=amount,
+                required_available=amount,
+            )
+            if updated is None:
+                # Expired holds are only cleaned up when they'd make a difference.
+                wallet = get_wallet_or_throw(db_session, uma)
+                if release_expired_holds(db_session, wallet.id):
+                    updated = _update_wallet(
+                        db_session,
+                        Wallet.__table__.c.id == wallet.id,
+                        held_delta=amount,
+                        required_available=amount,
+                    )
+                if updated is None:
+                    raise ValueError("Insufficient funds")
+
+            hold_id = generate_uuid()
+            db_session.add(
+                BalanceHold(
+                    id=hold_id,
+                    wallet_id=updated.wallet_id,
+                    amount_in_lowest_denom=amount,
+                    currency_code=currency_code,
+                    status=BalanceHoldStatus.ACTIVE,
+                    expires_at=datetime.now(timezone.utc)
+                    + timedelta(seconds=expires_in_secs),
+                )
+            )
+            db_session.commit()
+            return hold_id
+
+    def capture_hold(
+        self,
+        hold_id: str,
+        transaction_hash: str,
+        sender_uma: str,
+        receiver_uma: str,
+        write_with_capture: Optional[Callable[[Session], None]] = None,
+    ) -> int:
+        with db.session_scope() as db_session:
+            hold = db_session.get(BalanceHold, hold_id)
+            if hold is None:
+                raise ValueError(f"Balance hold {hold_id} not found")
+            if resolve_hold(db_session, hold_id, BalanceHoldStatus.CAPTURED) is None:
+                # The hold expired before it was tied to the payment, so it was
+                # released. The funds have left regardless, so debit them without the
+                # hold backing them, unless another call already captured it.
+                holds = BalanceHold.__table__
+                recaptured = db_session.execute(
+                    update(holds)
+                    .where(
+                        holds.c.id == hold_id,
+                        holds.c.status == BalanceHoldStatus.RELEASED.name,
+                    )
+                    .values(
+                        status=BalanceHoldStatus.CAPTURED.name,
+                        resolved_at=datetime.now(timezone.utc),
+                    )
+                ).rowcount  # pyre-ignore [16]
+                if not recaptured:
+                    # Already captured, e.g. by the payment's webhook, along with what
+                    # had to be written with it.
+                    return _get_balance(db_session, hold.wallet_id)
+                log.warning(
+                    f"Capturing released balance hold {hold_id} for {transaction_hash}"
+                )
+
+            # resolve_hold has already taken the hold off the held amount.
+            updated = _update_wallet(
+                db_session,
+                Wallet.__table__.c.id == hold.wallet_id,
+                amount_delta=-hold.amount_in_lowest_denom,
+            )
+            if updated is None:
+                raise ValueError("Wallet for balance hold not found")
+            db_session.add(
+                Transaction(
+                    user_id=updated.user_id,
+                    uma_id=updated.uma_id,
+                    transaction_hash=transaction_hash,
+                    amount_in_lowest_denom=-hold.amount_in_lowest_denom,
+                    currency_code=hold.currency_code,
+                    direction=TransactionDirection.DEBIT,
+                    sender_uma=sender_uma,
+                    receiver_uma=receiver_uma,
+                )
+            )
+            if write_with_capture:
+                write_with_capture(db_session)
+            db_session.commit()
+            return updated.balance
+
+    def release_hold(self, hold_id: str) -> None:
+        with db.session_scope() as db_session:
+            resolve_hold(db_session, hold_id, BalanceHoldStatus.RELEASED)
+            db_session.commit()
+
+    def attach_hold_to_payment(
+        self,
+        hold_id: str,
+        payment_id: str,
+        sender_uma: str,
+        receiver_uma: str,
+        utxo_callback: Optional[str] = None,
+        receiving_node_pubkey: Optional[str] = None,
+    ) -> None:
+        with db.session_scope() as db_session:
+            holds = BalanceHold.__table__
+            db_session.execute(
+                update(holds)
+                .where(holds.c.id == hold_id)
+                .values(
+                    payment_id=payment_id,
+                    sender_uma=sender_uma,
+                    receiver_uma=receiver_uma,
+                    utxo_callback=utxo_callback,
+                    receiving_node_pubkey=receiving_node_pubkey,
+                )
+            )
+            db_session.commit()
+
+    def get_payment_hold(self, payment_id: str) -> Optional[PaymentHold]:
+        with db.session_scope() as db_session:
+            hold = db_session.scalars(
+                select(BalanceHold).where(BalanceHold.payment_id == payment_id)
+            ).first()
+            if hold is None:
+                return None
+            return PaymentHold(
+                hold_id=hold.id,
+                sender_uma=hold.sender_uma or "",
+                receiver_uma=hold.receiver_uma or "",
+                utxo_callback=hold.utxo_callback,
+                receiving_node_pubkey=hold.receiving_node_pubkey,
+            )
+
+    def release_payment_hold(self, payment_id: str) -> None:
+        hold = self.get_payment_hold(payment_id)
+        if hold is not None:
+            self.release_hold(hold.hold_id)
+
     # This method is used to add balance to the wallet of the receiver_uma
     def add_wallet_balance(
         self,
@@ -31,29 +215,25 @@ class InternalLedgerService(ILedgerService):
         currency_code: str,
         sender_uma: str,
         receiver_uma: str,
-    ) -> int:
+    ) -> Optional[int]:
         if amount < 0:
             raise ValueError("Amount must be positive")
 
-        with Session(db.engine) as db_session:
-            # Update the wallet
-            wallet = get_wallet_or_throw(db_session, receiver_uma)
-            wallet.amount_in_lowest_denom += amount
-
-            # Add a transaction
-            transaction = Transaction(
-                user_id=wallet.user_id,
-                uma_id=wallet.uma.id,
-                transaction_hash=transaction_hash,
-                amount_in_lowest_denom=amount,
-                currency_code=currency_code,
-                sender_uma=sender_uma,
-                receiver_uma=receiver_uma,
+        if self.credit_writer:
+            return self.credit_writer.credit(
+                transaction_hash, amount, currency_code, sender_uma, receiver_uma
+            )
+        with db.session_scope() as db_session:
+            balance = credit_wallet(
+                db_session,
+                transaction_hash,
+                amount,
+                currency_code,
+                sender_uma,
+                receiver_uma,
             )
-            db_session.add(transaction)
             db_session.commit()
-
-            return wallet.amount_in_lowest_denom
+            return balance
 
     # This method is used to subtract balance from the wallet of the sender_uma
     def subtract_wallet_balance(
@@ -67,36 +247,92 @@ class InternalLedgerService(ILedgerService):
         if amount <= 0:
             raise ValueError("Amount must be positive")
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             # Update the wallet
-            wallet = get_wallet_or_throw(db_session, sender_uma)
-            if wallet.amount_in_lowest_denom < amount:
-                raise ValueError("Insufficient funds")
-            wallet.amount_in_lowest_denom -= amount
+            updated = update_balance_or_throw(db_session, sender_uma, -amount)
 
             # Add a transaction
             transaction = Transaction(
-                user_id=wallet.user_id,
-                uma_id=wallet.uma.id,
+                user_id=updated.user_id,
+                uma_id=updated.uma_id,
                 transaction_hash=transaction_hash,
                 amount_in_lowest_denom=-amount,
                 currency_code=currency_code,
+                direction=TransactionDirection.DEBIT,
                 sender_uma=sender_uma,
                 receiver_uma=receiver_uma,
             )
             db_session.add(transaction)
             db_session.commit()
 
-            return wallet.amount_in_lowest_denom
+            return updated.balance
+
+    # This method is used to settle payments between two UMAs on this VASP without
+    # going over Lightning.
+    def transfer_between_wallets(
+        self,
+        transaction_hash: str,
+        sender_uma: str,
+        receiver_uma: str,
+        debit_amount: int,
+        debit_currency_code: str,
+        credit_amount: int,
+        credit_currency_code: str,
+    ) -> Optional[int]:
+        if debit_amount <= 0 or credit_amount <= 0:
+            raise ValueError("Amount must be positive")
+
+        with db.session_scope() as db_session:
+            # The sender's transaction claims the transfer, so that of two concurrent
+            # attempts only one moves the funds. If this one fails, rolling back
+            # releases the claim.
+            if not _insert_transaction_if_new(
+                db_session,
+                transaction_hash,
+                -debit_amount,
+                debit_currency_code,
+                TransactionDirection.DEBIT,
+                sender_uma,
+                receiver_uma,
+                account_uma=sender_uma,
+            ):
+                get_wallet_or_throw(db_session, sender_uma)
+                return None
+            sender = update_balance_or_throw(db_session, sender_uma, -debit_amount)
+            receiver = update_balance_or_throw(db_session, receiver_uma, credit_amount)
+            if sender.wallet_id == receiver.wallet_id:
+                # Nothing has been committed, so leaving the session rolls back.
+                raise ValueError("Cannot transfer to the same wallet")
+
+            # The receiver gets a transaction too, as if the payment had gone over
+            # Lightning.
+            db_session.add(
+                Transaction(
+                    user_id=receiver.user_id,
+                    uma_id=receiver.uma_id,
+                    transaction_hash=transaction_hash,
+                    amount_in_lowest_denom=credit_amount,
+                    currency_code=credit_currency_code,
+                    direction=TransactionDirection.CREDIT,
+                    sender_uma=sender_uma,
+                    receiver_uma=receiver_uma,
+                )
+            )
+            db_session.commit()
+
+            return sender.balance
 
 
 def get_wallet(db_session: Session, uma: str) -> Wallet | None:
     # get username from uma like $username@vasp.com
     username = uma.split("@")[0][1:]
+    # Balances are written with Core UPDATEs, which don't touch a Wallet the shared
+    # request session already has loaded, so reload its values from the row.
     wallet = db_session.scalars(
         select(Wallet)
         .join(Uma)
         .where(Uma.wallet_id == Wallet.id, Uma.username == username)
+        .execution_options(populate_existing=True)
     ).first()
 
     return wallet
@@ -109,6 +345,215 @@ def get_wallet_or_throw(db_session: Session, uma: str) -> Wallet:
     return wallet
 
 
+def credit_wallet(
+    db_session: Session,
+    transaction_hash: str,
+    amount: int,
+    currency_code: str,
+    sender_uma: str,
+    receiver_uma: str,
+) -> Optional[int]:
+    """
+    Credits receiver_uma's wallet and records the transaction in db_session, without
+    committing. Returns the new balance, or None if transaction_hash has already been
+    credited to receiver_uma. Writes nothing if it raises.
+    """
+    # Record the transaction first. The unique constraint turns a repeat into a no-op
+    # even when both copies are in flight at once, and the balance only changes if
+    # this one got in.
+    if not _insert_transaction_if_new(
+        db_session,
+        transaction_hash,
+        amount,
+        currency_code,
+        TransactionDirection.CREDIT,
+        sender_uma,
+        receiver_uma,
+        account_uma=receiver_uma,
+    ):
+        # Either a repeat or there's no wallet to credit, which raises.
+        get_wallet_or_throw(db_session, receiver_uma)
+        return None
+
+    return update_balance_or_throw(db_session, receiver_uma, amount).balance
+
+
+def update_balance_or_throw(db_session: Session, uma: str, delta: int) -> BalanceUpdate:
+    """
+    Adds delta to the wallet's balance in a single conditional UPDATE, so concurrent
+    updates to one wallet can't lose each other's changes or overdraw it. Debits can
+    only spend what isn't held. The change is part of db_session's transaction and is
+    only visible once it commits.
+    """
+    username = uma.split("@")[0][1:]
+    updated = _update_wallet(
+        db_session,
+        Uma.__table__.c.username == username,
+        amount_delta=delta,
+        required_available=-delta,
+    )
+    if updated is None:
+        # Only look up why on the failure path.
+        get_wallet_or_throw(db_session, uma)
+        raise ValueError("Insufficient funds")
+    return updated
+
+
+def resolve_hold(
+    db_session: Session, hold_id: str, status: BalanceHoldStatus
+) -> Optional[int]:
+    """
+    Moves an active hold to status and takes it off the wallet's held amount.
+    Returns the amount that was held, or None if the hold wasn't active, so each hold
+    is resolved exactly once however many callers race on it.
+    """
+    holds = BalanceHold.__table__
+    row = db_session.execute(
+        update(holds)
+        .where(holds.c.id == hold_id, holds.c.status == BalanceHoldStatus.ACTIVE.name)
+        .values(status=status.name, resolved_at=datetime.now(timezone.utc))
+        .returning(holds.c.wallet_id, holds.c.amount_in_lowest_denom)
+    ).first()
+    if row is None:
+        return None
+    wallet_id, amount = row
+    _update_wallet(db_session, Wallet.__table__.c.id == wallet_id, held_delta=-amount)
+    return amount
+
+
+def release_expired_holds(db_session: Session, wallet_id: str) -> int:
+    """
+    Releases the wallet's active holds that have expired, and returns how many. Holds
+    for a payment that was sent are left for its outcome to resolve, since it may still
+    succeed.
+    """
+    # payment_id is checked here rather than in the query. SQLite estimates IS NULL
+    # on its unique index as one row, and would search that index for every
+    # unattached hold rather than this wallet's active ones.
+    expired_holds = db_session.execute(
+        select(BalanceHold.id, BalanceHold.payment_id).where(
+            BalanceHold.wallet_id == wallet_id,
+            BalanceHold.status == BalanceHoldStatus.ACTIVE,
+            BalanceHold.expires_at < datetime.now(timezone.utc),
+        )
+    ).all()
+    released = 0
+    for hold_id, payment_id in expired_holds:
+        if payment_id is not None:
+            continue
+        if resolve_hold(db_session, hold_id, BalanceHoldStatus.RELEASED) is not None:
+            log.info(f"Released expired balance hold {hold_id}")
+            released += 1
+    return released
+
+
+def _update_wallet(
+    db_session: Session,
+    condition: ColumnElement[bool],
+    amount_delta: int = 0,
+    held_delta: int = 0,
+    required_available: int = 0,
+) -> Optional[BalanceUpdate]:
+    # Against the tables rather than the ORM entities, since nothing in the session
+    # needs refreshing and the ORM can't map RETURNING rows across two tables.
+    wallet = Wallet.__table__
+    uma_table = Uma.__table__
+    statement = (
+        update(wallet)
+        .where(wallet.c.id == uma_table.c.wallet_id, condition)
+        .values(
+            amount_in_lowest_denom=wallet.c.amount_in_lowest_denom + amount_delta,
+            held_amount_in_lowest_denom=wallet.c.held_amount_in_lowest_denom
+            + held_delta,
+        )
+        .returning(
+            wallet.c.id,
+            wallet.c.user_id,
+            uma_table.c.id,
+            wallet.c.amount_in_lowest_denom,
+        )
+    )
+    if required_available > 0:
+        statement = statement.where(
+            wallet.c.amount_in_lowest_denom - wallet.c.held_amount_in_lowest_denom
+            >= required_available
+        )
+    row = db_session.execute(statement).first()
+    return BalanceUpdate(*row) if row else None
+
+
+def _insert_transaction_if_new(
+    db_session: Session,
+    transaction_hash: str,
+    amount: int,
+    currency_code: str,
+    direction: TransactionDirection,
+    sender_uma: str,
+    receiver_uma: str,
+    account_uma: str,
+) -> bool:
+    """
+    Records a transaction on account_uma's wallet unless it already has one for
+    transaction_hash in this direction. Returns whether it was recorded, which is also
+    False if account_uma has no wallet.
+    """
+    transactions = Transaction.__table__
+    wallet = Wallet.__table__
+    uma_table = Uma.__table__
+    direction_type = transactions.c.direction.type
+    username = account_uma.split("@")[0][1:]
+    inserted = db_session.execute(
+        _insert_ignoring_conflicts(db_session, transactions)
+        .from_select(
+            [
+                "id",
+                "user_id",
+                "uma_id",
+                "transaction_hash",
+                "amount_in_lowest_denom",
+                "currency_code",
+                "direction",
+                "sender_uma",
+                "receiver_uma",
+            ],
+            select(
+                literal(generate_uuid()),
+                wallet.c.user_id,
+                uma_table.c.id,
+                literal(transaction_hash),
+                literal(amount),
+                literal(currency_code),
+                # Postgres won't implicitly cast a text parameter to the enum.
+                cast(literal(direction, direction_type), direction_type),
+                literal(sender_uma),
+                literal(receiver_uma),
+            ).where(
+                wallet.c.id == uma_table.c.wallet_id, uma_table.c.username == username
+            ),
+        )
+        .on_conflict_do_nothing(
+            index_elements=["uma_id", "transaction_hash", "direction"]
+        )
+        .returning(transactions.c.id)
+    ).first()
+    return inserted is not None
+
+
+def _insert_ignoring_conflicts(
+    db_session: Session, table: Table
+) -> postgresql.Insert | sqlite.Insert:
+    # ON CONFLICT is dialect specific, and the demo runs on SQLite locally.
+    if db_session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _get_balance(db_session: Session, wallet_id: str) -> int:
+    return db_session.scalars(
+        select(Wallet.amount_in_lowest_denom).where(Wallet.id == wallet_id)
+    ).one()
+
+
 class InternalLedgerException(Exception):
     def __init__(self, message: str, status_code: int) -> None:
         super().__init__(message)
@@ -0,0 +1,112 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from uma import INonceCache, InvalidNonceException
+
+from vasp.db import db
+from vasp.models.UmaNonce import UmaNonce
+
+
+class BucketedNonceCache(INonceCache):
+    """
+    Nonce cache backed by the uma_nonce table, so that a nonce replayed against a
+    different worker or host is still rejected.
+
+    Each nonce is filed under a time bucket of bucket_secs. Nonces are accepted for
+    window_secs. Once the oldest bucket falls out of the window, the whole bucket is
+    dropped with a single indexed delete. This runs at most once per bucket rollover
+    per process, so pruning doesn't grow with traffic.
+    """
+
+    def __init__(
+        self,
+        window_secs: float = 14 * 24 * 60 * 60,
+        bucket_secs: int = 60 * 60,
+    ) -> None:
+        self.window_secs = window_secs
+        self.bucket_secs = bucket_secs
+        self._lock = threading.Lock()
+        self._oldest_valid_timestamp = datetime.now(timezone.utc) - timedelta(
+            seconds=window_secs
+        )
+        self._last_pruned_bucket = -1
+        self._stats: Dict[str, int] = {
+            "saved": 0,
+            "rejectedReplays": 0,
+            "rejectedTooOld": 0,
+            "evicted": 0,
+            "bucketsPruned": 0,
+        }
+
+    def check_and_save_nonce(self, nonce: str, timestamp: datetime) -> None:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        self._maybe_prune()
+        if timestamp < self._oldest_valid_timestamp:
+            self._increment("rejectedTooOld")
+            raise InvalidNonceException("Timestamp is too old.")
+
+        try:
+            with db.session_scope() as db_session:
+                db_session.add(
+                    UmaNonce(
+                        nonce=nonce,
+                        bucket=self._bucket_for(timestamp),
+                        timestamp=timestamp,
+                    )
+                )
+                db_session.commit()
+        except IntegrityError:
+            self._increment("rejectedReplays")
+            raise InvalidNonceException("Nonce has already been used.")
+        self._increment("saved")
+
+    def purge_nonces_older_than(self, timestamp: datetime) -> None:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        # Only whole buckets are dropped. Nonces in the bucket that straddles the
+        # cutoff are kept until the next rollover, which is harmless since their
+        # timestamps are rejected as too old anyway.
+        cutoff_bucket = self._bucket_for(timestamp)
+        with db.session_scope() as db_session:
+            result = db_session.execute(
+                delete(UmaNonce).where(UmaNonce.bucket < cutoff_bucket)
+            )
+            db_session.commit()
+        with self._lock:
+            self._oldest_valid_timestamp = max(self._oldest_valid_timestamp, timestamp)
+            self._stats["evicted"] += result.rowcount  # pyre-ignore [16]
+            if cutoff_bucket > self._last_pruned_bucket:
+                if self._last_pruned_bucket >= 0:
+                    self._stats["bucketsPruned"] += (
+                        cutoff_bucket - self._last_pruned_bucket
+                    )
+                self._last_pruned_bucket = cutoff_bucket
+
+    def get_stats(self) -> Dict[str, Any]:
+        with db.session_scope() as db_session:
+            size = db_session.scalar(select(func.count()).select_from(UmaNonce))
+        with self._lock:
+            return {
+                **self._stats,
+                "size": size,
+                "oldestValidTimestamp": self._oldest_valid_timestamp.isoformat(),
+            }
+
+    def _maybe_prune(self) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.window_secs)
+        with self._lock:
+            if self._bucket_for(cutoff) <= self._last_pruned_bucket:
+                self._oldest_valid_timestamp = max(self._oldest_valid_timestamp, cutoff)
+                return
+        self.purge_nonces_older_than(cutoff)
+
+    def _bucket_for(self, timestamp: datetime) -> int:
+        return int(timestamp.timestamp()) // self.bucket_secs
+
+    def _increment(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
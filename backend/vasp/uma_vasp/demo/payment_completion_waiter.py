@@ -0,0 +1,60 @@
+import threading
+import time
+from typing import Optional
+
+from lightspark import OutgoingPayment
+
+from vasp.uma_vasp.interfaces.payment_completion_waiter import (
+    IPaymentCompletionWaiter,
+)
+
+
+class PaymentCompletionWaiter(IPaymentCompletionWaiter):
+    """
+    In-process registry of requests waiting on outgoing payments. Webhooks are only
+    delivered to one worker, so callers must still fall back to polling when the
+    webhook lands in another process.
+    """
+
+    def __init__(self, finished_payment_ttl_secs: float = 120) -> None:
+        self.finished_payment_ttl_secs = finished_payment_ttl_secs
+        self._lock = threading.Lock()
+        self._events: dict[str, threading.Event] = {}
+        # Finished payments are kept around for a little while so that a webhook which
+        # arrives before the sender starts waiting is not lost.
+        self._finished: dict[str, tuple[float, OutgoingPayment]] = {}
+
+    def notify_payment_finished(self, payment: OutgoingPayment) -> None:
+        with self._lock:
+            self._prune_finished()
+            self._finished[payment.id] = (time.monotonic(), payment)
+            event = self._events.pop(payment.id, None)
+        if event:
+            event.set()
+
+    def wait_for_payment(
+        self, payment_id: str, timeout_secs: float
+    ) -> Optional[OutgoingPayment]:
+        with self._lock:
+            finished = self._finished.get(payment_id)
+            if finished:
+                return finished[1]
+            event = self._events.setdefault(payment_id, threading.Event())
+
+        event.wait(timeout_secs)
+
+        with self._lock:
+            finished = self._finished.get(payment_id)
+            if not finished and self._events.get(payment_id) is event:
+                del self._events[payment_id]
+            return finished[1] if finished else None
+
+    def _prune_finished(self) -> None:
+        cutoff = time.monotonic() - self.finished_payment_ttl_secs
+        expired = [
+            payment_id
+            for payment_id, (finished_at, _) in self._finished.items()
+            if finished_at < cutoff
+        ]
+        for payment_id in expired:
+            del self._finished[payment_id]
@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from flask_caching import Cache
+from uma import IPublicKeyCache, PubkeyResponse
+
+# How long other workers wait for an in-flight fetch of the same domain before
+# fetching it themselves.
+FETCH_LEASE_SECS = 5
+FETCH_WAIT_POLL_SECS = 0.05
+
+
+class SharedPublicKeyCache(IPublicKeyCache):
+    """
+    Counterparty VASP public keys, shared by all workers through the app cache with an
+    in-process L1 in front of it. Entries expire at the response's expirationTimestamp,
+    or never if it has none.
+
+    The uma SDK fetches /.well-known/lnurlpubkey itself whenever this cache returns
+    None. To keep N workers that see a cold domain from all fetching it, the first
+    miss takes a short lease and returns None, and later misses wait for that fetch
+    to land in the cache. If it doesn't within FETCH_LEASE_SECS, they fall back to
+    fetching themselves. Fetch through public_key_helpers.fetch_public_key_for_vasp, so
+    that a failed fetch lets them go straight away.
+    """
+
+    def __init__(self, cache: Cache) -> None:
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._l1: Dict[str, PubkeyResponse] = {}
+        # Domains this process is currently fetching, with when the fetch started.
+        self._in_flight: Dict[str, Tuple[threading.Event, float]] = {}
+        self._stats: Dict[str, int] = {
+            "l1Hits": 0,
+            "sharedHits": 0,
+            "waitedHits": 0,
+            "misses": 0,
+        }
+
+    def fetch_public_key_for_vasp(self, vasp_domain: str) -> Optional[PubkeyResponse]:
+        with self._lock:
+            public_key = self._l1.get(vasp_domain)
+            if public_key and not _is_expired(public_key):
+                self._stats["l1Hits"] += 1
+                return public_key
+            self._l1.pop(vasp_domain, None)
+
+        public_key = self._get_shared(vasp_domain)
+        if public_key:
+            self._record("sharedHits", vasp_domain, public_key)
+            return public_key
+
+        event = self._claim_in_process_fetch(vasp_domain)
+        if event is None and self.cache.add(
+            f"pubkey_fetch_lease_{vasp_domain}", True, timeout=FETCH_LEASE_SECS
+        ):
+            # We own the fetch. The SDK will fetch the key and call
+            # add_public_key_for_vasp with it.
+            self._record("misses", vasp_domain, None)
+            return None
+
+        public_key = self._wait_for_fetch(vasp_domain, event)
+        self._record("waitedHits" if public_key else "misses", vasp_domain, public_key)
+        return public_key
+
+    def add_public_key_for_vasp(
+        self, vasp_domain: str, public_key: PubkeyResponse
+    ) -> None:
+        timeout = 0
+        if public_key.expiration_timestamp:
+            timeout = int(
+                (
+                    public_key.expiration_timestamp - datetime.now(timezone.utc)
+                ).total_seconds()
+            )
+            if timeout <= 0:
+                # Nothing to cache, but the fetch is over.
+                self._end_fetch(vasp_domain)
+                return
+        self.cache.set(f"pubkey_{vasp_domain}", public_key.to_json(), timeout=timeout)
+        with self._lock:
+            self._l1[vasp_domain] = public_key
+        self._end_fetch(vasp_domain)
+
+    def remove_public_key_for_vasp(self, vasp_domain: str) -> None:
+        # Also ends any fetch of the domain, so that threads and workers waiting on it
+        # fetch for themselves rather than wait out the lease.
+        self.cache.delete(f"pubkey_{vasp_domain}")
+        with self._lock:
+            self._l1.pop(vasp_domain, None)
+        self._end_fetch(vasp_domain)
+
+    def clear(self) -> None:
+        # The shared store has no prefix scan, so drop the entries this process knows
+        # about. Others expire on their own.
+        with self._lock:
+            domains = list(self._l1.keys())
+            self._l1.clear()
+        for domain in domains:
+            self.cache.delete(f"pubkey_{domain}")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "l1Size": len(self._l1)}
+
+    def _end_fetch(self, vasp_domain: str) -> None:
+        """Drops the fetch lease and wakes the threads waiting on the fetch."""
+        self.cache.delete(f"pubkey_fetch_lease_{vasp_domain}")
+        with self._lock:
+            in_flight = self._in_flight.pop(vasp_domain, None)
+        if in_flight:
+            in_flight[0].set()
+
+    def _get_shared(self, vasp_domain: str) -> Optional[PubkeyResponse]:
+        public_key_json = self.cache.get(f"pubkey_{vasp_domain}")
+        if not public_key_json:
+            return None
+        public_key = PubkeyResponse.from_json(public_key_json)
+        return None if _is_expired(public_key) else public_key
+
+    def _claim_in_process_fetch(self, vasp_domain: str) -> Optional[threading.Event]:
+        """
+        Returns None if the caller should fetch the key, or the event of the fetch
+        another thread in this process already started.
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(vasp_domain)
+            if in_flight and time.monotonic() - in_flight[1] < FETCH_LEASE_SECS:
+                return in_flight[0]
+            self._in_flight[vasp_domain] = (threading.Event(), time.monotonic())
+            return None
+
+    def _wait_for_fetch(
+        self, vasp_domain: str, event: Optional[threading.Event]
+    ) -> Optional[PubkeyResponse]:
+        deadline = time.monotonic() + FETCH_LEASE_SECS
+        if event:
+            event.wait(FETCH_LEASE_SECS)
+            with self._lock:
+                public_key = self._l1.get(vasp_domain)
+            if public_key:
+                return public_key
+        else:
+            # Another worker holds the shared lease. Threads of this process that
+            # queued up behind us are released once we know the outcome.
+            public_key = None
+            while time.monotonic() < deadline:
+                time.sleep(FETCH_WAIT_POLL_SECS)
+                public_key = self._get_shared(vasp_domain)
+                # The lease is dropped once the key is cached or the fetch fails.
+                if public_key or not self.cache.get(
+                    f"pubkey_fetch_lease_{vasp_domain}"
+                ):
+                    break
+            with self._lock:
+                if public_key:
+                    self._l1[vasp_domain] = public_key
+                in_flight = self._in_flight.pop(vasp_domain, None)
+            if in_flight:
+                in_flight[0].set()
+            return public_key
+        return self._get_shared(vasp_domain)
+
+    def _record(
+        self, stat: str, vasp_domain: str, public_key: Optional[PubkeyResponse]
+    ) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+            if public_key:
+                self._l1[vasp_domain] = public_key
+
+
+def _is_expired(public_key: PubkeyResponse) -> bool:
+    return bool(
+        public_key.expiration_timestamp
+        and public_key.expiration_timestamp <= datetime.now(timezone.utc)
+    )
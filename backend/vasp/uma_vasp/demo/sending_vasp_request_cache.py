@@ -7,8 +7,11 @@ from uma import Currency, LnurlpResponse
 
 from vasp.uma_vasp.interfaces.sending_vasp_request_cache import (
     ISendingVaspRequestCache,
+    SendingVaspInternalTransferData,
+    PayoutBatch,
     SendingVaspInitialRequestData,
     SendingVaspPayReqData,
+    SendingVaspPaymentStatus,
 )
 
 
@@ -68,3 +71,28 @@ class SendingVaspRequestCache(ISendingVaspRequestCache):
             ),
         )
         return uuid
+
+    def get_payment_status(self, payment_id: str) -> Optional[SendingVaspPaymentStatus]:
+        return self.cache.get(f"payment_status_{payment_id}")
+
+    def save_payment_status(self, payment_status: SendingVaspPaymentStatus) -> None:
+        self.cache.set(f"payment_status_{payment_status.payment_id}", payment_status)
+
+    def get_internal_transfer_data(
+        self, uuid: str
+    ) -> Optional[SendingVaspInternalTransferData]:
+        return self.cache.get(f"internal_transfer_{uuid}")
+
+    def save_internal_transfer_data(
+        self, transfer_data: SendingVaspInternalTransferData
+    ) -> str:
+        uuid = str(uuid4())
+        self.cache.set(f"internal_transfer_{uuid}", transfer_data)
+        return uuid
+
+    def get_payout_batch(self, batch_id: str) -> Optional[PayoutBatch]:
+        return self.cache.get(f"payout_batch_{batch_id}")
+
+    def save_payout_batch(self, batch: PayoutBatch) -> None:
+        # Kept for a day so clients can fetch the final result after the run ends.
+        self.cache.set(f"payout_batch_{batch.batch_id}", batch, timeout=24 * 60 * 60)
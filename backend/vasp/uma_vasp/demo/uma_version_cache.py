@@ -0,0 +1,33 @@
+import time
+from typing import Optional
+
+from flask_caching import Cache
+
+from vasp.uma_vasp.interfaces.uma_version_cache import (
+    IUmaVersionCache,
+    NegotiatedUmaVersion,
+)
+
+# Forget negotiated versions after a day so counterparties are eventually retried at
+# our latest version even if the background refresh never runs.
+NEGOTIATED_VERSION_TTL_SECS = 24 * 60 * 60
+
+
+class UmaVersionCache(IUmaVersionCache):
+    def __init__(self, cache: Cache) -> None:
+        self.cache = cache
+
+    def get_negotiated_version(
+        self, vasp_domain: str
+    ) -> Optional[NegotiatedUmaVersion]:
+        return self.cache.get(f"uma_version_{vasp_domain}")
+
+    def save_negotiated_version(self, vasp_domain: str, uma_version: str) -> None:
+        self.cache.set(
+            f"uma_version_{vasp_domain}",
+            NegotiatedUmaVersion(uma_version=uma_version, negotiated_at=time.time()),
+            timeout=NEGOTIATED_VERSION_TTL_SECS,
+        )
+
+    def delete_negotiated_version(self, vasp_domain: str) -> None:
+        self.cache.delete(f"uma_version_{vasp_domain}")
@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from flask import Flask
+
+from vasp.uma_vasp.currencies import CURRENCIES
+
+log: logging.Logger = logging.getLogger(__name__)
+
+COINBASE_EXCHANGE_RATES_URL = "https://api.coinbase.com/v2/exchange-rates?currency=BTC"
+SATS_PER_BTC = 10**8
+
+
+class ConversionMatrix:
+    """
+    Multipliers between every pair of currencies in CURRENCIES that have a rate,
+    computed once per snapshot so that conversions are a pair of dict lookups.
+    """
+
+    def __init__(self, rates: Dict[str, str]) -> None:
+        # SAT isn't in the rates response, it's fixed relative to BTC.
+        units_per_btc = {"SAT": float(SATS_PER_BTC)}
+        for code in CURRENCIES:
+            if code != "SAT" and rates.get(code):
+                units_per_btc[code] = float(rates[code])
+        smallest_units_per_btc = {
+            code: rate * 10 ** CURRENCIES[code].decimals
+            for code, rate in units_per_btc.items()
+        }
+        self.supported_codes: frozenset[str] = frozenset(units_per_btc)
+        self.currency_multipliers: Dict[str, Dict[str, float]] = {
+            from_code: {
+                to_code: to_rate / from_rate
+                for to_code, to_rate in units_per_btc.items()
+            }
+            for from_code, from_rate in units_per_btc.items()
+        }
+        self.smallest_unit_multipliers: Dict[str, Dict[str, float]] = {
+            from_code: {
+                to_code: to_rate / from_rate
+                for to_code, to_rate in smallest_units_per_btc.items()
+            }
+            for from_code, from_rate in smallest_units_per_btc.items()
+        }
+        # The same per-BTC rates kept exact, for converting amounts without float
+        # rounding error.
+        self.exact_smallest_units_per_btc: Dict[str, Decimal] = {
+            code: (Decimal(SATS_PER_BTC) if code == "SAT" else Decimal(rates[code]))
+            * 10 ** CURRENCIES[code].decimals
+            for code in units_per_btc
+        }
+
+    def get_currency_multiplier(
+        self, from_currency_code: str, to_currency_code: str
+    ) -> Optional[float]:
+        return self.currency_multipliers.get(from_currency_code, {}).get(
+            to_currency_code
+        )
+
+    def get_smallest_unit_multiplier(
+        self, from_currency_code: str, to_currency_code: str
+    ) -> Optional[float]:
+        return self.smallest_unit_multipliers.get(from_currency_code, {}).get(
+            to_currency_code
+        )
+
+    def convert_amounts(
+        self, amounts: Sequence[Tuple[int, str]], to_currency_code: str
+    ) -> List[int]:
+        """
+        Converts (amount, currency code) pairs, in the smallest unit of each currency,
+        to the smallest unit of to_currency_code. Results are rounded half to even.
+        """
+        to_units = self.exact_smallest_units_per_btc.get(to_currency_code)
+        if to_units is None:
+            raise ValueError(f"Unsupported currency code {to_currency_code}.")
+
+        converted = []
+        for amount, from_currency_code in amounts:
+            if from_currency_code == to_currency_code:
+                converted.append(amount)
+                continue
+            from_units = self.exact_smallest_units_per_btc.get(from_currency_code)
+            if from_units is None:
+                raise ValueError(f"Unsupported currency code {from_currency_code}.")
+            converted.append(
+                int(
+                    (Decimal(amount) * to_units / from_units).to_integral_value(
+                        rounding=ROUND_HALF_EVEN
+                    )
+                )
+            )
+        return converted
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+    """Units of each currency per BTC, as of fetched_at (seconds since the epoch)."""
+
+    rates: Dict[str, str]
+    fetched_at: float
+    conversions: ConversionMatrix
+    # Loaded from disk at startup rather than fetched by this process.
+    is_stale: bool = False
+
+    def age_secs(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class ExchangeRateProvider:
+    """
+    Keeps a snapshot of BTC exchange rates that is refreshed on a background thread.
+
+    Readers always get the last good snapshot without waiting on the network, unless
+    it is older than max_staleness_secs, in which case they get an error rather than
+    quoting on badly outdated rates. Only one fetch runs at a time per process.
+
+    Every good snapshot is written to snapshot_path. A new process starts from that
+    file, flagged as stale, and serves it for up to max_persisted_age_secs or until
+    its first fetch succeeds. With fixed=True it never fetches and serves the file
+    as is, which is meant for running load tests offline against known rates.
+    """
+
+    def __init__(
+        self,
+        refresh_interval_secs: float = 30,
+        max_staleness_secs: float = 10 * 60,
+        fetch_timeout_secs: float = 10,
+        snapshot_path: Optional[str] = None,
+        max_persisted_age_secs: float = 24 * 60 * 60,
+        fixed: bool = False,
+    ) -> None:
+        self.refresh_interval_secs = refresh_interval_secs
+        self.max_staleness_secs = max_staleness_secs
+        self.fetch_timeout_secs = fetch_timeout_secs
+        self.snapshot_path = snapshot_path
+        self.max_persisted_age_secs = max_persisted_age_secs
+        self.fixed = fixed
+        self._snapshot: Optional[RateSnapshot] = self._load_persisted_snapshot()
+        if fixed and self._snapshot is None:
+            raise ValueError(
+                f"Fixed exchange rates need a snapshot file at {snapshot_path}."
+            )
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._fetch_count = 0
+        self._fetch_error_count = 0
+        self._last_fetch_latency_secs: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    @classmethod
+    def from_app_config(cls, app: Flask) -> "ExchangeRateProvider":
+        return cls(
+            refresh_interval_secs=app.config.get("EXCHANGE_RATE_REFRESH_INTERVAL", 30),
+            max_staleness_secs=app.config.get("EXCHANGE_RATE_MAX_STALENESS", 10 * 60),
+            snapshot_path=app.config.get(
+                "EXCHANGE_RATE_SNAPSHOT_PATH",
+                os.path.join(app.instance_path, "exchange_rates.json"),
+            ),
+            max_persisted_age_secs=app.config.get(
+                "EXCHANGE_RATE_MAX_PERSISTED_AGE", 24 * 60 * 60
+            ),
+            fixed=app.config.get("EXCHANGE_RATE_FIXED", False),
+        )
+
+    def get_snapshot(self) -> RateSnapshot:
+        snapshot = self._snapshot
+        if self.fixed and snapshot:
+            return snapshot
+
+        self._ensure_refresher_started()
+        if snapshot is None:
+            # Nothing to serve yet. Wait for the refresh in flight, or run one.
+            with self._refresh_lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._fetch()
+        max_age_secs = (
+            self.max_persisted_age_secs
+            if snapshot.is_stale
+            else self.max_staleness_secs
+        )
+        if snapshot.age_secs() > max_age_secs:
+            raise ValueError(
+                f"Exchange rates are stale ({snapshot.age_secs():.0f}s old)."
+            )
+        return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        with self._stats_lock:
+            return {
+                "ageSecs": round(snapshot.age_secs(), 1) if snapshot else None,
+                "isStale": snapshot.is_stale if snapshot else None,
+                "fixed": self.fixed,
+                "fetchCount": self._fetch_count,
+                "fetchErrorCount": self._fetch_error_count,
+                "lastFetchLatencyMs": (
+                    round(self._last_fetch_latency_secs * 1000, 2)
+                    if self._last_fetch_latency_secs is not None
+                    else None
+                ),
+                "lastError": self._last_error,
+            }
+
+    def _ensure_refresher_started(self) -> None:
+        # A worker forked from a process that had started the refresher inherits its
+        # thread object but not the thread, so check that it's still running.
+        if self._refresher and self._refresher.is_alive():
+            return
+        with self._start_lock:
+            if self._refresher and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(
+                target=self._run, name="exchange-rate-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def _run(self) -> None:
+        while True:
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._fetch()
+                except Exception:
+                    log.exception("Error refreshing exchange rates")
+                finally:
+                    self._refresh_lock.release()
+            time.sleep(self.refresh_interval_secs)
+
+    def _fetch(self) -> RateSnapshot:
+        """Fetches and stores a new snapshot. Callers must hold _refresh_lock."""
+        start = time.monotonic()
+        try:
+            response = requests.get(
+                COINBASE_EXCHANGE_RATES_URL, timeout=self.fetch_timeout_secs
+            )
+            response.raise_for_status()
+            rates = response.json().get("data").get("rates")
+            if not rates:
+                raise ValueError("No conversion rates found.")
+        except Exception as e:
+            with self._stats_lock:
+                self._fetch_error_count += 1
+                self._last_fetch_latency_secs = time.monotonic() - start
+                self._last_error = str(e)
+            raise
+
+        snapshot = RateSnapshot(
+            rates=rates, fetched_at=time.time(), conversions=ConversionMatrix(rates)
+        )
+        self._snapshot = snapshot
+        with self._stats_lock:
+            self._fetch_count += 1
+            self._last_fetch_latency_secs = time.monotonic() - start
+            self._last_error = None
+        self._persist_snapshot(snapshot)
+        return snapshot
+
+    def _load_persisted_snapshot(self) -> Optional[RateSnapshot]:
+        if not self.snapshot_path:
+            return None
+        try:
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+            rates = data["rates"]
+            snapshot = RateSnapshot(
+                rates=rates,
+                fetched_at=float(data["fetchedAt"]),
+                conversions=ConversionMatrix(rates),
+                is_stale=not self.fixed,
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            log.exception(f"Ignoring unreadable rate snapshot {self.snapshot_path}")
+            return None
+        log.info(
+            f"Loaded exchange rates from {self.snapshot_path}, "
+            f"{snapshot.age_secs():.0f}s old"
+        )
+        return snapshot
+
+    def _persist_snapshot(self, snapshot: RateSnapshot) -> None:
+        if not self.snapshot_path:
+            return
+        # Other workers write the same file, so write a temp file and move it into
+        # place to never leave a partial one behind.
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                "w",
+                dir=os.path.dirname(os.path.abspath(self.snapshot_path)),
+                prefix=".exchange_rates.",
+                delete=False,
+            ) as f:
+                temp_path = f.name
+                json.dump(
+                    {"rates": snapshot.rates, "fetchedAt": snapshot.fetched_at}, f
+                )
+            os.replace(temp_path, self.snapshot_path)
+        except OSError:
+            log.exception(f"Error writing rate snapshot {self.snapshot_path}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
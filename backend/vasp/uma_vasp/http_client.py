@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from flask import Flask
+from requests.adapters import HTTPAdapter
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# Receiver domains come from users, so stats are only kept per domain for the first
+# max_tracked_domains seen, and for everything after that together under this key.
+OTHER_DOMAINS = "(other)"
+
+
+@dataclass
+class DomainStats:
+    request_count: int = 0
+    error_count: int = 0
+    total_latency_secs: float = 0.0
+    max_latency_secs: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requestCount": self.request_count,
+            "errorCount": self.error_count,
+            "avgLatencyMs": (
+                round(self.total_latency_secs * 1000 / self.request_count, 2)
+                if self.request_count
+                else 0
+            ),
+            "maxLatencyMs": round(self.max_latency_secs * 1000, 2),
+        }
+
+
+class OutboundHttpClient:
+    """
+    Shared HTTP client for calls to counterparty VASPs.
+
+    Connections are kept alive in one urllib3 pool per host, so repeated lookups,
+    payreqs and callbacks to the same VASP reuse warm TCP/TLS connections. Latency
+    and error counts are tracked per domain, for up to max_tracked_domains domains.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 32,
+        pool_maxsize: int = 16,
+        connect_timeout_secs: float = 5,
+        read_timeout_secs: float = 20,
+        max_tracked_domains: int = 100,
+    ) -> None:
+        self.default_timeout: Tuple[float, float] = (
+            connect_timeout_secs,
+            read_timeout_secs,
+        )
+        self.session = requests.Session()
+        # pool_connections is the number of per-host pools to keep, pool_maxsize the
+        # number of connections kept alive in each of them.
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.max_tracked_domains = max_tracked_domains
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, DomainStats] = {}
+
+    @classmethod
+    def from_app_config(cls, app: Flask) -> "OutboundHttpClient":
+        return cls(
+            pool_connections=app.config.get("OUTBOUND_HTTP_POOL_CONNECTIONS", 32),
+            pool_maxsize=app.config.get("OUTBOUND_HTTP_POOL_MAXSIZE", 16),
+            connect_timeout_secs=app.config.get("OUTBOUND_HTTP_CONNECT_TIMEOUT", 5),
+            read_timeout_secs=app.config.get("OUTBOUND_HTTP_READ_TIMEOUT", 20),
+            max_tracked_domains=app.config.get(
+                "OUTBOUND_HTTP_MAX_TRACKED_DOMAINS", 100
+            ),
+        )
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[float | Tuple[float, float]] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        domain = urlparse(url).netloc
+        start = time.monotonic()
+        is_error = True
+        try:
+            response = self.session.request(
+                method,
+                url,
+                timeout=timeout if timeout is not None else self.default_timeout,
+                **kwargs,
+            )
+            is_error = not response.ok
+            return response
+        finally:
+            self._record(domain, time.monotonic() - start, is_error)
+
+    def get_domain_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {domain: stats.to_dict() for domain, stats in self._stats.items()}
+
+    def _record(self, domain: str, latency_secs: float, is_error: bool) -> None:
+        with self._stats_lock:
+            if (
+                domain not in self._stats
+                and len(self._stats) >= self.max_tracked_domains
+            ):
+                domain = OTHER_DOMAINS
+            stats = self._stats.setdefault(domain, DomainStats())
+            stats.request_count += 1
+            stats.total_latency_secs += latency_secs
+            stats.max_latency_secs = max(stats.max_latency_secs, latency_secs)
+            if is_error:
+                stats.error_count += 1
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from typing import Sequence, Tuple
 from uma import Currency
 
 
@@ -16,6 +17,14 @@ class ICurrencyService(ABC):
     ) -> dict[str, str]:
         pass
 
+    @abstractmethod
+    def get_rates_version(self) -> str:
+        """
+        Identifies the exchange rates currently in use. It changes whenever the rates
+        do, so anything derived from them can be cached until then.
+        """
+        pass
+
     @abstractmethod
     def get_uma_currency(self, currency_code: str) -> Currency:
         pass
@@ -24,6 +33,11 @@ class ICurrencyService(ABC):
     def get_uma_currencies_for_uma(self, username: str) -> list[Currency]:
         pass
 
+    @abstractmethod
+    def invalidate_uma_currencies(self, username: str) -> None:
+        """Called after the set of currencies for a UMA may have changed."""
+        pass
+
     @abstractmethod
     def get_currency_multiplier(self, currency_options: CurrencyOptions) -> float:
         pass
@@ -31,3 +45,14 @@ class ICurrencyService(ABC):
     @abstractmethod
     def get_smallest_unit_multiplier(self, currency_options: CurrencyOptions) -> float:
         pass
+
+    @abstractmethod
+    def convert_amounts(
+        self, amounts: Sequence[Tuple[int, str]], to_currency_code: str
+    ) -> list[int]:
+        """
+        Converts (amount, currency code) pairs in smallest units to the smallest unit
+        of to_currency_code, all at the same rates. Raises ValueError for a currency
+        without a rate.
+        """
+        pass
@@ -1,4 +1,19 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+
+@dataclass
+class PaymentHold:
+    """A balance hold attached to a sent payment, with what settling it needs."""
+
+    hold_id: str
+    sender_uma: str
+    receiver_uma: str
+    utxo_callback: Optional[str] = None
+    receiving_node_pubkey: Optional[str] = None
 
 
 class ILedgerService(ABC):
@@ -6,6 +21,74 @@ class ILedgerService(ABC):
     def get_wallet_balance(self, uma: str) -> tuple[int, str]:
         pass
 
+    @abstractmethod
+    def get_available_balance(self, uma: str) -> tuple[int, str]:
+        """Returns the balance minus active holds, and the wallet's currency code."""
+        pass
+
+    @abstractmethod
+    def place_hold(
+        self, uma: str, amount: int, currency_code: str, expires_in_secs: float
+    ) -> str:
+        """
+        Sets amount aside from the wallet's available balance for a payment that is
+        about to be sent, and returns the hold's id. Raises ValueError if the
+        available balance is too low. Unresolved holds are released after
+        expires_in_secs.
+        """
+        pass
+
+    @abstractmethod
+    def capture_hold(
+        self,
+        hold_id: str,
+        transaction_hash: str,
+        sender_uma: str,
+        receiver_uma: str,
+        write_with_capture: Optional[Callable[[Session], None]] = None,
+    ) -> int:
+        """
+        Debits the held amount once the payment has succeeded and records the
+        transaction. Returns the new balance. write_with_capture is called with the
+        session the capture is written in before it commits, so that rows which must
+        not outlive or go missing from the capture are committed along with it. It is
+        only called by the call that captures the hold, not by any that find it
+        already captured.
+        """
+        pass
+
+    @abstractmethod
+    def release_hold(self, hold_id: str) -> None:
+        """Gives the held amount back once the payment has failed."""
+        pass
+
+    @abstractmethod
+    def attach_hold_to_payment(
+        self,
+        hold_id: str,
+        payment_id: str,
+        sender_uma: str,
+        receiver_uma: str,
+        utxo_callback: Optional[str] = None,
+        receiving_node_pubkey: Optional[str] = None,
+    ) -> None:
+        """
+        Records the payment a hold is for once it has been sent. From then on the hold
+        doesn't expire, and is captured or released when the payment finishes, by
+        the send or by the payment's webhook.
+        """
+        pass
+
+    @abstractmethod
+    def get_payment_hold(self, payment_id: str) -> Optional[PaymentHold]:
+        """Returns the hold attached to a payment, or None if there isn't one."""
+        pass
+
+    @abstractmethod
+    def release_payment_hold(self, payment_id: str) -> None:
+        """Releases the hold for a payment that has failed, if there is one."""
+        pass
+
     @abstractmethod
     def add_wallet_balance(
         self,
@@ -14,7 +97,12 @@ class ILedgerService(ABC):
         currency_code: str,
         sender_uma: str,
         receiver_uma: str,
-    ) -> int:
+    ) -> Optional[int]:
+        """
+        Credits receiver_uma's wallet and records the transaction. Returns the new
+        balance, or None without changing anything if transaction_hash has already been
+        credited to receiver_uma.
+        """
         pass
 
     @abstractmethod
@@ -27,3 +115,21 @@ class ILedgerService(ABC):
         receiver_uma: str,
     ) -> int:
         pass
+
+    @abstractmethod
+    def transfer_between_wallets(
+        self,
+        transaction_hash: str,
+        sender_uma: str,
+        receiver_uma: str,
+        debit_amount: int,
+        debit_currency_code: str,
+        credit_amount: int,
+        credit_currency_code: str,
+    ) -> Optional[int]:
+        """
+        Moves funds between two wallets on this VASP atomically, and returns the sender's
+        new balance. Returns None without changing anything if transaction_hash has
+        already been transferred.
+        """
+        pass
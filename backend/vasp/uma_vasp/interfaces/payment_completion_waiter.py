@@ -0,0 +1,25 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from lightspark import OutgoingPayment
+
+
+class IPaymentCompletionWaiter(ABC):
+    """
+    Lets a request that has just sent a payment park until the PAYMENT_FINISHED webhook
+    for that payment arrives, instead of polling the Lightspark API in a loop.
+    """
+
+    @abstractmethod
+    def notify_payment_finished(self, payment: OutgoingPayment) -> None:
+        pass
+
+    @abstractmethod
+    def wait_for_payment(
+        self, payment_id: str, timeout_secs: float
+    ) -> Optional[OutgoingPayment]:
+        """
+        Blocks for up to timeout_secs and returns the finished payment, or None if no
+        webhook for it was seen in time.
+        """
+        pass
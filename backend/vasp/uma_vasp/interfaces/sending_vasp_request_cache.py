@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
 
 from lightspark import InvoiceData
 from uma import Currency, LnurlpResponse
@@ -31,6 +33,99 @@ class SendingVaspPayReqData:
     uma_invoice_uuid: Optional[str] = None
 
 
+@dataclass
+class SendingVaspInternalTransferData:
+    """
+    This is the data that we cache for the payreq step of a payment to another UMA on
+    this VASP, which is settled directly in the ledger.
+    """
+
+    transaction_hash: str
+    sending_user_id: str
+    sender_uma: str
+    receiver_uma: str
+    amount_msats: int
+    receiving_currency_code: str
+    amount_receiving_currency: int
+    expires_at: datetime
+
+
+@dataclass
+class SendingVaspPaymentStatus:
+    """This is the data that we cache for payments sent without waiting for completion."""
+
+    payment_id: str
+    sending_user_id: str
+    status: str
+    settled_at: Optional[datetime] = None
+    preimage: Optional[str] = None
+    failure_reason: Optional[str] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "paymentId": self.payment_id,
+            "status": self.status,
+            "settledAt": self.settled_at,
+            "preimage": self.preimage,
+            "failureReason": self.failure_reason,
+        }
+
+
+class PayoutBatchItemStatus(Enum):
+    PENDING = "PENDING"
+    PREPARED = "PREPARED"
+    SENDING = "SENDING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
+@dataclass
+class PayoutBatchItem:
+    """One receiver in a bulk payout."""
+
+    receiver_uma: str
+    amount: int
+    currency_code: str
+    is_amount_in_msats: bool = False
+    status: PayoutBatchItemStatus = PayoutBatchItemStatus.PENDING
+    payment_id: Optional[str] = None
+    failure_reason: Optional[str] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "receiverUma": self.receiver_uma,
+            "amount": self.amount,
+            "currencyCode": self.currency_code,
+            "isAmountInMsats": self.is_amount_in_msats,
+            "status": self.status.value,
+            "paymentId": self.payment_id,
+            "failureReason": self.failure_reason,
+        }
+
+
+@dataclass
+class PayoutBatch:
+    """This is the data that we cache for a bulk payout while it runs."""
+
+    batch_id: str
+    sending_user_id: str
+    sender_uma: str
+    items: List[PayoutBatchItem] = field(default_factory=list)
+    is_complete: bool = False
+
+    def to_json(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {status.value: 0 for status in PayoutBatchItemStatus}
+        for item in self.items:
+            counts[item.status.value] += 1
+        return {
+            "batchId": self.batch_id,
+            "senderUma": self.sender_uma,
+            "status": "COMPLETED" if self.is_complete else "RUNNING",
+            "counts": counts,
+            "items": [item.to_json() for item in self.items],
+        }
+
+
 class ISendingVaspRequestCache(ABC):
     """
     A simple in-memory cache for data that needs to be remembered between calls to VASP1. In practice, this would be
@@ -70,3 +165,31 @@ class ISendingVaspRequestCache(ABC):
         receiver_uma: str,
     ) -> str:
         pass
+
+    @abstractmethod
+    def get_payment_status(self, payment_id: str) -> Optional[SendingVaspPaymentStatus]:
+        pass
+
+    @abstractmethod
+    def save_payment_status(self, payment_status: SendingVaspPaymentStatus) -> None:
+        pass
+
+    @abstractmethod
+    def get_internal_transfer_data(
+        self, uuid: str
+    ) -> Optional[SendingVaspInternalTransferData]:
+        pass
+
+    @abstractmethod
+    def save_internal_transfer_data(
+        self, transfer_data: SendingVaspInternalTransferData
+    ) -> str:
+        pass
+
+    @abstractmethod
+    def get_payout_batch(self, batch_id: str) -> Optional[PayoutBatch]:
+        pass
+
+    @abstractmethod
+    def save_payout_batch(self, batch: PayoutBatch) -> None:
+        pass
@@ -0,0 +1,32 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class NegotiatedUmaVersion:
+    """The UMA version a counterparty VASP asked us to use after answering a 412."""
+
+    uma_version: str
+    negotiated_at: float
+
+
+class IUmaVersionCache(ABC):
+    """
+    Remembers the UMA version negotiated with each counterparty VASP domain so that
+    later lnurlp requests can use it on the first attempt.
+    """
+
+    @abstractmethod
+    def get_negotiated_version(
+        self, vasp_domain: str
+    ) -> Optional[NegotiatedUmaVersion]:
+        pass
+
+    @abstractmethod
+    def save_negotiated_version(self, vasp_domain: str, uma_version: str) -> None:
+        pass
+
+    @abstractmethod
+    def delete_negotiated_version(self, vasp_domain: str) -> None:
+        pass
@@ -1,4 +1,16 @@
-from lightspark import LightsparkSyncClient, LightsparkNode
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from lightspark import BitcoinNetwork, LightsparkSyncClient, LightsparkNode
+from uma import ErrorCode
+
+from vasp.uma_vasp.config import Config
+from vasp.uma_vasp.uma_exception import abort_with_error
+
+log: logging.Logger = logging.getLogger(__name__)
 
 
 def get_node(lightspark_client: LightsparkSyncClient, node_id: str) -> LightsparkNode:
@@ -6,3 +18,132 @@ def get_node(lightspark_client: LightsparkSyncClient, node_id: str) -> Lightspar
     if not node:
         raise Exception(f"Cannot find node {node_id}")
     return node
+
+
+@dataclass
+class NodeState:
+    """The subset of LightsparkNode fields needed on the payment paths."""
+
+    public_key: Optional[str]
+    uma_prescreening_utxos: List[str]
+    typename: str
+    bitcoin_network: BitcoinNetwork
+
+
+class LightsparkNodeCache:
+    """
+    Caches our node's metadata so that payments don't refetch it from Lightspark on
+    every hop, and remembers whether the node signing key is already loaded into the
+    client.
+
+    Entries are served for ttl_secs. Once an entry is older than refresh_after_secs it
+    is still returned, but a refresh is started in the background.
+    """
+
+    def __init__(
+        self,
+        lightspark_client: LightsparkSyncClient,
+        config: Config,
+        ttl_secs: float = 600,
+        refresh_after_secs: float = 300,
+    ) -> None:
+        self.lightspark_client = lightspark_client
+        self.config = config
+        self.ttl_secs = ttl_secs
+        self.refresh_after_secs = refresh_after_secs
+        self._lock = threading.Lock()
+        self._signing_key_lock = threading.Lock()
+        self._node_state: Optional[NodeState] = None
+        self._fetched_at: float = 0.0
+        self._is_refreshing = False
+        self._is_signing_key_loaded = False
+
+    def get_node_state(self) -> NodeState:
+        with self._lock:
+            node_state = self._node_state
+            age_secs = time.monotonic() - self._fetched_at
+            should_refresh = (
+                node_state is not None
+                and age_secs >= self.refresh_after_secs
+                and not self._is_refreshing
+            )
+            if should_refresh:
+                self._is_refreshing = True
+
+        if node_state is None or age_secs >= self.ttl_secs:
+            return self._refresh()
+
+        if should_refresh:
+            threading.Thread(
+                target=self._refresh_in_background,
+                name="lightspark-node-refresh",
+                daemon=True,
+            ).start()
+        return node_state
+
+    def invalidate(self) -> None:
+        """
+        Forgets the node state and that the signing key is loaded, so the next payment
+        refetches and reloads them. Call it when paying fails, in case the node or its
+        key has changed since they were loaded.
+        """
+        with self._lock:
+            self._node_state = None
+            self._fetched_at = 0.0
+        with self._signing_key_lock:
+            self._is_signing_key_loaded = False
+
+    def load_signing_key(self) -> None:
+        """Loads the node signing key into the Lightspark client once per process."""
+        if self._is_signing_key_loaded:
+            return
+
+        with self._signing_key_lock:
+            if self._is_signing_key_loaded:
+                return
+
+            node_state = self.get_node_state()
+            if "OSK" in node_state.typename:
+                osk_password = self.config.osk_node_signing_key_password
+                if not osk_password:
+                    abort_with_error(
+                        ErrorCode.INTERNAL_ERROR,
+                        "OSK password is required for OSK nodes.",
+                    )
+                self.lightspark_client.recover_node_signing_key(
+                    self.config.node_id, osk_password
+                )
+            else:
+                # Assume remote signing.
+                master_seed = self.config.get_remote_signing_node_master_seed()
+                if not master_seed:
+                    abort_with_error(
+                        ErrorCode.INTERNAL_ERROR,
+                        "Remote signing master seed is required for remote signing nodes.",
+                    )
+                self.lightspark_client.provide_node_master_seed(
+                    self.config.node_id, master_seed, node_state.bitcoin_network
+                )
+            self._is_signing_key_loaded = True
+
+    def _refresh(self) -> NodeState:
+        node = get_node(self.lightspark_client, self.config.node_id)
+        node_state = NodeState(
+            public_key=node.public_key,
+            uma_prescreening_utxos=node.uma_prescreening_utxos,
+            typename=node.typename,
+            bitcoin_network=node.bitcoin_network,
+        )
+        with self._lock:
+            self._node_state = node_state
+            self._fetched_at = time.monotonic()
+        return node_state
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self._refresh()
+        except Exception:
+            log.exception("Error refreshing Lightspark node state")
+        finally:
+            with self._lock:
+                self._is_refreshing = False
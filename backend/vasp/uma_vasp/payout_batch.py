@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from itertools import zip_longest
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from flask import Flask, current_app
+from lightspark import TransactionStatus
+from uma import UmaException
+
+from vasp.uma_vasp.address_helpers import get_domain_from_uma_address
+from vasp.uma_vasp.interfaces.sending_vasp_request_cache import (
+    ISendingVaspRequestCache,
+    PayoutBatch,
+    PayoutBatchItemStatus,
+)
+
+if TYPE_CHECKING:
+    from vasp.uma_vasp.sending_vasp import SendingVasp
+
+log: logging.Logger = logging.getLogger(__name__)
+
+MAX_PAYOUT_BATCH_ITEMS = 500
+# Lookups and payreqs for a batch run on this many threads, with at most
+# MAX_CONCURRENT_PREPARES_PER_DOMAIN of them talking to the same receiving VASP at
+# once across all batches in this process.
+PREPARE_CONCURRENCY = 8
+MAX_CONCURRENT_PREPARES_PER_DOMAIN = 4
+# Sends all debit the same sender wallet, so keep them to a few at a time.
+MAX_PARALLEL_SENDS = 4
+# Once everything is sent, the run checks the cached status of the payments that
+# haven't finished this often, and gives up after a little longer than sending_vasp
+# follows a pending payment. Items still pending then are left SENDING.
+PAYMENT_STATUS_POLL_INTERVAL_SECS = 1
+PAYMENT_STATUS_TIMEOUT_SECS = 6 * 60
+
+_domain_semaphores: Dict[str, threading.BoundedSemaphore] = defaultdict(
+    lambda: threading.BoundedSemaphore(MAX_CONCURRENT_PREPARES_PER_DOMAIN)
+)
+_domain_semaphores_lock = threading.Lock()
+
+
+def _get_domain_semaphore(domain: str) -> threading.BoundedSemaphore:
+    with _domain_semaphores_lock:
+        return _domain_semaphores[domain]
+
+
+class PayoutBatchRunner:
+    """
+    Runs a bulk payout in the background. Each item goes through the same lookup,
+    payreq and send steps as a single payment from the UI. Items are sent as soon as
+    their payreq is ready rather than after the whole batch has been prepared, so the
+    invoices are still fresh when they're paid.
+    """
+
+    def __init__(
+        self, sending_vasp: "SendingVasp", request_cache: ISendingVaspRequestCache
+    ) -> None:
+        self.sending_vasp = sending_vasp
+        self.request_cache = request_cache
+        self._lock = threading.Lock()
+
+    def start(self, batch: PayoutBatch) -> None:
+        app = current_app._get_current_object()  # noqa: SLF001 # pyre-ignore [16]
+        threading.Thread(
+            target=self._run,
+            args=(app, batch),
+            name=f"payout-batch-{batch.batch_id}",
+            daemon=True,
+        ).start()
+
+    def _run(self, app: Flask, batch: PayoutBatch) -> None:
+        with app.app_context():
+            try:
+                with ThreadPoolExecutor(
+                    max_workers=PREPARE_CONCURRENCY,
+                    thread_name_prefix=f"payout-prepare-{batch.batch_id[:8]}",
+                ) as prepare_executor, ThreadPoolExecutor(
+                    max_workers=MAX_PARALLEL_SENDS,
+                    thread_name_prefix=f"payout-send-{batch.batch_id[:8]}",
+                ) as send_executor:
+                    prepare_futures: Dict["Future[Optional[str]]", int] = {
+                        prepare_executor.submit(
+                            self._prepare_item, app, batch, index
+                        ): index
+                        for index in self._interleave_by_domain(batch)
+                    }
+                    for future in as_completed(prepare_futures):
+                        callback_uuid = future.result()
+                        if callback_uuid:
+                            send_executor.submit(
+                                self._send_item,
+                                app,
+                                batch,
+                                prepare_futures[future],
+                                callback_uuid,
+                            )
+                self._wait_for_sent_items(batch)
+            except Exception:
+                log.exception(f"Error running payout batch {batch.batch_id}")
+            finally:
+                with self._lock:
+                    for item in batch.items:
+                        # A sent payment may still finish, so only items that never
+                        # got a payment are failed.
+                        if (
+                            item.status
+                            not in (
+                                PayoutBatchItemStatus.SUCCEEDED,
+                                PayoutBatchItemStatus.FAILED,
+                            )
+                            and not item.payment_id
+                        ):
+                            item.status = PayoutBatchItemStatus.FAILED
+                            item.failure_reason = "Payout batch stopped unexpectedly."
+                    batch.is_complete = True
+                    self.request_cache.save_payout_batch(batch)
+
+    def _prepare_item(
+        self, app: Flask, batch: PayoutBatch, index: int
+    ) -> Optional[str]:
+        item = batch.items[index]
+        with app.app_context():
+            try:
+                with _get_domain_semaphore(
+                    get_domain_from_uma_address(item.receiver_uma)
+                ):
+                    payreq_response = self.sending_vasp.prepare_payment(
+                        sender_uma=batch.sender_uma,
+                        receiver_uma=item.receiver_uma,
+                        amount=item.amount,
+                        currency_code=item.currency_code,
+                        is_amount_in_msats=item.is_amount_in_msats,
+                        user_id=batch.sending_user_id,
+                    )
+            except Exception as e:
+                self._fail_item(batch, index, e)
+                return None
+            self._update_item(batch, index, PayoutBatchItemStatus.PREPARED)
+            return payreq_response.callback_uuid
+
+    def _send_item(
+        self, app: Flask, batch: PayoutBatch, index: int, callback_uuid: str
+    ) -> None:
+        with app.app_context():
+            # send_payment holds the funds before paying, so parallel sends can't
+            # together spend more than the wallet has.
+            self._update_item(batch, index, PayoutBatchItemStatus.SENDING)
+            try:
+                result = self.sending_vasp.send_payment(
+                    callback_uuid, batch.sending_user_id, wait_for_completion=False
+                )
+            except Exception as e:
+                self._fail_item(batch, index, e)
+                return
+            # Transfers to UMAs on this VASP are settled by the time send_payment
+            # returns. Other payments are followed by _wait_for_sent_items.
+            self._update_item(
+                batch,
+                index,
+                (
+                    PayoutBatchItemStatus.SUCCEEDED
+                    if result["status"] == TransactionStatus.SUCCESS.value
+                    else PayoutBatchItemStatus.SENDING
+                ),
+                payment_id=result["paymentId"],
+            )
+
+    def _wait_for_sent_items(self, batch: PayoutBatch) -> None:
+        """
+        Follows the cached status of each sent payment, which send_payment keeps up to
+        date in the background, until it succeeds or fails.
+        """
+        deadline = time.monotonic() + PAYMENT_STATUS_TIMEOUT_SECS
+        while True:
+            for index, item in enumerate(batch.items):
+                if item.status != PayoutBatchItemStatus.SENDING or not item.payment_id:
+                    continue
+                payment_status = self.request_cache.get_payment_status(item.payment_id)
+                if not payment_status:
+                    continue
+                if payment_status.status == TransactionStatus.SUCCESS.value:
+                    self._update_item(batch, index, PayoutBatchItemStatus.SUCCEEDED)
+                elif payment_status.status == TransactionStatus.FAILED.value:
+                    self._update_item(
+                        batch,
+                        index,
+                        PayoutBatchItemStatus.FAILED,
+                        failure_reason=payment_status.failure_reason,
+                    )
+            if (
+                not any(
+                    item.status == PayoutBatchItemStatus.SENDING and item.payment_id
+                    for item in batch.items
+                )
+                or time.monotonic() >= deadline
+            ):
+                return
+            time.sleep(PAYMENT_STATUS_POLL_INTERVAL_SECS)
+
+    def _update_item(
+        self,
+        batch: PayoutBatch,
+        index: int,
+        status: PayoutBatchItemStatus,
+        payment_id: Optional[str] = None,
+        failure_reason: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            item = batch.items[index]
+            item.status = status
+            item.payment_id = payment_id or item.payment_id
+            item.failure_reason = failure_reason
+            self.request_cache.save_payout_batch(batch)
+
+    def _fail_item(self, batch: PayoutBatch, index: int, error: Exception) -> None:
+        if isinstance(error, UmaException):
+            failure_reason = error.reason
+        else:
+            log.exception(
+                f"Error paying item {index} of payout batch {batch.batch_id}",
+                exc_info=error,
+            )
+            failure_reason = str(error)
+        self._update_item(
+            batch, index, PayoutBatchItemStatus.FAILED, failure_reason=failure_reason
+        )
+
+    @staticmethod
+    def _interleave_by_domain(batch: PayoutBatch) -> List[int]:
+        """
+        Orders items round-robin across receiving domains, so that a run of items for
+        one slow VASP doesn't tie up every prepare thread waiting on its semaphore.
+        """
+        indices_by_domain: Dict[str, List[int]] = defaultdict(list)
+        for index, item in enumerate(batch.items):
+            indices_by_domain[get_domain_from_uma_address(item.receiver_uma)].append(
+                index
+            )
+        return [
+            index
+            for round_indices in zip_longest(*indices_by_domain.values())
+            for index in round_indices
+            if index is not None
+        ]
@@ -0,0 +1,17 @@
+import uma
+from uma import IPublicKeyCache, PubkeyResponse
+
+
+def fetch_public_key_for_vasp(
+    vasp_domain: str, cache: IPublicKeyCache
+) -> PubkeyResponse:
+    """
+    The uma SDK's fetch_public_key_for_vasp, except that a failed fetch removes the
+    domain from the cache. The SDK doesn't tell the cache when its fetch fails, so
+    otherwise anything waiting on that fetch would wait out its lease.
+    """
+    try:
+        return uma.fetch_public_key_for_vasp(vasp_domain=vasp_domain, cache=cache)
+    except Exception:
+        cache.remove_public_key_for_vasp(vasp_domain)
+        raise
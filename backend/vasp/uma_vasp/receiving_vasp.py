@@ -4,10 +4,8 @@ import json
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional, Union
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 
 import logging
-import requests
 from flask import Flask, Response, current_app, request as flask_request
 from flask_login import current_user, login_required
 from lightspark import (
@@ -16,6 +14,7 @@ from lightspark import (
     LightningTransaction,
     TransactionStatus,
     IncomingPayment,
+    OutgoingPayment,
 )
 from vasp.db import db
 from vasp.utils import (
@@ -29,16 +28,22 @@ from vasp.uma_vasp.address_helpers import get_domain_from_uma_address
 from vasp.uma_vasp.config import Config
 from vasp.uma_vasp.interfaces.compliance_service import IComplianceService
 from vasp.uma_vasp.interfaces.ledger_service import ILedgerService
+from vasp.uma_vasp.interfaces.payment_completion_waiter import (
+    IPaymentCompletionWaiter,
+)
 from vasp.uma_vasp.interfaces.user_service import IUserService
 from vasp.uma_vasp.interfaces.currency_service import (
     ICurrencyService,
 )
 from vasp.uma_vasp.currencies import CURRENCIES
-from vasp.uma_vasp.lightspark_helpers import get_node
+from vasp.uma_vasp.http_client import OutboundHttpClient
+from vasp.uma_vasp.public_key_helpers import fetch_public_key_for_vasp
+from vasp.uma_vasp.lightspark_helpers import LightsparkNodeCache
+from vasp.uma_vasp.sent_payment_helpers import capture_sent_payment
 from vasp.uma_vasp.uma_exception import abort_with_error
+from vasp.uma_vasp.utxo_callback_outbox import UtxoCallbackOutbox
 from vasp.uma_vasp.user import User
 from vasp.models.PayReqResponse import PayReqResponse as PayReqResponseModel
-from vasp.models.Transaction import Transaction
 from vasp.models.Uma import Uma
 from vasp.models.Wallet import BankAccountNameMatchingStatus
 from uma import (
@@ -57,7 +62,6 @@ from uma import (
     create_pay_req_response,
     create_uma_invoice,
     create_uma_lnurlp_response,
-    fetch_public_key_for_vasp,
     none_throws,
     parse_lnurlp_request,
     parse_pay_request,
@@ -90,6 +94,8 @@ class ReceivingVasp:
         pubkey_cache: IPublicKeyCache,
         config: Config,
         nonce_cache: INonceCache,
+        node_cache: LightsparkNodeCache,
+        http_client: OutboundHttpClient,
     ) -> None:
         self.user_service = user_service
         self.ledger_service = ledger_service
@@ -99,6 +105,8 @@ class ReceivingVasp:
         self.lightspark_client = lightspark_client
         self.config = config
         self.nonce_cache = nonce_cache
+        self.node_cache = node_cache
+        self.http_client = http_client
 
     def handle_lnurlp_request(self, username: str) -> Dict[str, Any]:
         print(f"Handling LNURLP query for uma {username}")
@@ -281,7 +289,7 @@ class ReceivingVasp:
                 counterparty_utxos=compliance_data.utxos,
             )
 
-        node = get_node(self.lightspark_client, self.config.node_id)
+        node = self.node_cache.get_node_state()
 
         # Build payee_data dynamically based on requested_payee_data from the request
         payee_data = {}
@@ -345,7 +353,7 @@ class ReceivingVasp:
             pay_req_response.encoded_invoice
         )
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             uma = db_session.scalars(
                 select(Uma).where(Uma.username == username)
             ).first()
@@ -413,7 +421,7 @@ class ReceivingVasp:
         if not user:
             abort_with_error(ErrorCode.USER_NOT_FOUND, f"Cannot find user {user_id}")
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             username = db_session.scalars(
                 select(Uma.username).where(Uma.user_id == user.id, Uma.default)
             ).first()
@@ -489,7 +497,7 @@ class ReceivingVasp:
         user = self.user_service.get_user_from_id(user_id)
         if not user:
             abort_with_error(ErrorCode.USER_NOT_FOUND, f"Cannot find user {user_id}")
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             username = db_session.scalars(
                 select(Uma.username).where(Uma.user_id == user.id, Uma.default)
             ).first()
@@ -574,10 +582,9 @@ class ReceivingVasp:
         )
         print(f"Sending pay request to {url}")
         vars = {"invoice": invoice_str}
-        res = requests.post(
+        res = self.http_client.post(
             url,
             json=vars,
-            timeout=20,
         )
 
         if not res.ok:
@@ -625,6 +632,10 @@ def register_routes(
     compliance_service: IComplianceService,
     pubkey_cache: IPublicKeyCache,
     nonce_cache: INonceCache,
+    payment_waiter: IPaymentCompletionWaiter,
+    node_cache: LightsparkNodeCache,
+    http_client: OutboundHttpClient,
+    utxo_callback_outbox: UtxoCallbackOutbox,
 ) -> None:
     def get_receiving_vasp() -> ReceivingVasp:
         return ReceivingVasp(
@@ -636,6 +647,8 @@ def register_routes(
             pubkey_cache=pubkey_cache,
             config=config,
             nonce_cache=nonce_cache,
+            node_cache=node_cache,
+            http_client=http_client,
         )
 
     @app.route("/.well-known/lnurlp/<username>")
@@ -690,6 +703,27 @@ def register_routes(
                     ErrorCode.INTERNAL_ERROR, f"Cannot find payment {event.entity_id}"
                 )
 
+            if isinstance(payment, OutgoingPayment):
+                # Settle the funds held for the payment, in case the send request
+                # stopped waiting before it finished. Resolving a hold twice is a no-op.
+                if payment.status == TransactionStatus.SUCCESS:
+                    hold = ledger_service.get_payment_hold(payment.id)
+                    if hold and payment.transaction_hash:
+                        capture_sent_payment(
+                            payment,
+                            payment.transaction_hash,
+                            hold,
+                            ledger_service,
+                            compliance_service,
+                            utxo_callback_outbox,
+                        )
+                elif payment.status == TransactionStatus.FAILED:
+                    ledger_service.release_payment_hold(payment.id)
+                # Wake up the send request waiting on this payment, if it is in this
+                # process.
+                payment_waiter.notify_payment_finished(payment)
+                return Response(status=200)
+
             if payment.status == TransactionStatus.SUCCESS and isinstance(
                 payment, IncomingPayment
             ):
@@ -706,18 +740,19 @@ def register_routes(
                         f"Cannot find transaction_hash for payment {payment.id}",
                     )
 
-                with Session(db.engine) as db_session:
-                    payreq_response = db_session.scalars(
-                        select(PayReqResponseModel).where(
-                            PayReqResponseModel.payment_hash == transaction_hash
-                        )
+                with db.session_scope() as db_session:
+                    row = db_session.execute(
+                        select(PayReqResponseModel, Uma)
+                        .outerjoin(Uma, Uma.id == PayReqResponseModel.uma_id)
+                        .where(PayReqResponseModel.payment_hash == transaction_hash)
                     ).first()
-                    if not payreq_response:
+                    if not row:
                         abort_with_error(
                             ErrorCode.INTERNAL_ERROR,
                             f"Cannot find payreq_response for transaction_hash: {transaction_hash}",
                         )
 
+                    payreq_response, receiver_uma_model = row
                     user = user_service.get_user_from_id(payreq_response.user_id)
                     if not user:
                         abort_with_error(
@@ -725,36 +760,24 @@ def register_routes(
                             f"Cannot find user: {payreq_response.user_id}",
                         )
 
-                    receiver_uma_model = db_session.scalars(
-                        select(Uma).where(Uma.id == payreq_response.uma_id)
-                    ).first()
                     if not receiver_uma_model:
                         abort_with_error(
                             ErrorCode.INTERNAL_ERROR,
                             f"Cannot find UMA: {payreq_response.uma_id}",
                         )
 
-                    receiving_transaction = db_session.scalars(
-                        select(Transaction)
-                        .join(Uma)
-                        .where(
-                            Uma.id == payreq_response.uma_id,
-                        )
-                        .where(Transaction.transaction_hash == transaction_hash)
-                    ).first()
-                    if receiving_transaction:
-                        logging.info(
-                            f"Already received payment for user {user.id}, transaction_hash: {transaction_hash}"
-                        )
-                        return Response(status=200)
-
-                    ledger_service.add_wallet_balance(
+                    balance = ledger_service.add_wallet_balance(
                         transaction_hash=transaction_hash,
                         amount=payreq_response.amount_in_lowest_denom,
                         currency_code=payreq_response.currency_code,
                         sender_uma=payreq_response.sender_uma,
                         receiver_uma=get_uma_from_username(receiver_uma_model.username),
                     )
+                    if balance is None:
+                        logging.info(
+                            f"Already received payment for user {user.id}, transaction_hash: {transaction_hash}"
+                        )
+                        return Response(status=200)
 
                     amount_normal_denom = payreq_response.amount_in_lowest_denom / (
                         10 ** CURRENCIES[payreq_response.currency_code].decimals
@@ -1,50 +1,66 @@
 import logging
+import secrets
+import threading
 import time
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+from uuid import uuid4
 
 import requests
 from flask import Flask, current_app, Response, request as flask_request
 from flask_login import current_user, login_required
 from lightspark import CurrencyUnit
 from lightspark import LightsparkSyncClient as LightsparkClient
-from lightspark import OutgoingPayment, PaymentDirection, TransactionStatus
+from lightspark import OutgoingPayment, TransactionStatus
 from lightspark.utils.currency_amount import amount_as_msats
 from vasp.utils import get_vasp_domain, is_valid_uma, get_username_from_uma, is_dev
 from vasp.uma_vasp.address_helpers import get_domain_from_uma_address
 from vasp.uma_vasp.config import Config
 from vasp.uma_vasp.interfaces.compliance_service import IComplianceService
-from vasp.uma_vasp.interfaces.ledger_service import ILedgerService
+from vasp.uma_vasp.interfaces.ledger_service import ILedgerService, PaymentHold
+from vasp.uma_vasp.interfaces.payment_completion_waiter import (
+    IPaymentCompletionWaiter,
+)
 from vasp.uma_vasp.interfaces.sending_vasp_request_cache import (
+    PayoutBatch,
+    PayoutBatchItem,
+    SendingVaspInternalTransferData,
     ISendingVaspRequestCache,
     SendingVaspInitialRequestData,
+    SendingVaspPayReqData,
+    SendingVaspPaymentStatus,
 )
 from vasp.uma_vasp.interfaces.currency_service import (
     ICurrencyService,
 )
 from vasp.uma_vasp.currencies import CURRENCIES
+from vasp.uma_vasp.interfaces.uma_version_cache import IUmaVersionCache
 from vasp.uma_vasp.interfaces.user_service import IUserService
-from vasp.uma_vasp.lightspark_helpers import get_node
+from vasp.uma_vasp.http_client import OutboundHttpClient
+from vasp.uma_vasp.lightspark_helpers import LightsparkNodeCache
+from vasp.uma_vasp.public_key_helpers import fetch_public_key_for_vasp
+from vasp.uma_vasp.sent_payment_helpers import capture_sent_payment
+from vasp.uma_vasp.payout_batch import MAX_PAYOUT_BATCH_ITEMS, PayoutBatchRunner
 from vasp.uma_vasp.sending_vasp_payreq_response import SendingVaspPayReqResponse
 from vasp.uma_vasp.uma_exception import abort_with_error
+from vasp.uma_vasp.utxo_callback_outbox import UtxoCallbackOutbox
 from vasp.uma_vasp.user import User
 from vasp.uma_vasp.interfaces.request_storage import IRequestStorage
 from uma import (
     Currency,
     ErrorCode,
+    UmaException,
     INonceCache,
     IPublicKeyCache,
     Invoice,
     LnurlpResponse,
     ParsedVersion,
     PayReqResponse,
-    UtxoWithAmount,
     create_compliance_payer_data,
     create_counterparty_data_options,
     create_pay_request,
-    create_post_transaction_callback,
     create_uma_lnurlp_request_url,
-    fetch_public_key_for_vasp,
     none_throws,
     parse_lnurlp_response,
     parse_pay_req_response,
@@ -61,6 +77,33 @@ if TYPE_CHECKING:
 
 log: logging.Logger = logging.getLogger(__name__)
 
+# How long a send request waits for its payment to finish before giving up.
+PAYMENT_COMPLETION_TIMEOUT_SECS = 10
+# How long to wait for the PAYMENT_FINISHED webhook before polling Lightspark directly.
+# The webhook may be delivered to a different worker process, so we still poll, just
+# far less often than before.
+PAYMENT_COMPLETION_POLL_INTERVAL_SECS = 2.5
+# How long a payment sent without waiting is followed in the background before its
+# status is left as PENDING. Its hold is still settled by the PAYMENT_FINISHED webhook.
+BACKGROUND_PAYMENT_TRACKING_SECS = 5 * 60
+# After this long, lookups that used a remembered downgraded UMA version also re-probe
+# the counterparty at our latest version in the background, in case it has upgraded.
+NEGOTIATED_VERSION_REFRESH_SECS = 60 * 60
+
+# How long the quote for a payment to another UMA on this VASP stays valid, standing
+# in for the expiry of the Lightning invoice a regular payreq would return.
+INTERNAL_TRANSFER_EXPIRY_SECS = 10 * 60
+
+# How long funds stay held for a payment that never gets sent, e.g. if the process dies
+# first. Once sent, the hold lasts until the payment finishes, however long that is.
+BALANCE_HOLD_EXPIRY_SECS = 15 * 60
+
+T = TypeVar("T")
+
+# Shared across requests. Each UMA lookup fans out the lnurlp request, the receiving
+# VASP pubkey fetch and the sender currency query onto this pool.
+_lookup_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="uma-lookup")
+
 
 class SendingVasp:
     def __init__(
@@ -75,6 +118,11 @@ class SendingVasp:
         config: Config,
         nonce_cache: INonceCache,
         uma_request_storage: IRequestStorage,
+        payment_waiter: IPaymentCompletionWaiter,
+        node_cache: LightsparkNodeCache,
+        http_client: OutboundHttpClient,
+        uma_version_cache: IUmaVersionCache,
+        utxo_callback_outbox: UtxoCallbackOutbox,
     ) -> None:
         self.user_service = user_service
         self.compliance_service = compliance_service
@@ -86,6 +134,11 @@ class SendingVasp:
         self.config = config
         self.nonce_cache = nonce_cache
         self.uma_request_storage = uma_request_storage
+        self.payment_waiter = payment_waiter
+        self.node_cache = node_cache
+        self.http_client = http_client
+        self.uma_version_cache = uma_version_cache
+        self.utxo_callback_outbox = utxo_callback_outbox
 
     def handle_uma_lookup(self, sender_uma: str, receiver_uma: str) -> Dict[str, Any]:
         if not self.compliance_service.should_accept_transaction_to_vasp(
@@ -98,23 +151,33 @@ class SendingVasp:
                 "Transactions to that receiving VASP are not allowed.",
             )
 
-        url = create_uma_lnurlp_request_url(
-            signing_private_key=self.config.get_signing_privkey(),
-            receiver_address=receiver_uma,
-            sender_vasp_domain=get_vasp_domain(),
-            is_subject_to_travel_rule=True,
+        if self._is_local_receiver(receiver_uma):
+            return self._handle_internal_lookup(sender_uma, receiver_uma)
+
+        receiving_vasp_domain = get_domain_from_uma_address(receiver_uma)
+        lookup_start = time.monotonic()
+        stage_timings: Dict[str, float] = {}
+        # None of these depend on each other, so run them concurrently and only join
+        # where a result is needed. The pubkey is only used for UMA responses, so a
+        # failure to fetch it is ignored for plain LNURL receivers.
+        lnurlp_future = self._submit_timed(
+            stage_timings, "lnurlp", self._fetch_lnurlp_response, receiver_uma
+        )
+        pubkey_future = self._submit_timed(
+            stage_timings,
+            "pubkey",
+            fetch_public_key_for_vasp,
+            vasp_domain=receiving_vasp_domain,
+            cache=self.vasp_pubkey_cache,
+        )
+        sender_currencies_future = self._submit_timed(
+            stage_timings,
+            "senderCurrencies",
+            self.currency_service.get_uma_currencies_for_uma,
+            get_username_from_uma(sender_uma),
         )
 
-        if is_dev:
-            url = url.replace("https://", "http://")
-
-        response = requests.get(url, timeout=20)
-
-        if response.status_code == 412:
-            response = self._retry_lnurlp_with_version_negotiation(
-                receiver_uma, response
-            )
-
+        response = lnurlp_future.result()
         if not response.ok:
             abort_with_error(
                 ErrorCode.LNURLP_REQUEST_FAILED,
@@ -133,28 +196,36 @@ class SendingVasp:
         if not lnurlp_response.is_uma_response():
             print("Handling as regular LNURLP response.")
             return self._handle_as_non_uma_lnurl_response(
-                lnurlp_response, sender_uma, receiver_uma
+                lnurlp_response,
+                sender_uma,
+                receiver_uma,
+                sender_currencies_future.result(),
             )
 
-        receiver_vasp_pubkey = fetch_public_key_for_vasp(
-            vasp_domain=get_domain_from_uma_address(receiver_uma),
-            cache=self.vasp_pubkey_cache,
-        )
+        receiver_vasp_pubkey = pubkey_future.result()
 
         # Skip signature verification in testing mode to avoid needing to run 2 VASPs.
         is_testing = current_app.config.get("TESTING", False)
         if not is_testing:
+            verify_start = time.monotonic()
             verify_uma_lnurlp_response_signature(
                 lnurlp_response, receiver_vasp_pubkey, self.nonce_cache
             )
+            stage_timings["verify"] = time.monotonic() - verify_start
 
         callback_uuid = self.request_cache.save_lnurlp_response_data(
             lnurlp_response=lnurlp_response,
             sender_uma=sender_uma,
             receiver_uma=receiver_uma,
         )
-        sender_currencies = self.currency_service.get_uma_currencies_for_uma(
-            get_username_from_uma(sender_uma)
+        sender_currencies = sender_currencies_future.result()
+
+        stage_summary = ", ".join(
+            f"{stage}={secs * 1000:.0f}ms" for stage, secs in stage_timings.items()
+        )
+        log.info(
+            f"UMA lookup for {receiver_uma} took "
+            f"{(time.monotonic() - lookup_start) * 1000:.0f}ms ({stage_summary})"
         )
 
         return {
@@ -175,9 +246,51 @@ class SendingVasp:
             ),
         }
 
-    def _handle_as_non_uma_lnurl_response(
-        self, lnurlp_response: LnurlpResponse, sender_uma: str, receiver_uma: str
+    def _is_local_receiver(self, receiver_uma: str) -> bool:
+        """
+        Whether the receiver is a user of this VASP, so the payment can be settled in the
+        ledger instead of going over HTTP and Lightning to ourselves.
+        """
+        if not current_app.config.get("SAME_VASP_FAST_PATH", True):
+            return False
+        return (
+            get_domain_from_uma_address(receiver_uma) == get_vasp_domain()
+            and self.user_service.get_user_from_uma(receiver_uma) is not None
+        )
+
+    def _check_user_owns_uma(self, user_id: str, uma: str) -> None:
+        """
+        Aborts unless the UMA belongs to the user. Sends debit the wallet of the sender
+        UMA they were set up with, which comes from the client.
+        """
+        user = User.from_id(user_id)
+        username = get_username_from_uma(uma)
+        if not user or not any(user_uma.username == username for user_uma in user.umas):
+            abort_with_error(
+                ErrorCode.FORBIDDEN, f"You are not authorized to send from {uma}."
+            )
+
+    def _handle_internal_lookup(
+        self, sender_uma: str, receiver_uma: str
     ) -> Dict[str, Any]:
+        receiver_username = get_username_from_uma(receiver_uma)
+        receiver_user = none_throws(self.user_service.get_user_from_uma(receiver_uma))
+        receiver_wallet = receiver_user.get_wallet_for_uma(receiver_username)
+        # Stands in for the lnurlp response ReceivingVasp would have returned, with the
+        # same limits, so that the payreq step can validate amounts as usual.
+        lnurlp_response = LnurlpResponse(
+            tag="payRequest",
+            callback="",
+            min_sendable=1_000,
+            max_sendable=10_000_000_000,
+            encoded_metadata="",
+            currencies=self.currency_service.get_uma_currencies_for_uma(
+                receiver_username
+            ),
+            required_payer_data=None,
+            compliance=None,
+            uma_version=None,
+        )
         callback_uuid = self.request_cache.save_lnurlp_response_data(
             lnurlp_response=lnurlp_response,
             sender_uma=sender_uma,
@@ -186,6 +299,77 @@ class SendingVasp:
         sender_currencies = self.currency_service.get_uma_currencies_for_uma(
             get_username_from_uma(sender_uma)
         )
+        return {
+            "senderCurrencies": [currency.to_dict() for currency in sender_currencies],
+            "receiverCurrencies": (
+                [currency.to_dict() for currency in lnurlp_response.currencies]
+                if lnurlp_response.currencies
+                else [self.currency_service.get_uma_currency("SAT").to_dict()]
+            ),
+            "minSendableMsats": lnurlp_response.min_sendable,
+            "maxSendableMsats": lnurlp_response.max_sendable,
+            "callbackUuid": callback_uuid,
+            "receiverKycStatus": (
+                receiver_wallet.kyc_status.value if receiver_wallet.kyc_status else None
+            ),
+        }
+
+    def _fetch_lnurlp_response(self, receiver_uma: str) -> requests.Response:
+        receiving_vasp_domain = get_domain_from_uma_address(receiver_uma)
+        negotiated_version = self.uma_version_cache.get_negotiated_version(
+            receiving_vasp_domain
+        )
+        url = self._create_lnurlp_request_url(
+            receiver_uma,
+            negotiated_version.uma_version if negotiated_version else None,
+        )
+
+        response = self.http_client.get(url)
+
+        if response.status_code == 412:
+            response = self._retry_lnurlp_with_version_negotiation(
+                receiver_uma, response
+            )
+        elif (
+            negotiated_version
+            and time.time() - negotiated_version.negotiated_at
+            > NEGOTIATED_VERSION_REFRESH_SECS
+        ):
+            self._refresh_negotiated_version_in_background(receiver_uma)
+        return response
+
+    def _submit_timed(
+        self,
+        stage_timings: Dict[str, float],
+        stage: str,
+        fn: Callable[..., T],
+        *args: Any,
+        **kwargs: Any,
+    ) -> "Future[T]":
+        app = current_app._get_current_object()  # noqa: SLF001 # pyre-ignore [16]
+
+        def run() -> T:
+            start = time.monotonic()
+            try:
+                with app.app_context():
+                    return fn(*args, **kwargs)
+            finally:
+                stage_timings[stage] = time.monotonic() - start
+
+        return _lookup_executor.submit(run)
+
+    def _handle_as_non_uma_lnurl_response(
+        self,
+        lnurlp_response: LnurlpResponse,
+        sender_uma: str,
+        receiver_uma: str,
+        sender_currencies: List[Currency],
+    ) -> Dict[str, Any]:
+        callback_uuid = self.request_cache.save_lnurlp_response_data(
+            lnurlp_response=lnurlp_response,
+            sender_uma=sender_uma,
+            receiver_uma=receiver_uma,
+        )
         return {
             "senderCurrencies": [currency.to_dict() for currency in sender_currencies],
             "receiverCurrencies": (
@@ -214,14 +398,73 @@ class SendingVasp:
                 ErrorCode.NO_COMPATIBLE_UMA_VERSION,
                 "No matching UMA version compatible with receiving VASP.",
             )
-        retry_url = create_uma_lnurlp_request_url(
+        self.uma_version_cache.save_negotiated_version(
+            get_domain_from_uma_address(receiver_uma), new_version
+        )
+        retry_url = self._create_lnurlp_request_url(receiver_uma, new_version)
+        return self.http_client.get(retry_url)
+
+    def _create_lnurlp_request_url(
+        self, receiver_uma: str, uma_version_override: Optional[str]
+    ) -> str:
+        url = create_uma_lnurlp_request_url(
             signing_private_key=self.config.get_signing_privkey(),
             receiver_address=receiver_uma,
             sender_vasp_domain=get_vasp_domain(),
             is_subject_to_travel_rule=True,
-            uma_version_override=new_version,
+            uma_version_override=uma_version_override,
         )
-        return requests.get(retry_url, timeout=20)
+        if is_dev:
+            url = url.replace("https://", "http://")
+        return url
+
+    def _refresh_negotiated_version_in_background(self, receiver_uma: str) -> None:
+        receiving_vasp_domain = get_domain_from_uma_address(receiver_uma)
+        # Bump the timestamp first so concurrent lookups don't all start a refresh.
+        negotiated_version = self.uma_version_cache.get_negotiated_version(
+            receiving_vasp_domain
+        )
+        if not negotiated_version:
+            return
+        self.uma_version_cache.save_negotiated_version(
+            receiving_vasp_domain, negotiated_version.uma_version
+        )
+        app = current_app._get_current_object()  # noqa: SLF001 # pyre-ignore [16]
+
+        def refresh_negotiated_version() -> None:
+            with app.app_context():
+                try:
+                    response = self.http_client.get(
+                        self._create_lnurlp_request_url(receiver_uma, None),
+                    )
+                    if response.status_code == 412:
+                        supported_major_versions = response.json().get(
+                            "supportedMajorVersions"
+                        )
+                        new_version = select_highest_supported_version(
+                            supported_major_versions or []
+                        )
+                        if new_version:
+                            self.uma_version_cache.save_negotiated_version(
+                                receiving_vasp_domain, new_version
+                            )
+                    elif response.ok:
+                        log.info(
+                            f"{receiving_vasp_domain} now supports our latest UMA version."
+                        )
+                        self.uma_version_cache.delete_negotiated_version(
+                            receiving_vasp_domain
+                        )
+                except Exception:
+                    log.exception(
+                        f"Error refreshing UMA version for {receiving_vasp_domain}"
+                    )
+
+        threading.Thread(
+            target=refresh_negotiated_version,
+            name=f"uma-version-refresh-{receiving_vasp_domain}",
+            daemon=True,
+        ).start()
 
     def handle_uma_payreq_request(self, callback_uuid: str) -> Dict[str, Any]:
         receiving_currency_code = flask_request.args.get("receivingCurrencyCode", "SAT")
@@ -364,12 +607,22 @@ class SendingVasp:
                 ErrorCode.INVALID_CURRENCY, "Currency code is not supported."
             )
 
+        if self._is_local_receiver(initial_request_data.receiver_uma):
+            return self._handle_internal_payreq(
+                initial_request_data,
+                amount,
+                is_amount_in_msats,
+                receiving_currency,
+                user_id,
+            )
+
         if not initial_request_data.lnurlp_response.is_uma_response():
             return self._handle_as_non_uma_payreq(
                 initial_request_data,
                 amount,
                 receiving_currency_code,
                 is_amount_in_msats,
+                user_id,
             )
 
         sender_uma = initial_request_data.sender_uma
@@ -387,6 +640,54 @@ class SendingVasp:
             uma_version,
         )
 
+    def _handle_internal_payreq(
+        self,
+        initial_request_data: SendingVaspInitialRequestData,
+        amount: int,
+        is_amount_in_msats: bool,
+        receiving_currency: Currency,
+        user_id: str,
+    ) -> SendingVaspPayReqResponse:
+        self._check_user_owns_uma(user_id, initial_request_data.sender_uma)
+        multiplier = receiving_currency.millisatoshi_per_unit
+        amount_msats = amount if is_amount_in_msats else round(amount * multiplier)
+        amount_receiving_currency = (
+            round(amount / multiplier) if is_amount_in_msats else amount
+        )
+        expires_at = datetime.now(timezone.utc) + timedelta(
+            seconds=INTERNAL_TRANSFER_EXPIRY_SECS
+        )
+        # There is no Lightning invoice, so make up a hash to tie the two ledger
+        # transactions together.
+        transaction_hash = secrets.token_hex(32)
+        callback_uuid = self.request_cache.save_internal_transfer_data(
+            SendingVaspInternalTransferData(
+                transaction_hash=transaction_hash,
+                sending_user_id=user_id,
+                sender_uma=initial_request_data.sender_uma,
+                receiver_uma=initial_request_data.receiver_uma,
+                amount_msats=amount_msats,
+                receiving_currency_code=receiving_currency.code,
+                amount_receiving_currency=amount_receiving_currency,
+                expires_at=expires_at,
+            )
+        )
+        return SendingVaspPayReqResponse(
+            sender_currencies=self.currency_service.get_uma_currencies_for_uma(
+                get_username_from_uma(initial_request_data.sender_uma)
+            ),
+            callback_uuid=callback_uuid,
+            encoded_invoice="",
+            amount_msats=amount_msats,
+            conversion_rate=multiplier,
+            exchange_fees_msats=0,
+            receiving_currency_code=receiving_currency.code,
+            amount_receiving_currency=amount_receiving_currency,
+            payment_hash=transaction_hash,
+            invoice_expires_at=round(expires_at.timestamp()),
+            uma_invoice_uuid=None,
+        )
+
     def _handle_internal_uma_payreq(
         self,
         sender_uma: str,
@@ -422,7 +723,7 @@ class SendingVasp:
             cache=self.vasp_pubkey_cache,
         )
 
-        node = get_node(self.lightspark_client, self.config.node_id)
+        node = self.node_cache.get_node_state()
 
         payer_compliance = create_compliance_payer_data(
             receiver_encryption_pubkey=receiver_vasp_pubkey.get_encryption_pubkey(),
@@ -468,10 +769,9 @@ class SendingVasp:
         )
         print(f"Payreq: {payreq.to_dict()}")
 
-        res = requests.post(
+        res = self.http_client.post(
             callback,
             json=payreq.to_dict(),
-            timeout=20,
         )
 
         if not res.ok:
@@ -584,6 +884,7 @@ class SendingVasp:
         amount: int,
         receiving_currency_code: str,
         is_amount_in_msats: bool,
+        user_id: str,
     ) -> SendingVaspPayReqResponse:
         sender_currencies = self.currency_service.get_uma_currencies_for_uma(
             get_username_from_uma(initial_request_data.sender_uma)
@@ -601,10 +902,9 @@ class SendingVasp:
             uma_major_version=1,  # Use the new LUD-21 fields.
         )
 
-        res = requests.get(
+        res = self.http_client.get(
             initial_request_data.lnurlp_response.callback,
             params=payreq.to_dict(),
-            timeout=20,
         )
 
         if not res.ok:
@@ -631,7 +931,7 @@ class SendingVasp:
             utxo_callback="",
             invoice_data=invoice_data,
             sender_currencies=sender_currencies,
-            sending_user_id=current_user.id,
+            sending_user_id=user_id,
             receiving_node_pubkey=None,
             exchange_fees_msats=0,
             sender_uma=initial_request_data.sender_uma,
@@ -668,17 +968,30 @@ class SendingVasp:
             uma_invoice_uuid=None,
         )
 
-    def handle_send_payment(self, callback_uuid: str) -> Dict[str, Any]:
+    def handle_send_payment(
+        self, callback_uuid: str, wait_for_completion: bool = True
+    ) -> Dict[str, Any]:
+        return self.send_payment(
+            callback_uuid, current_user.id, wait_for_completion=wait_for_completion
+        )
+
+    def send_payment(
+        self, callback_uuid: str, user_id: str, wait_for_completion: bool = True
+    ) -> Dict[str, Any]:
         if not callback_uuid or not callback_uuid.strip():
             abort_with_error(ErrorCode.INVALID_INPUT, "Callback UUID is required.")
 
+        internal_transfer = self.request_cache.get_internal_transfer_data(callback_uuid)
+        if internal_transfer:
+            return self._settle_internal_transfer(internal_transfer, user_id)
+
         payreq_data = self.request_cache.get_pay_req_data(callback_uuid)
         if not payreq_data:
             abort_with_error(
                 ErrorCode.REQUEST_NOT_FOUND,
                 f"Cannot find callback UUID {callback_uuid}",
             )
-        if payreq_data.sending_user_id != current_user.id:
+        if payreq_data.sending_user_id != user_id:
             abort_with_error(
                 ErrorCode.FORBIDDEN, "You are not authorized to send this payment."
             )
@@ -699,60 +1012,333 @@ class SendingVasp:
             CurrencyUnit.MILLISATOSHI
         ).preferred_currency_value_rounded
 
-        wallet_balance, wallet_currency_code = self.ledger_service.get_wallet_balance(
-            sender_uma
-        )
-
-        uma_currency = self.currency_service.get_uma_currency(wallet_currency_code)
-        sending_currency_multiplier = uma_currency.millisatoshi_per_unit
-        # Round up to 1 if the converted amount rounds to 0.
-        sending_currency_amount = (
-            round(
-                (amount_as_msats + payreq_data.exchange_fees_msats)
-                / sending_currency_multiplier
-            )
-            or 1
+        _, wallet_currency_code = self.ledger_service.get_wallet_balance(sender_uma)
+        sending_currency_amount = self._get_sending_currency_amount(
+            payreq_data, wallet_currency_code
         )
         sending_max_fee = round(amount_as_msats * 0.0017)
 
-        if wallet_balance - sending_currency_amount < 0:
+        # Hold the funds before paying, so that concurrent sends can't together
+        # spend more than the wallet has.
+        try:
+            hold_id = self.ledger_service.place_hold(
+                sender_uma,
+                sending_currency_amount,
+                wallet_currency_code,
+                expires_in_secs=BALANCE_HOLD_EXPIRY_SECS,
+            )
+        except ValueError:
             abort_with_error(ErrorCode.INTERNAL_ERROR, "Insufficient balance.")
 
-        self._load_signing_key()
-        payment_result = self.lightspark_client.pay_uma_invoice(
-            node_id=self.config.node_id,
-            encoded_invoice=payreq_data.encoded_invoice,
-            timeout_secs=30,
-            maximum_fees_msats=max(5000, sending_max_fee),
-            sender_identifier=sender_uma,
-            signing_private_key=self.config.get_signing_privkey(),
-        )
+        try:
+            self.node_cache.load_signing_key()
+            payment_result = self.lightspark_client.pay_uma_invoice(
+                node_id=self.config.node_id,
+                encoded_invoice=payreq_data.encoded_invoice,
+                timeout_secs=30,
+                maximum_fees_msats=max(5000, sending_max_fee),
+                sender_identifier=sender_uma,
+                signing_private_key=self.config.get_signing_privkey(),
+            )
+        except Exception:
+            self.node_cache.invalidate()
+            self.ledger_service.release_hold(hold_id)
+            raise
         if not payment_result:
+            self.ledger_service.release_hold(hold_id)
             abort_with_error(ErrorCode.INTERNAL_ERROR, "Payment failed.")
+        # Lets the PAYMENT_FINISHED webhook settle the hold if we stop waiting first.
+        self.ledger_service.attach_hold_to_payment(
+            hold_id,
+            payment_result.id,
+            sender_uma,
+            payreq_data.receiver_uma,
+            utxo_callback=payreq_data.utxo_callback,
+            receiving_node_pubkey=payreq_data.receiving_node_pubkey,
+        )
+
+        if not wait_for_completion:
+            return self._complete_payment_in_background(
+                payment_result, payreq_data, hold_id
+            )
+
         payment = self.wait_for_payment_completion(payment_result)
-        transaction_hash = payment.transaction_hash
-        if payment.status != TransactionStatus.SUCCESS or not transaction_hash:
+        return self._finalize_sent_payment(payment, payreq_data, hold_id)
+
+    def _settle_internal_transfer(
+        self, transfer: SendingVaspInternalTransferData, user_id: str
+    ) -> Dict[str, Any]:
+        if transfer.sending_user_id != user_id:
             abort_with_error(
-                ErrorCode.INTERNAL_ERROR,
-                f"Payment failed. Payment ID: {payment.id} {payment.status}",
+                ErrorCode.FORBIDDEN, "You are not authorized to send this payment."
+            )
+        self._check_user_owns_uma(user_id, transfer.sender_uma)
+        # Sending the same payreq twice must not move the funds twice. This catches
+        # plain retries, and the ledger turns away concurrent ones below.
+        existing_status = self.request_cache.get_payment_status(
+            transfer.transaction_hash
+        )
+        if existing_status:
+            return self._internal_transfer_result(existing_status)
+        if transfer.expires_at < datetime.now(timezone.utc):
+            abort_with_error(ErrorCode.INVOICE_EXPIRED, "Invoice has expired.")
+
+        _, sender_currency_code = self.ledger_service.get_wallet_balance(
+            transfer.sender_uma
+        )
+        _, receiver_currency_code = self.ledger_service.get_wallet_balance(
+            transfer.receiver_uma
+        )
+        credit_amount = self._convert_msats_to_currency(
+            transfer.amount_msats, receiver_currency_code
+        )
+        try:
+            sender_balance = self.ledger_service.transfer_between_wallets(
+                transaction_hash=transfer.transaction_hash,
+                sender_uma=transfer.sender_uma,
+                receiver_uma=transfer.receiver_uma,
+                debit_amount=self._convert_msats_to_currency(
+                    transfer.amount_msats, sender_currency_code
+                ),
+                debit_currency_code=sender_currency_code,
+                credit_amount=credit_amount,
+                credit_currency_code=receiver_currency_code,
             )
-        if payreq_data.receiving_node_pubkey or payment.uma_post_transaction_data:
-            self.compliance_service.register_transaction_monitoring(
-                payment_id=payment.id,
-                node_pubkey=payreq_data.receiving_node_pubkey,
-                payment_direction=PaymentDirection.SENT,
-                last_hop_utxos_with_amounts=payment.uma_post_transaction_data or [],
+        except ValueError as e:
+            abort_with_error(ErrorCode.INTERNAL_ERROR, f"Payment failed: {e}")
+        if sender_balance is None:
+            # Another request settled it first. Its status may not be saved yet, but
+            # the transfer has committed, so it succeeded.
+            existing_status = self.request_cache.get_payment_status(
+                transfer.transaction_hash
+            ) or SendingVaspPaymentStatus(
+                payment_id=transfer.transaction_hash,
+                sending_user_id=user_id,
+                status=TransactionStatus.SUCCESS.value,
+                settled_at=datetime.now(timezone.utc),
             )
+            return self._internal_transfer_result(existing_status)
+
+        payment_status = SendingVaspPaymentStatus(
+            payment_id=transfer.transaction_hash,
+            sending_user_id=user_id,
+            status=TransactionStatus.SUCCESS.value,
+            settled_at=datetime.now(timezone.utc),
+        )
+        self.request_cache.save_payment_status(payment_status)
 
-        if payreq_data.utxo_callback:
-            self._send_post_tx_callback(payment, payreq_data.utxo_callback)
+        receiver_user = self.user_service.get_user_from_uma(transfer.receiver_uma)
+        if receiver_user:
+            amount_normal_denom = credit_amount / (
+                10 ** CURRENCIES[receiver_currency_code].decimals
+            )
+            try:
+                receiver_user.send_push_notification(
+                    config=self.config,
+                    title="UMA Test Wallet",
+                    body=f"{transfer.sender_uma} sent {amount_normal_denom} {receiver_currency_code}",
+                )
+            except Exception:
+                log.exception("Error sending push notification for internal transfer")
+
+        return self._internal_transfer_result(payment_status)
+
+    @staticmethod
+    def _internal_transfer_result(
+        payment_status: SendingVaspPaymentStatus,
+    ) -> Dict[str, Any]:
+        return {
+            "paymentId": payment_status.payment_id,
+            "status": payment_status.status,
+            "settledAt": payment_status.settled_at,
+            "preimage": payment_status.preimage,
+        }
+
+    def _get_sending_currency_amount(
+        self, payreq_data: SendingVaspPayReqData, wallet_currency_code: str
+    ) -> int:
+        amount_as_msats = payreq_data.invoice_data.amount.convert_to(
+            CurrencyUnit.MILLISATOSHI
+        ).preferred_currency_value_rounded
+        return self._convert_msats_to_currency(
+            amount_as_msats + payreq_data.exchange_fees_msats, wallet_currency_code
+        )
 
-        self.ledger_service.subtract_wallet_balance(
-            transaction_hash=transaction_hash,
-            amount=sending_currency_amount,
-            currency_code=wallet_currency_code,
+    def _convert_msats_to_currency(self, amount_msats: int, currency_code: str) -> int:
+        uma_currency = self.currency_service.get_uma_currency(currency_code)
+        # Round up to 1 if the converted amount rounds to 0.
+        return round(amount_msats / uma_currency.millisatoshi_per_unit) or 1
+
+    def prepare_payment(
+        self,
+        sender_uma: str,
+        receiver_uma: str,
+        amount: int,
+        currency_code: str,
+        is_amount_in_msats: bool,
+        user_id: str,
+    ) -> SendingVaspPayReqResponse:
+        """Runs the lookup and payreq steps for a payment without a browser round trip."""
+        lookup_response = self.handle_uma_lookup(sender_uma, receiver_uma)
+        callback_uuid = lookup_response["callbackUuid"]
+        initial_request_data = none_throws(
+            self.request_cache.get_lnurlp_response_data(callback_uuid)
+        )
+        validated_amount = self._parse_and_validate_amount(
+            str(amount),
+            "SAT" if is_amount_in_msats else currency_code,
+            initial_request_data.lnurlp_response,
+        )
+        return self.handle_uma_payreq(
+            callback_uuid,
+            is_amount_in_msats,
+            validated_amount,
+            currency_code,
+            user_id,
+        )
+
+    def handle_create_payout_batch(self) -> Dict[str, Any]:
+        flask_request_data = flask_request.json or {}
+        sender_uma = flask_request_data.get("senderUma")
+        if sender_uma and not is_valid_uma(sender_uma):
+            abort_with_error(ErrorCode.INVALID_INPUT, "Invalid sender UMA address.")
+        elif not sender_uma:
+            sender_uma = current_user.get_default_uma_address()
+        self._check_user_owns_uma(current_user.id, sender_uma)
+
+        raw_items = flask_request_data.get("items")
+        if not isinstance(raw_items, list) or not raw_items:
+            abort_with_error(ErrorCode.INVALID_INPUT, "Payout items are required.")
+        if len(raw_items) > MAX_PAYOUT_BATCH_ITEMS:
+            abort_with_error(
+                ErrorCode.INVALID_INPUT,
+                f"A payout batch can have at most {MAX_PAYOUT_BATCH_ITEMS} items.",
+            )
+
+        items: List[PayoutBatchItem] = []
+        for raw_item in raw_items:
+            receiver_uma = raw_item.get("receiverUma")
+            if not receiver_uma or not is_valid_uma(receiver_uma):
+                abort_with_error(
+                    ErrorCode.INVALID_INPUT,
+                    f"Invalid receiver UMA address: {receiver_uma}",
+                )
+            amount = raw_item.get("amount")
+            if not isinstance(amount, int) or amount <= 0:
+                abort_with_error(
+                    ErrorCode.INVALID_INPUT,
+                    f"Amount for {receiver_uma} must be a positive integer.",
+                )
+            items.append(
+                PayoutBatchItem(
+                    receiver_uma=receiver_uma,
+                    amount=amount,
+                    currency_code=raw_item.get("currencyCode", "SAT"),
+                    is_amount_in_msats=bool(raw_item.get("isAmountInMsats", False)),
+                )
+            )
+
+        batch = PayoutBatch(
+            batch_id=str(uuid4()),
+            sending_user_id=current_user.id,
             sender_uma=sender_uma,
-            receiver_uma=payreq_data.receiver_uma,
+            items=items,
+        )
+        self.request_cache.save_payout_batch(batch)
+        PayoutBatchRunner(self, self.request_cache).start(batch)
+        return batch.to_json()
+
+    def get_payout_batch(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.request_cache.get_payout_batch(batch_id)
+        if not batch:
+            abort_with_error(
+                ErrorCode.REQUEST_NOT_FOUND, f"Cannot find payout batch {batch_id}"
+            )
+        if batch.sending_user_id != current_user.id:
+            abort_with_error(
+                ErrorCode.FORBIDDEN, "You are not authorized to view this payout batch."
+            )
+        return batch.to_json()
+
+    def _complete_payment_in_background(
+        self,
+        payment_result: OutgoingPayment,
+        payreq_data: SendingVaspPayReqData,
+        hold_id: str,
+    ) -> Dict[str, Any]:
+        payment_status = SendingVaspPaymentStatus(
+            payment_id=payment_result.id,
+            sending_user_id=payreq_data.sending_user_id,
+            status=TransactionStatus.PENDING.value,
+        )
+        self.request_cache.save_payment_status(payment_status)
+        app = current_app._get_current_object()  # noqa: SLF001 # pyre-ignore [16]
+
+        def complete_payment() -> None:
+            with app.app_context():
+                try:
+                    payment = payment_result
+                    deadline = time.monotonic() + BACKGROUND_PAYMENT_TRACKING_SECS
+                    while True:
+                        payment = self.wait_for_payment_completion(payment)
+                        if (
+                            payment.status != TransactionStatus.PENDING
+                            or time.monotonic() >= deadline
+                        ):
+                            break
+                    if payment.status == TransactionStatus.PENDING:
+                        log.info(f"Payment {payment.id} is still pending.")
+                        self.request_cache.save_payment_status(payment_status)
+                        return
+                    result = self._finalize_sent_payment(payment, payreq_data, hold_id)
+                    payment_status.status = result["status"]
+                    payment_status.settled_at = result["settledAt"]
+                    payment_status.preimage = result["preimage"]
+                except UmaException as e:
+                    payment_status.status = TransactionStatus.FAILED.value
+                    payment_status.failure_reason = e.reason
+                except Exception as e:
+                    log.exception(f"Error completing payment {payment_result.id}")
+                    payment_status.status = TransactionStatus.FAILED.value
+                    payment_status.failure_reason = str(e)
+                self.request_cache.save_payment_status(payment_status)
+
+        threading.Thread(
+            target=complete_payment,
+            name=f"complete-payment-{payment_result.id}",
+            daemon=True,
+        ).start()
+        return payment_status.to_json()
+
+    def _finalize_sent_payment(
+        self,
+        payment: OutgoingPayment,
+        payreq_data: SendingVaspPayReqData,
+        hold_id: str,
+    ) -> Dict[str, Any]:
+        transaction_hash = payment.transaction_hash
+        if payment.status != TransactionStatus.SUCCESS or not transaction_hash:
+            # A payment that is still pending keeps its hold, which is captured or
+            # released when its PAYMENT_FINISHED webhook arrives.
+            if payment.status == TransactionStatus.FAILED:
+                self.ledger_service.release_hold(hold_id)
+            abort_with_error(
+                ErrorCode.INTERNAL_ERROR,
+                f"Payment failed. Payment ID: {payment.id} {payment.status}",
+            )
+        capture_sent_payment(
+            payment,
+            transaction_hash,
+            PaymentHold(
+                hold_id=hold_id,
+                sender_uma=payreq_data.sender_uma,
+                receiver_uma=payreq_data.receiver_uma,
+                utxo_callback=payreq_data.utxo_callback,
+                receiving_node_pubkey=payreq_data.receiving_node_pubkey,
+            ),
+            self.ledger_service,
+            self.compliance_service,
+            self.utxo_callback_outbox,
         )
 
         return {
@@ -762,6 +1348,18 @@ class SendingVasp:
             "preimage": payment.payment_preimage,
         }
 
+    def get_payment_status(self, payment_id: str) -> Dict[str, Any]:
+        payment_status = self.request_cache.get_payment_status(payment_id)
+        if not payment_status:
+            abort_with_error(
+                ErrorCode.REQUEST_NOT_FOUND, f"Cannot find payment {payment_id}"
+            )
+        if payment_status.sending_user_id != current_user.id:
+            abort_with_error(
+                ErrorCode.FORBIDDEN, "You are not authorized to view this payment."
+            )
+        return payment_status.to_json()
+
     def get_pending_uma_requests(self) -> Dict[str, Any]:
         return self.uma_request_storage.get_requests()
 
@@ -803,87 +1401,28 @@ class SendingVasp:
 
         return amount
 
-    def _send_post_tx_callback(
-        self, payment: OutgoingPayment, utxo_callback: str
-    ) -> None:
-        if not utxo_callback:
-            return
-
-        post_tx_data = payment.uma_post_transaction_data
-        if not post_tx_data:
-            print("No UTXO data to send.")
-            return
-
-        utxos: List[UtxoWithAmount] = []
-        for output in post_tx_data:
-            utxos.append(
-                UtxoWithAmount(
-                    utxo=output.utxo,
-                    amount_msats=output.amount.convert_to(
-                        CurrencyUnit.MILLISATOSHI
-                    ).preferred_currency_value_rounded,
-                )
-            )
-
-        post_tx_callback = create_post_transaction_callback(
-            utxos, get_vasp_domain(), self.config.get_signing_privkey()
-        )
-
-        res = requests.post(
-            utxo_callback,
-            json=post_tx_callback.to_dict(),
-            timeout=10,
-        )
-        if not res.ok:
-            # Allowing this to fail silently for now since it doesn't block the user flow.
-            print(
-                f"Error sending UTXO callback: {res.status_code} {res.text}",
-                flush=True,
-            )
-
-    def _load_signing_key(self) -> None:
-        node = get_node(self.lightspark_client, self.config.node_id)
-
-        if "OSK" in node.typename:
-            osk_password = self.config.osk_node_signing_key_password
-            if not osk_password:
-                abort_with_error(
-                    ErrorCode.INVALID_INPUT,
-                    "OSK password is required for OSK nodes.",
-                )
-            self.lightspark_client.recover_node_signing_key(
-                self.config.node_id, osk_password
-            )
-            return
-
-        # Assume remote signing.
-        master_seed = self.config.get_remote_signing_node_master_seed()
-        if not master_seed:
-            abort_with_error(
-                ErrorCode.INVALID_INPUT,
-                "Remote signing master seed is required for remote signing nodes.",
-            )
-        self.lightspark_client.provide_node_master_seed(
-            self.config.node_id, master_seed, node.bitcoin_network
-        )
-
     def wait_for_payment_completion(
         self, initial_payment: OutgoingPayment
     ) -> OutgoingPayment:
-        max_retries = 40
-        num_retries = 0
         payment = initial_payment
         log.info(f"Waiting for payment {payment.id} {payment.status} to complete...")
-        while payment.status == TransactionStatus.PENDING and num_retries < max_retries:
+        deadline = time.monotonic() + PAYMENT_COMPLETION_TIMEOUT_SECS
+        while payment.status == TransactionStatus.PENDING:
+            remaining_secs = deadline - time.monotonic()
+            if remaining_secs <= 0:
+                break
+            finished_payment = self.payment_waiter.wait_for_payment(
+                payment.id,
+                min(PAYMENT_COMPLETION_POLL_INTERVAL_SECS, remaining_secs),
+            )
+            if finished_payment:
+                return finished_payment
             log.info(
-                f"Retrying waiting for payment {payment.id} {payment.status} to complete..."
+                f"No webhook yet for payment {payment.id}, polling for its status..."
             )
             payment = self.lightspark_client.get_entity(payment.id, OutgoingPayment)
             if not payment:
                 abort_with_error(ErrorCode.INTERNAL_ERROR, "Payment not found.")
-            if payment.status == TransactionStatus.PENDING:
-                time.sleep(0.25)
-            num_retries += 1
         return payment
 
 
@@ -898,6 +1437,11 @@ def get_sending_vasp(
     request_cache: ISendingVaspRequestCache,
     nonce_cache: INonceCache,
     uma_request_storage: IRequestStorage,
+    payment_waiter: IPaymentCompletionWaiter,
+    node_cache: LightsparkNodeCache,
+    http_client: OutboundHttpClient,
+    uma_version_cache: IUmaVersionCache,
+    utxo_callback_outbox: UtxoCallbackOutbox,
 ) -> SendingVasp:
     return SendingVasp(
         user_service=user_service,
@@ -910,6 +1454,11 @@ def get_sending_vasp(
         config=config,
         nonce_cache=nonce_cache,
         uma_request_storage=uma_request_storage,
+        payment_waiter=payment_waiter,
+        node_cache=node_cache,
+        http_client=http_client,
+        uma_version_cache=uma_version_cache,
+        utxo_callback_outbox=utxo_callback_outbox,
     )
 
 
@@ -925,6 +1474,11 @@ def register_routes(
     request_cache: ISendingVaspRequestCache,
     nonce_cache: INonceCache,
     uma_request_storage: IRequestStorage,
+    payment_waiter: IPaymentCompletionWaiter,
+    node_cache: LightsparkNodeCache,
+    http_client: OutboundHttpClient,
+    uma_version_cache: IUmaVersionCache,
+    utxo_callback_outbox: UtxoCallbackOutbox,
 ) -> None:
     def get_sending_vasp_internal() -> SendingVasp:
         return get_sending_vasp(
@@ -938,6 +1492,11 @@ def register_routes(
             request_cache=request_cache,
             nonce_cache=nonce_cache,
             uma_request_storage=uma_request_storage,
+            payment_waiter=payment_waiter,
+            node_cache=node_cache,
+            http_client=http_client,
+            uma_version_cache=uma_version_cache,
+            utxo_callback_outbox=utxo_callback_outbox,
         )
 
     @app.route("/api/umalookup/<receiver_uma>")
@@ -959,9 +1518,39 @@ def register_routes(
 
     @app.post("/api/sendpayment/<callback_uuid>")
     @login_required
-    def handle_send_payment(callback_uuid: str) -> Dict[str, Any]:
+    def handle_send_payment(
+        callback_uuid: str,
+    ) -> Union[Dict[str, Any], Tuple[Dict[str, Any], int, Dict[str, str]]]:
+        sending_vasp = get_sending_vasp_internal()
+        # With ?wait=false the payment is started and a 202 is returned right away.
+        # Clients can then poll the status resource in the Location header.
+        wait_for_completion = flask_request.args.get("wait", "").lower() != "false"
+        result = sending_vasp.handle_send_payment(
+            callback_uuid, wait_for_completion=wait_for_completion
+        )
+        if wait_for_completion:
+            return result
+        return result, 202, {"Location": f"/api/payments/{result['paymentId']}"}
+
+    @app.get("/api/payments/<payment_id>")
+    @login_required
+    def handle_get_payment_status(payment_id: str) -> Dict[str, Any]:
+        sending_vasp = get_sending_vasp_internal()
+        return sending_vasp.get_payment_status(payment_id)
+
+    @app.post("/api/payouts")
+    @login_required
+    def handle_create_payout_batch() -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+        sending_vasp = get_sending_vasp_internal()
+        # Batches run in the background. Progress is polled at the Location header.
+        result = sending_vasp.handle_create_payout_batch()
+        return result, 202, {"Location": f"/api/payouts/{result['batchId']}"}
+
+    @app.get("/api/payouts/<batch_id>")
+    @login_required
+    def handle_get_payout_batch(batch_id: str) -> Dict[str, Any]:
         sending_vasp = get_sending_vasp_internal()
-        return sending_vasp.handle_send_payment(callback_uuid)
+        return sending_vasp.get_payout_batch(batch_id)
 
     @app.post("/api/uma/pay_invoice")
     @login_required
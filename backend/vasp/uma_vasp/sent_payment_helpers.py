@@ -0,0 +1,79 @@
+import logging
+
+from lightspark import CurrencyUnit, OutgoingPayment, PaymentDirection
+from sqlalchemy.orm import Session
+from uma import UtxoWithAmount
+
+from vasp.uma_vasp.interfaces.compliance_service import IComplianceService
+from vasp.uma_vasp.interfaces.ledger_service import ILedgerService, PaymentHold
+from vasp.uma_vasp.utxo_callback_outbox import UtxoCallbackOutbox
+
+log: logging.Logger = logging.getLogger(__name__)
+
+
+def capture_sent_payment(
+    payment: OutgoingPayment,
+    transaction_hash: str,
+    hold: PaymentHold,
+    ledger_service: ILedgerService,
+    compliance_service: IComplianceService,
+    utxo_callback_outbox: UtxoCallbackOutbox,
+) -> int:
+    """
+    Settles a sent payment that has succeeded, and returns the sender's new balance.
+    The hold is captured, the post-transaction UTXO callback is queued with the debit,
+    and the payment is registered for compliance monitoring.
+
+    Both the send and the payment's PAYMENT_FINISHED webhook call this, and whichever
+    comes second only gets the balance, so the callback and monitoring happen once.
+    """
+    captured = False
+
+    def write_with_capture(db_session: Session) -> None:
+        nonlocal captured
+        captured = True
+        if hold.utxo_callback:
+            _enqueue_post_tx_callback(
+                db_session, utxo_callback_outbox, payment, hold.utxo_callback
+            )
+
+    balance = ledger_service.capture_hold(
+        hold_id=hold.hold_id,
+        transaction_hash=transaction_hash,
+        sender_uma=hold.sender_uma,
+        receiver_uma=hold.receiver_uma,
+        write_with_capture=write_with_capture,
+    )
+    if captured and (hold.receiving_node_pubkey or payment.uma_post_transaction_data):
+        compliance_service.register_transaction_monitoring(
+            payment_id=payment.id,
+            node_pubkey=hold.receiving_node_pubkey,
+            payment_direction=PaymentDirection.SENT,
+            last_hop_utxos_with_amounts=payment.uma_post_transaction_data or [],
+        )
+    return balance
+
+
+def _enqueue_post_tx_callback(
+    db_session: Session,
+    utxo_callback_outbox: UtxoCallbackOutbox,
+    payment: OutgoingPayment,
+    utxo_callback: str,
+) -> None:
+    post_tx_data = payment.uma_post_transaction_data
+    if not post_tx_data:
+        log.info(f"No UTXO data to send for payment {payment.id}.")
+        return
+
+    utxos = [
+        UtxoWithAmount(
+            utxo=output.utxo,
+            amount_msats=output.amount.convert_to(
+                CurrencyUnit.MILLISATOSHI
+            ).preferred_currency_value_rounded,
+        )
+        for output in post_tx_data
+    ]
+    # Delivered by the outbox workers, so a slow or failing counterparty doesn't hold
+    # up the send.
+    utxo_callback_outbox.enqueue(db_session, payment.id, utxo_callback, utxos)
@@ -3,7 +3,6 @@ from typing import List, Optional
 from sqlalchemy import LargeBinary
 from uma import ErrorCode, KycStatus
 from datetime import date
-from sqlalchemy.orm import Session
 import logging
 from flask_login import UserMixin
 import json
@@ -115,7 +114,7 @@ class User(UserMixin):
         body: str,
         url: Optional[str] = None,
     ) -> None:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             push_subscriptions = (
                 db_session.query(PushSubscription)
                 .filter(PushSubscription.user_id == self.id)
@@ -161,7 +160,7 @@ class User(UserMixin):
 
     @classmethod
     def from_id(cls, user_id: str) -> Optional["User"]:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             user_model: Optional[UserModel] = db_session.get(UserModel, user_id)
             if user_model:
                 return cls(
@@ -176,7 +175,7 @@ class User(UserMixin):
 
     @classmethod
     def from_model_uma(cls, uma_user_name: str) -> Optional["User"]:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             user_model = (
                 db_session.query(UserModel)
                 .filter(UserModel.umas.any(UmaModel.username == uma_user_name))
@@ -0,0 +1,292 @@
+import logging
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from flask import Flask
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from uma import UtxoWithAmount, create_post_transaction_callback
+
+from vasp.db import db
+from vasp.models.UtxoCallback import UtxoCallback, UtxoCallbackStatus
+from vasp.uma_vasp.config import Config
+from vasp.uma_vasp.http_client import OutboundHttpClient
+from vasp.utils import get_vasp_domain
+
+log: logging.Logger = logging.getLogger(__name__)
+
+
+class UtxoCallbackOutbox:
+    """
+    Delivers post-transaction UTXO callbacks to counterparty VASPs in the background.
+
+    Callbacks are written to the utxo_callback table and picked up by a dispatcher
+    thread, which hands them to a small worker pool. Failed deliveries are retried with
+    exponential backoff until max_attempts is reached, and at most
+    max_concurrency_per_domain deliveries to the same VASP run at once. Rows are claimed
+    with a conditional update, so several processes can share the table.
+    """
+
+    def __init__(
+        self,
+        http_client: OutboundHttpClient,
+        config: Config,
+        max_workers: int = 4,
+        max_concurrency_per_domain: int = 2,
+        max_attempts: int = 10,
+        base_backoff_secs: float = 2,
+        max_backoff_secs: float = 15 * 60,
+        poll_interval_secs: float = 5,
+        claim_lease_secs: float = 60,
+        batch_size: int = 50,
+    ) -> None:
+        self.http_client = http_client
+        self.config = config
+        self.max_concurrency_per_domain = max_concurrency_per_domain
+        self.max_attempts = max_attempts
+        self.base_backoff_secs = base_backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.poll_interval_secs = poll_interval_secs
+        self.claim_lease_secs = claim_lease_secs
+        self.batch_size = batch_size
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="utxo-callback"
+        )
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._in_flight_by_domain: Dict[str, int] = defaultdict(int)
+        self._stats: Dict[str, int] = {"delivered": 0, "retried": 0, "failed": 0}
+
+    @classmethod
+    def from_app_config(
+        cls, app: Flask, http_client: OutboundHttpClient, config: Config
+    ) -> "UtxoCallbackOutbox":
+        return cls(
+            http_client,
+            config,
+            max_workers=app.config.get("UTXO_CALLBACK_WORKERS", 4),
+            max_concurrency_per_domain=app.config.get(
+                "UTXO_CALLBACK_MAX_CONCURRENCY_PER_DOMAIN", 2
+            ),
+            max_attempts=app.config.get("UTXO_CALLBACK_MAX_ATTEMPTS", 10),
+        )
+
+    def start(self, app: Flask) -> None:
+        """
+        Starts the dispatcher thread if it isn't running yet, including in a worker
+        forked from a process where it was, which inherits only the thread object.
+        """
+        if self._dispatcher and self._dispatcher.is_alive():
+            return
+        with self._lock:
+            if self._dispatcher and self._dispatcher.is_alive():
+                return
+            if self._dispatcher:
+                # Forked, so the executor's workers didn't come along either.
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="utxo-callback"
+                )
+                self._in_flight_by_domain.clear()
+            self._dispatcher = threading.Thread(
+                target=self._run,
+                args=(app,),
+                name="utxo-callback-dispatch",
+                daemon=True,
+            )
+            self._dispatcher.start()
+
+    def enqueue(
+        self,
+        db_session: Session,
+        payment_id: str,
+        callback_url: str,
+        utxos: List[UtxoWithAmount],
+    ) -> None:
+        """
+        Adds the callback to db_session without committing, so that it is written in
+        the same transaction as the ledger entry for the payment.
+        """
+        db_session.add(
+            UtxoCallback(
+                payment_id=payment_id,
+                callback_url=callback_url,
+                domain=urlparse(callback_url).netloc,
+                utxos=[
+                    {"utxo": utxo.utxo, "amountMsats": utxo.amount_msats}
+                    for utxo in utxos
+                ],
+                status=UtxoCallbackStatus.PENDING,
+                attempts=0,
+                next_attempt_at=datetime.now(timezone.utc),
+            )
+        )
+        # Deliver it as soon as it's committed rather than at the next poll.
+        event.listen(db_session, "after_commit", self._on_enqueued_commit, once=True)
+
+    def _on_enqueued_commit(self, _db_session: Session) -> None:
+        self._wake.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "inFlightByDomain": {
+                    domain: count
+                    for domain, count in self._in_flight_by_domain.items()
+                    if count
+                },
+            }
+
+    def _run(self, app: Flask) -> None:
+        with app.app_context():
+            while True:
+                self._wake.clear()
+                try:
+                    self._dispatch_due(app)
+                except Exception:
+                    log.exception("Error dispatching UTXO callbacks")
+                self._wake.wait(self.poll_interval_secs)
+
+    def _dispatch_due(self, app: Flask) -> None:
+        now = datetime.now(timezone.utc)
+        with Session(db.engine) as db_session:
+            due = db_session.execute(
+                select(
+                    UtxoCallback.id, UtxoCallback.domain, UtxoCallback.next_attempt_at
+                )
+                .where(
+                    UtxoCallback.status == UtxoCallbackStatus.PENDING,
+                    UtxoCallback.next_attempt_at <= now,
+                )
+                .order_by(UtxoCallback.next_attempt_at)
+                .limit(self.batch_size)
+            ).all()
+
+            for callback_id, domain, next_attempt_at in due:
+                with self._lock:
+                    if (
+                        self._in_flight_by_domain[domain]
+                        >= self.max_concurrency_per_domain
+                    ):
+                        continue
+                    self._in_flight_by_domain[domain] += 1
+
+                # Push next_attempt_at out by the lease so that another dispatcher
+                # doesn't pick the row up while it is being delivered. If this process
+                # dies mid-delivery, the row becomes due again once the lease runs out.
+                try:
+                    claimed = db_session.execute(
+                        update(UtxoCallback)
+                        .where(
+                            UtxoCallback.id == callback_id,
+                            UtxoCallback.status == UtxoCallbackStatus.PENDING,
+                            UtxoCallback.next_attempt_at == next_attempt_at,
+                        )
+                        .values(
+                            next_attempt_at=now
+                            + timedelta(seconds=self.claim_lease_secs)
+                        )
+                    )
+                    db_session.commit()
+                except Exception:
+                    self._release_domain(domain)
+                    raise
+                if claimed.rowcount != 1:  # pyre-ignore [16]
+                    self._release_domain(domain)
+                    continue
+
+                self._executor.submit(
+                    self._deliver_in_background, app, callback_id, domain
+                )
+
+    def _deliver_in_background(self, app: Flask, callback_id: str, domain: str) -> None:
+        with app.app_context():
+            try:
+                self._deliver(callback_id)
+            except Exception:
+                log.exception(f"Error delivering UTXO callback {callback_id}")
+            finally:
+                self._release_domain(domain)
+                # A slot for this domain is free again.
+                self._wake.set()
+
+    def _deliver(self, callback_id: str) -> None:
+        # Let go of the connection before the POST, which can take a while. The row
+        # stays claimed by its lease meanwhile.
+        with Session(db.engine) as db_session:
+            callback = db_session.get(UtxoCallback, callback_id)
+            if not callback or callback.status != UtxoCallbackStatus.PENDING:
+                return
+            callback_url = callback.callback_url
+            utxos = callback.utxos
+
+        error: Optional[str] = None
+        try:
+            post_tx_callback = create_post_transaction_callback(
+                [
+                    UtxoWithAmount(utxo=utxo["utxo"], amount_msats=utxo["amountMsats"])
+                    for utxo in utxos
+                ],
+                get_vasp_domain(),
+                self.config.get_signing_privkey(),
+            )
+            res = self.http_client.post(
+                callback_url,
+                json=post_tx_callback.to_dict(),
+            )
+            if not res.ok:
+                error = f"{res.status_code} {res.text[:500]}"
+        except Exception as e:
+            error = str(e)[:500]
+
+        with Session(db.engine) as db_session:
+            callback = db_session.get(UtxoCallback, callback_id)
+            if not callback:
+                return
+            callback.attempts += 1
+            now = datetime.now(timezone.utc)
+            if not error:
+                callback.status = UtxoCallbackStatus.DELIVERED
+                callback.delivered_at = now
+                callback.last_error = None
+                stat = "delivered"
+            elif callback.attempts >= self.max_attempts:
+                log.error(
+                    f"Giving up on UTXO callback {callback.id} for payment {callback.payment_id} "
+                    f"to {callback.domain} after {callback.attempts} attempts: {error}"
+                )
+                callback.status = UtxoCallbackStatus.FAILED
+                callback.last_error = error
+                stat = "failed"
+            else:
+                log.warning(
+                    f"UTXO callback {callback.id} to {callback.domain} failed "
+                    f"(attempt {callback.attempts}): {error}"
+                )
+                callback.next_attempt_at = now + timedelta(
+                    seconds=self._backoff_secs(callback.attempts)
+                )
+                callback.last_error = error
+                stat = "retried"
+            db_session.commit()
+
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _backoff_secs(self, attempts: int) -> float:
+        backoff = min(
+            self.max_backoff_secs, self.base_backoff_secs * (2 ** (attempts - 1))
+        )
+        # Full jitter, so that callbacks which failed together don't retry together.
+        return random.uniform(backoff / 2, backoff)
+
+    def _release_domain(self, domain: str) -> None:
+        with self._lock:
+            self._in_flight_by_domain[domain] -= 1
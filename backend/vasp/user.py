@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from vasp.db import db
 from vasp.models.Currency import Currency
 from vasp.models.Preference import Preference, PreferenceType
-from vasp.models.Transaction import Transaction
+from vasp.models.Transaction import Transaction, TransactionDirection
 from vasp.models.Uma import Uma
 from vasp.models.User import User as UserModel
 from vasp.models.Wallet import (
@@ -20,14 +20,22 @@ from vasp.models.Wallet import (
     WalletUserType,
 )
 from vasp.models.WebAuthnCredential import WebAuthnCredential
+from vasp.transaction_history import TransactionPage, set_next_cursor
 from vasp.uma_vasp.config import Config
 from vasp.uma_vasp.currencies import CURRENCIES
+from vasp.uma_vasp.currency_list_cache import CurrencyListCache
 from vasp.uma_vasp.interfaces.currency_service import ICurrencyService
 from vasp.uma_vasp.interfaces.ledger_service import ILedgerService
 from vasp.uma_vasp.uma_exception import abort_with_error
 from uma import ErrorCode, KycStatus
+from uma_auth.models.transaction_type import TransactionType
 from vasp.uma_vasp.user import User
-from vasp.utils import get_uma_from_username, get_username_from_uma, get_vasp_domain
+from vasp.utils import (
+    generate_uuid,
+    get_uma_from_username,
+    get_username_from_uma,
+    get_vasp_domain,
+)
 
 from . import notifications
 
@@ -45,6 +53,7 @@ def construct_blueprint(
     config: Config,
     ledger_service: ILedgerService,
     currency_service: ICurrencyService,
+    currency_list_cache: CurrencyListCache,
 ) -> Blueprint:
     bp = Blueprint("user", __name__, url_prefix="/api/user")
 
@@ -73,7 +82,8 @@ def construct_blueprint(
             abort_with_error(
                 ErrorCode.INVALID_INPUT, "UMA is required to retrieve balance"
             )
-        balance, currency = ledger_service.get_wallet_balance(uma=uma)
+        # Funds held for payments in flight can't be spent, so they aren't shown.
+        balance, currency = ledger_service.get_available_balance(uma=uma)
         return jsonify(
             {
                 "amount_in_lowest_denom": balance,
@@ -90,7 +100,7 @@ def construct_blueprint(
     @login_required
     def contacts() -> Response:
         # TODO: get contacts from past transactions
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             own_umas = db_session.scalars(
                 select(Uma).where(Uma.user_id == current_user.id)
             ).all()
@@ -135,7 +145,7 @@ def construct_blueprint(
     @bp.get("/username")
     @login_required
     def username() -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             user_model = db_session.scalars(
                 select(UserModel).where(UserModel.id == current_user.id)
             ).first()
@@ -147,7 +157,7 @@ def construct_blueprint(
 
     @bp.get("/avatar/<user_id>")
     def avatar_uma_user_name(user_id: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             user_model = db_session.scalars(
                 select(UserModel).where(UserModel.id == int(user_id))
             ).first()
@@ -161,7 +171,7 @@ def construct_blueprint(
     @bp.route("/avatar", methods=["GET", "POST"])
     @login_required
     def avatar() -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             user_model = db_session.scalars(
                 select(UserModel).where(UserModel.id == current_user.id)
             ).first()
@@ -195,7 +205,7 @@ def construct_blueprint(
     @bp.post("/device-token")
     @login_required
     def device_token() -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = db_session.scalars(
                 select(Wallet).where(Wallet.user_id == current_user.id)
             ).first()
@@ -219,7 +229,7 @@ def construct_blueprint(
     @bp.get("/wallets")
     @login_required
     def wallets() -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallets = db_session.scalars(
                 select(Wallet)
                 .where(Wallet.user_id == current_user.id)
@@ -231,7 +241,7 @@ def construct_blueprint(
     @bp.get("/wallets/<wallet_id>")
     @login_required
     def get_wallet(wallet_id: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = _get_wallet_for_current_user(db_session, wallet_id)
             return jsonify(wallet.to_dict())
 
@@ -259,8 +269,9 @@ def construct_blueprint(
             "ultimate_institution_country",
         ]
 
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = _get_wallet_for_current_user(db_session, wallet_id)
+            old_username = wallet.uma.username if wallet.uma else None
 
             for field in simple_string_fields:
                 if field in payload:
@@ -362,6 +373,11 @@ def construct_blueprint(
             db_session.commit()
             db_session.refresh(wallet)
 
+            if wallet.uma and ("currencyCode" in payload or "username" in payload):
+                currency_service.invalidate_uma_currencies(wallet.uma.username)
+                if old_username and old_username != wallet.uma.username:
+                    currency_service.invalidate_uma_currencies(old_username)
+
             response = jsonify(wallet.to_dict())
             response.status_code = 201 if request.method == "PUT" else 200
             return response
@@ -369,7 +385,7 @@ def construct_blueprint(
     @bp.delete("/wallet/<wallet_id>")
     @login_required
     def delete_wallet(wallet_id: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = db_session.scalars(
                 select(Wallet)
                 .where(Wallet.user_id == current_user.id)
@@ -379,20 +395,23 @@ def construct_blueprint(
                 abort_with_error(
                     ErrorCode.INVALID_INPUT, f"Wallet {wallet_id} not found."
                 )
+            username = wallet.uma.username
             db_session.delete(wallet)
             db_session.delete(wallet.currency)
             db_session.delete(wallet.uma)
             db_session.commit()
+            currency_service.invalidate_uma_currencies(username)
             return jsonify({"message": f"Wallet {wallet_id} deleted."})
 
     @bp.put("/wallet/fund/<wallet_id>")
     @login_required
     def fund_wallet(wallet_id: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             wallet = db_session.scalars(
                 select(Wallet)
                 .where(Wallet.user_id == current_user.id)
                 .where(Wallet.id == wallet_id)
+                .execution_options(populate_existing=True)
             ).first()
             if wallet is None:
                 abort_with_error(
@@ -401,14 +420,23 @@ def construct_blueprint(
             request_json = request.json
             amount_in_lowest_denom = request_json.get("amountInLowestDenom")
             if amount_in_lowest_denom:
-                wallet.amount_in_lowest_denom += amount_in_lowest_denom
+                # Added in the UPDATE, so it can't overwrite a concurrent ledger write.
+                wallet.amount_in_lowest_denom = (
+                    Wallet.amount_in_lowest_denom + amount_in_lowest_denom
+                )
             db_session.commit()
             transaction = Transaction(
                 user_id=wallet.user_id,
                 uma_id=wallet.uma.id,
-                transaction_hash="demo_funding_transaction_hash",
+                # Each funding needs its own hash to be recorded separately.
+                transaction_hash=f"demo_funding_{generate_uuid()}",
                 amount_in_lowest_denom=amount_in_lowest_denom,
                 currency_code=wallet.currency.code,
+                direction=(
+                    TransactionDirection.DEBIT
+                    if amount_in_lowest_denom and amount_in_lowest_denom < 0
+                    else TransactionDirection.CREDIT
+                ),
                 sender_uma=f"$demo-funding-tx@{get_vasp_domain()}",
                 receiver_uma=wallet.uma.username,
             )
@@ -437,17 +465,27 @@ def construct_blueprint(
                 ErrorCode.INVALID_INPUT, "UMA is required to retrieve transactions."
             )
 
-        with Session(db.engine) as db_session:
-            # TODO: Add pagination
+        page = TransactionPage.from_request_args(request.args)
+        with db.session_scope() as db_session:
             # Only returns transactions sent by current user and for the provided uma
-            transactions = db_session.scalars(
+            statement = (
                 select(Transaction)
                 .join(Uma)
                 .where(Transaction.user_id == current_user.id)
                 .where(Uma.username == get_username_from_uma(uma))
-                .order_by(Transaction.created_at.desc())
-                .limit(20)
-            ).all()
+            )
+            if page.transaction_type:
+                statement = statement.where(
+                    Transaction.direction
+                    == (
+                        TransactionDirection.CREDIT
+                        if page.transaction_type == TransactionType.INCOMING
+                        else TransactionDirection.DEBIT
+                    )
+                )
+            transactions, next_cursor = page.split(
+                db_session.scalars(page.apply(statement)).all()
+            )
 
             if not transactions:
                 return jsonify([])
@@ -467,12 +505,12 @@ def construct_blueprint(
                 }
                 for transaction in transactions
             ]
-            return jsonify(response)
+            return set_next_cursor(jsonify(response), next_cursor)
 
     @bp.route("/preferences", methods=["POST", "GET"])
     @login_required
     def preferences() -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             preferences = db_session.scalars(
                 select(Preference).where(Preference.user_id == current_user.id)
             ).all()
@@ -527,20 +565,18 @@ def construct_blueprint(
     def currencies() -> Response:
         user_id = current_user.id
 
-        with Session(db.engine) as db_session:
-            currencies = db_session.scalars(
-                select(Currency).join(Wallet).where(Wallet.user_id == user_id)
+        with db.session_scope() as db_session:
+            currency_codes = db_session.scalars(
+                select(Currency.code).join(Wallet).where(Wallet.user_id == user_id)
             ).all()
-            response = [
-                currency_service.get_uma_currency(currency.code)
-                for currency in currencies
-            ]
-            return jsonify(response)
+        return currency_list_cache.get(currency_codes).to_response(
+            request, cache_control="private, no-cache"
+        )
 
     @bp.get("/login_methods")
     @login_required
     def login_methods() -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             webauthn_credentials = db_session.scalars(
                 select(WebAuthnCredential).where(
                     WebAuthnCredential.user_id == current_user.id
@@ -558,7 +594,7 @@ def construct_blueprint(
     @bp.delete("/webauthn/<credential_id>")
     @login_required
     def delete_webauthn_credential(credential_id: str) -> Response:
-        with Session(db.engine) as db_session:
+        with db.session_scope() as db_session:
             credential = db_session.scalars(
                 select(WebAuthnCredential)
                 .where(WebAuthnCredential.user_id == current_user.id)